@@ -1,178 +1,330 @@
 """
-Curated reading list for daily tech & philosophy refreshers.
+Reading list for daily tech & philosophy refreshers.
 10-15 minute reads on technology, focus, and meaning.
+
+The catalog lives in SQLite (see db.py) so it can grow to tens of thousands
+of entries. It is filled lazily, on the first pick in each process, from the
+curated list below plus an optional JSONL file (ARTICLES_PATH: one object
+per line with "title", "url" and optionally "description" and "tags"). A
+source is only re-imported when it has changed.
+
+Each user gets one pick per day (optionally per tag), memoized, and their
+read history is a bitmap of article IDs, so nothing repeats until everything
+eligible has been read.
 """
-import random
+import hashlib
+import json
+import logging
+import os
+import threading
+import zlib
 from datetime import date
+from typing import NamedTuple, Optional
+
+import db
 
-# Curated articles: (title, url, one-liner)
+logger = logging.getLogger(__name__)
+
+ARTICLES_PATH = os.environ.get("ARTICLES_PATH")
+
+# Curated articles: (title, url, one-liner, tags)
 ARTICLES = [
     (
         "The Technium: What Technology Wants",
         "https://kk.org/thetechnium/what-technology/",
-        "Kevin Kelly on technology as an extension of life's evolutionary force."
+        "Kevin Kelly on technology as an extension of life's evolutionary force.",
+        ("technology", "philosophy")
     ),
     (
         "This Is Water - David Foster Wallace",
         "https://fs.blog/david-foster-wallace-this-is-water/",
-        "The power of choosing what to pay attention to in daily life."
+        "The power of choosing what to pay attention to in daily life.",
+        ("philosophy", "focus")
     ),
     (
         "Solitude and Leadership",
         "https://theamericanscholar.org/solitude-and-leadership/",
-        "William Deresiewicz on why true leadership requires thinking alone."
+        "William Deresiewicz on why true leadership requires thinking alone.",
+        ("focus", "leadership")
     ),
     (
         "The Maintenance Race",
         "https://www.worksinprogress.co/issue/the-maintenance-race/",
-        "Why maintaining what we build matters more than building new things."
+        "Why maintaining what we build matters more than building new things.",
+        ("technology", "history")
     ),
     (
         "Meditations on Moloch",
         "https://slatestarcodex.com/2014/07/30/meditations-on-moloch/",
-        "Scott Alexander on coordination problems and why we can't have nice things."
+        "Scott Alexander on coordination problems and why we can't have nice things.",
+        ("philosophy", "society")
     ),
     (
         "The Gervais Principle",
         "https://www.ribbonfarm.com/2009/10/07/the-gervais-principle-or-the-office-according-to-the-office/",
-        "A ruthlessly honest look at organizational dynamics through The Office."
+        "A ruthlessly honest look at organizational dynamics through The Office.",
+        ("work", "organizations")
     ),
     (
         "You and Your Research - Richard Hamming",
         "https://www.cs.virginia.edu/~robins/YouAndYourResearch.html",
-        "What separates those who do great work from those who could but don't."
+        "What separates those who do great work from those who could but don't.",
+        ("work", "craft")
     ),
     (
         "The Bus Ticket Theory of Genius",
         "http://paulgraham.com/genius.html",
-        "Paul Graham on obsessive interest as the key ingredient of exceptional work."
+        "Paul Graham on obsessive interest as the key ingredient of exceptional work.",
+        ("craft", "thinking")
     ),
     (
         "The Tyranny of the Marginal User",
         "https://nothinghuman.substack.com/p/the-tyranny-of-the-marginal-user",
-        "Why software keeps getting dumbed down and what it means for power users."
+        "Why software keeps getting dumbed down and what it means for power users.",
+        ("technology", "product")
     ),
     (
         "Taste for Makers",
         "http://paulgraham.com/taste.html",
-        "On developing judgment about what's good in design and creation."
+        "On developing judgment about what's good in design and creation.",
+        ("craft", "design")
     ),
     (
         "The Age of the Essay",
         "http://paulgraham.com/essay.html",
-        "Essays as a way of figuring things out, not just communicating."
+        "Essays as a way of figuring things out, not just communicating.",
+        ("writing", "thinking")
     ),
     (
         "Speed Matters",
         "https://jsomers.net/blog/speed-matters",
-        "Why being fast changes what you're capable of doing."
+        "Why being fast changes what you're capable of doing.",
+        ("work", "productivity")
     ),
     (
         "The Lesson to Unlearn",
         "http://paulgraham.com/lesson.html",
-        "How school trains us to game the system instead of doing real work."
+        "How school trains us to game the system instead of doing real work.",
+        ("learning", "thinking")
     ),
     (
         "The Pmarca Guide to Personal Productivity",
         "https://pmarchive.com/guide_to_personal_productivity.html",
-        "Marc Andreessen's contrarian take on getting things done."
+        "Marc Andreessen's contrarian take on getting things done.",
+        ("productivity", "focus")
     ),
     (
         "Teach Yourself Programming in Ten Years",
         "https://norvig.com/21-days.html",
-        "Peter Norvig on why mastery takes time and why that's okay."
+        "Peter Norvig on why mastery takes time and why that's okay.",
+        ("learning", "craft")
     ),
     (
         "The Cook and the Chef: Musk's Secret Sauce",
         "https://waitbutwhy.com/2015/11/the-cook-and-the-chef-musks-secret-sauce.html",
-        "First principles thinking explained through a cooking metaphor."
+        "First principles thinking explained through a cooking metaphor.",
+        ("thinking", "startups")
     ),
     (
         "What You'll Wish You'd Known",
         "http://paulgraham.com/hs.html",
-        "Advice for your younger self on what actually matters."
+        "Advice for your younger self on what actually matters.",
+        ("learning", "life")
     ),
     (
         "In Praise of Idleness",
         "https://harpers.org/archive/1932/10/in-praise-of-idleness/",
-        "Bertrand Russell's 1932 essay on why we should work less."
+        "Bertrand Russell's 1932 essay on why we should work less.",
+        ("philosophy", "life")
     ),
     (
         "A Mathematician's Lament",
         "https://www.maa.org/external_archive/devlin/LockshartsLament.pdf",
-        "Paul Lockhart on how we've stripped the beauty from mathematics."
+        "Paul Lockhart on how we've stripped the beauty from mathematics.",
+        ("learning", "math")
     ),
     (
         "Hackers and Painters",
         "http://paulgraham.com/hp.html",
-        "What software creators can learn from Renaissance artists."
+        "What software creators can learn from Renaissance artists.",
+        ("craft", "technology")
     ),
     (
         "The Psychology of Human Misjudgment",
         "https://fs.blog/great-talks/psychology-human-misjudgment/",
-        "Charlie Munger's masterclass on cognitive biases."
+        "Charlie Munger's masterclass on cognitive biases.",
+        ("thinking", "psychology")
     ),
     (
         "Schlep Blindness",
         "http://paulgraham.com/schlep.html",
-        "Why we unconsciously avoid hard but valuable work."
+        "Why we unconsciously avoid hard but valuable work.",
+        ("startups",)
     ),
     (
         "Do Things that Don't Scale",
         "http://paulgraham.com/ds.html",
-        "The counterintuitive way to build something big."
+        "The counterintuitive way to build something big.",
+        ("startups",)
     ),
     (
         "The Idea Maze",
         "https://cdixon.org/2013/08/04/the-idea-maze",
-        "Chris Dixon on why ideas are less about the destination than the path."
+        "Chris Dixon on why ideas are less about the destination than the path.",
+        ("startups", "thinking")
     ),
     (
         "1000 True Fans",
         "https://kk.org/thetechnium/1000-true-fans/",
-        "Kevin Kelly on a sustainable creative life without mass scale."
+        "Kevin Kelly on a sustainable creative life without mass scale.",
+        ("work", "creators")
     ),
     (
         "Becoming a Magician",
         "https://autotranslucence.com/2018/03/30/becoming-a-magician/",
-        "On finding mentors who make the impossible look easy."
+        "On finding mentors who make the impossible look easy.",
+        ("learning", "craft")
     ),
     (
         "How to Do Great Work",
         "http://paulgraham.com/greatwork.html",
-        "Paul Graham's synthesis on what leads to exceptional outcomes."
+        "Paul Graham's synthesis on what leads to exceptional outcomes.",
+        ("work", "craft")
     ),
     (
         "The Case for Working With Your Hands",
         "https://www.nytimes.com/2009/05/24/magazine/24labor-t.html",
-        "Matthew Crawford on the hidden satisfactions of physical craft."
+        "Matthew Crawford on the hidden satisfactions of physical craft.",
+        ("craft", "work")
     ),
     (
         "I Will Teach You to Be Rich in One Post",
         "https://www.iwillteachyoutoberich.com/blog/the-1-page-personal-finance-plan/",
-        "Ramit Sethi's no-BS personal finance framework."
+        "Ramit Sethi's no-BS personal finance framework.",
+        ("money",)
     ),
     (
         "The Lindy Effect",
         "https://fs.blog/the-lindy-effect/",
-        "Why old ideas that survive are likely to keep surviving."
+        "Why old ideas that survive are likely to keep surviving.",
+        ("thinking",)
     ),
 ]
 
 
-def get_daily_article() -> tuple:
+class Article(NamedTuple):
+    id: int
+    title: str
+    url: str
+    description: str
+    tags: tuple
+
+
+_loaded = False
+_load_lock = threading.Lock()
+
+
+def load_catalog(force: bool = False):
+    """Import the curated list and ARTICLES_PATH into the catalog if either has changed."""
+    global _loaded
+    if _loaded and not force:
+        return
+    with _load_lock:
+        if _loaded and not force:
+            return
+        curated = json.dumps(ARTICLES).encode()
+        _import("curated", hashlib.sha256(curated).hexdigest(), _curated_rows)
+        if ARTICLES_PATH:
+            try:
+                stat = os.stat(ARTICLES_PATH)
+            except OSError as e:
+                # Serve the curated list rather than fail every read
+                logger.warning(f"ARTICLES_PATH unreadable, using the built-in list only: {e}")
+                _loaded = True
+                return
+            _import(
+                f"file:{os.path.abspath(ARTICLES_PATH)}", f"{stat.st_mtime_ns}:{stat.st_size}",
+                lambda: _jsonl_rows(ARTICLES_PATH)
+            )
+        _loaded = True
+
+
+def _import(source: str, signature: str, rows):
+    if db.get_article_source(source) == signature:
+        return
+    count = db.import_articles(source, signature, rows())
+    logger.info(f"Imported {count} article(s) from {source}")
+
+
+def _curated_rows():
+    for title, url, description, tags in ARTICLES:
+        yield {"title": title, "url": url, "description": description, "tags": tags}
+
+
+def _jsonl_rows(path: str):
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                row = _valid_row(json.loads(line))
+            except ValueError as e:
+                logger.warning(f"{path}:{line_number}: skipping article ({e})")
+                continue
+            yield row
+
+
+def _valid_row(row) -> dict:
+    """The article in a JSONL line, checked and with tags as a list. Raises ValueError."""
+    if not isinstance(row, dict):
+        raise ValueError("not a JSON object")
+    for field in ("url", "title"):
+        if not isinstance(row.get(field), str) or not row[field].strip():
+            raise ValueError(f"missing {field}")
+    description = row.get("description") or ""
+    tags = row.get("tags") or []
+    if isinstance(tags, str):
+        # "focus" or "focus,work": one tag or a comma-separated list
+        tags = tags.split(",")
+    if not isinstance(description, str) or not all(isinstance(tag, str) for tag in tags):
+        raise ValueError("description must be a string and tags strings")
+    return {"url": row["url"].strip(), "title": row["title"].strip(),
+            "description": description, "tags": tags}
+
+
+def _article(row: dict) -> Article:
+    tags = tuple(row["tags"].split(",")) if row["tags"] else ()
+    return Article(row["id"], row["title"], row["url"], row["description"], tags)
+
+
+def get_daily_article(user_id: str, day: date = None, tag: str = None) -> Optional[Article]:
     """
-    Get today's article recommendation.
-    Uses day of year to rotate through the list consistently.
+    The user's article for `day` (their local date; defaults to today),
+    from `tag` if given. The same article comes back all day. None only if
+    no article has that tag.
     """
-    day_of_year = date.today().timetuple().tm_yday
-    index = day_of_year % len(ARTICLES)
-    return ARTICLES[index]
+    load_catalog()
+    day = day or date.today()
+    tag = (tag or "").strip().lower()
+    row = db.get_article_pick(user_id, day, tag)
+    if row is None:
+        # Where this user's search for an unread article starts today
+        seed = zlib.crc32(f"{user_id}:{day.isoformat()}:{tag}".encode())
+        row = db.pick_article(user_id, day, seed, tag)
+    return _article(row) if row else None
+
+
+def get_random_article(tag: str = None) -> Optional[Article]:
+    """A random article, from `tag` if given (for on-demand requests; not recorded as read)."""
+    load_catalog()
+    row = db.get_random_article((tag or "").strip().lower())
+    return _article(row) if row else None
 
 
-def get_random_article() -> tuple:
-    """Get a random article (for on-demand requests)."""
-    return random.choice(ARTICLES)
+def get_tags() -> list:
+    """(tag, article count) pairs for every tag in the catalog."""
+    load_catalog()
+    return db.get_article_tags()
 
 
 def format_article_block(title: str, url: str, description: str) -> str:
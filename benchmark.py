@@ -0,0 +1,449 @@
+"""
+Microbenchmarks for the storage layer, command parser, morning digest and API.
+
+Seeds throwaway databases with synthetic tasks, times each operation and
+writes the results as JSON so runs can be compared:
+
+    python benchmark.py                                # 100, 10k and 1M rows
+    python benchmark.py --sizes 100,10000 --output before.json
+    python benchmark.py --compare before.json after.json
+
+Nothing touches focus.db or Slack: the database lives in a temp directory and
+outgoing messages are dropped.
+"""
+import argparse
+import inspect
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+BENCH_USER = "UBENCH"
+BENCH_TOKEN = "bench-token"
+DEFAULT_SIZES = "100,10000,1000000"
+# Articles in the benchmark catalog (on top of the curated list)
+ARTICLE_CATALOG = 1000
+
+SAMPLE_MESSAGES = {
+    "add": "add Review API documentation",
+    "add_bulleted": "add\n- Call design team\n- Fix login bug\n- [side] Update README",
+    "list": "list",
+    "done": "done 42",
+    "win": "win: ship the release",
+    "schedule": "schedule 09:00 Europe/Berlin",
+    "find": "find login bug",
+    "unknown": "what should I be doing right now?",
+}
+
+# Public db functions that are deliberately not timed
+NOT_BENCHMARKED = {
+    "get_connection",     # covered by "db.get_connection+close"
+    "close_connections",  # would empty the pool under the next case
+}
+
+
+def _isolate(db_path: Path):
+    """Point db.py at a temp file and keep the bot off the network."""
+    os.environ["FOCUS_DB_PATH"] = str(db_path)
+    os.environ["SLACK_BOT_TOKEN"] = "xoxb-benchmark"
+    os.environ["API_TOKEN"] = BENCH_TOKEN
+    os.environ["MY_USER_ID"] = BENCH_USER
+
+
+# --- Seeding ---
+
+def seed(db, rows: int, pending_ratio: float, days: int = 365):
+    """Fill the bench user with `rows` tasks spread over the last `days` days."""
+    rng = random.Random(rows)
+    today = date.today()
+    with db.transaction() as conn:
+        db._ensure_user(conn, BENCH_USER)
+        conn.execute(
+            "UPDATE users SET day = ?, last_date = ?, morning_time = '09:00', timezone = 'UTC' "
+            "WHERE user_id = ?",
+            (days, today.isoformat(), BENCH_USER)
+        )
+
+        def generate():
+            for i in range(rows):
+                age = rng.randrange(days)
+                created = datetime.combine(today - timedelta(days=age), datetime.min.time())
+                created += timedelta(seconds=rng.randrange(86400))
+                area = "side_project" if rng.random() < 0.2 else "work"
+                if rng.random() < pending_ratio:
+                    yield (BENCH_USER, f"Task {i}", area, created, None, "pending", days - age, None)
+                else:
+                    done = min(created + timedelta(days=rng.randrange(5)), datetime.now())
+                    yield (BENCH_USER, f"Task {i}", area, created, done, "completed",
+                           days - age, done.date().isoformat())
+
+        conn.executemany(
+            """INSERT INTO tasks (user_id, text, area, created_at, completed_at, status,
+                                  first_day, completed_day)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            generate()
+        )
+    with db.connection() as conn:
+        conn.execute("PRAGMA optimize")
+
+
+# --- Timing ---
+
+def measure(fn, setup=None, repeat: int = 50, budget: float = 2.0) -> dict:
+    """
+    Call fn(*setup()) up to `repeat` times or until `budget` seconds have been
+    spent (at least once). Only fn is timed.
+    """
+    samples = []
+    deadline = time.perf_counter() + budget
+    while len(samples) < repeat and (not samples or time.perf_counter() < deadline):
+        args = setup() if setup else ()
+        start = time.perf_counter_ns()
+        fn(*args)
+        samples.append((time.perf_counter_ns() - start) / 1e6)
+
+    samples.sort()
+    return {
+        "runs": len(samples),
+        "min_ms": round(samples[0], 4),
+        "median_ms": round(statistics.median(samples), 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        "max_ms": round(samples[-1], 4),
+    }
+
+
+def counter(start: int = 0):
+    """Fresh value per run for cases that must not repeat (dates, tokens)."""
+    state = {"n": start}
+
+    def next_value():
+        state["n"] += 1
+        return state["n"]
+    return next_value
+
+
+# --- Cases ---
+
+def db_cases(db):
+    """(name, fn, setup) for each public db function."""
+    uid = BENCH_USER
+    future = counter()
+    new_task = lambda: (uid, db.add_task(uid, "benchmark task"))
+
+    def fresh_date():
+        return (uid, date.today() + timedelta(days=future()))
+
+    def fresh_claim():
+        local_date = (date(2100, 1, 1) + timedelta(days=future())).isoformat()
+        return (uid, local_date)
+
+    def claimed():
+        args = fresh_claim()
+        db.claim_digest(*args)
+        return args
+
+    def open_and_close():
+        db.get_connection().close()
+
+    def checkout():
+        with db.connection():
+            pass
+
+    def empty_transaction():
+        with db.transaction():
+            pass
+
+    def empty_snapshot():
+        with db.snapshot():
+            pass
+
+    pending = db.get_pending_tasks(uid)
+    task_id = pending[0]["id"] if pending else 1
+    # Keyset pages should cost the same deep in the list as at the start
+    middle = pending[len(pending) // 2] if pending else {"created_at": "", "id": 0}
+    deep_cursor = db._encode_cursor(str(middle["created_at"]), middle["id"])
+    db.save_dm_channel(uid, "DBENCH")
+    token = db.create_api_token(uid)
+    catalog = [
+        {"title": f"Bench article {i}", "url": f"https://example.com/{i}", "tags": ["bench", f"t{i % 10}"]}
+        for i in range(ARTICLE_CATALOG)
+    ]
+    db.import_articles("bench", "seed", catalog)
+    db.pick_article(uid, date.today(), 0)
+
+    def fresh_pick(tag=""):
+        return lambda: (uid, date(2100, 1, 1) + timedelta(days=future()), future(), tag)
+
+    return [
+        ("db.get_connection+close", open_and_close, None),
+        ("db.connection", checkout, None),
+        ("db.transaction", empty_transaction, None),
+        ("db.snapshot", empty_snapshot, None),
+        ("db.get_schema_version", db.get_schema_version, None),
+        ("db.init_db", db.init_db, None),
+        ("db.ensure_user", db.ensure_user, lambda: (uid,)),
+        ("db.get_user", db.get_user, lambda: (uid,)),
+        ("db.create_api_token", db.create_api_token, lambda: ("UTOKEN",)),
+        ("db.get_user_by_token", db.get_user_by_token, lambda: (token,)),
+        ("db.claim_orphaned_data", db.claim_orphaned_data, lambda: (uid,)),
+        ("db.get_data_version", db.get_data_version, lambda: (uid,)),
+        ("db.start_day", db.start_day, lambda: (uid, date.today())),
+        ("db.start_day[rollover]", db.start_day, fresh_date),
+        ("db.set_morning_schedule", db.set_morning_schedule, lambda: (uid, "09:00", "UTC")),
+        ("db.get_schedule_timezones", db.get_schedule_timezones, None),
+        ("db.get_due_digest_users", db.get_due_digest_users,
+         lambda: ("UTC", "2099-12-31", "07:00", "09:00")),
+        ("db.claim_digest", db.claim_digest, fresh_claim),
+        ("db.mark_digest_sent", db.mark_digest_sent, claimed),
+        ("db.release_digest", db.release_digest, claimed),
+        ("db.add_task", db.add_task, lambda: (uid, "benchmark task")),
+        ("db.submit+result", lambda *args: db.submit(db.add_task, *args).result(),
+         lambda: (uid, "queued task")),
+        ("db.add_tasks[10]", db.add_tasks,
+         lambda: (uid, [(f"bulk task {i}", "work") for i in range(10)])),
+        ("db.get_task", db.get_task, lambda: (uid, task_id)),
+        ("db.get_pending_tasks", db.get_pending_tasks, lambda: (uid,)),
+        ("db.get_tasks_by_area", db.get_tasks_by_area, lambda: (uid, "side_project")),
+        ("db.get_tasks_page[100]", db.get_tasks_page, lambda: (uid, 100)),
+        ("db.get_tasks_page[100,deep]", db.get_tasks_page, lambda: (uid, 100, deep_cursor)),
+        ("db.get_tasks_page[100,id+text]", db.get_tasks_page,
+         lambda: (uid, 100, None, None, ["id", "text"])),
+        ("db.get_task_changes[full]", db.get_task_changes, lambda: (uid,)),
+        ("db.get_task_changes[delta]", db.get_task_changes,
+         lambda: (uid, db.get_data_version(uid) - 5)),
+        ("db.iter_tasks", lambda *args: sum(1 for _ in db.iter_tasks(*args)), lambda: (uid,)),
+        ("db.search_tasks", db.search_tasks, lambda: (uid, "task 4")),
+        ("db.search_tasks[prefix]", db.search_tasks, lambda: (uid, "benchmark ta")),
+        ("db.complete_task", db.complete_task, new_task),
+        ("db.delete_task", db.delete_task, new_task),
+        ("db.get_stuck_tasks", db.get_stuck_tasks, lambda: (uid,)),
+        ("db.get_stats", db.get_stats, lambda: (uid,)),
+        ("db.save_daily_plan", db.save_daily_plan, lambda: (uid, ["Ship it"], "shipped")),
+        ("db.get_today_plan", db.get_today_plan, lambda: (uid,)),
+        ("db.get_yesterday_plan", db.get_yesterday_plan, lambda: (uid,)),
+        # Nothing is old enough to move: the cost of finding out
+        ("db.archive_completed_tasks[noop]", db.archive_completed_tasks, lambda: (100000,)),
+        ("db.prune_task_changes[noop]", db.prune_task_changes, lambda: (100000,)),
+        ("db.compact", db.compact, None),
+        ("db.get_article_source", db.get_article_source, lambda: ("bench",)),
+        (f"db.import_articles[{ARTICLE_CATALOG}]", db.import_articles,
+         lambda: ("bench", str(future()), catalog)),
+        ("db.get_article_tags", db.get_article_tags, None),
+        ("db.get_random_article", db.get_random_article, None),
+        ("db.get_article_pick", db.get_article_pick, lambda: (uid, date.today())),
+        ("db.pick_article", db.pick_article, fresh_pick()),
+        ("db.pick_article[tag]", db.pick_article, fresh_pick("t3")),
+        ("db.get_cached_digest", db.get_cached_digest, lambda: (uid, date.today(), 0)),
+        ("db.save_cached_digest", db.save_cached_digest,
+         lambda: (uid, date.today(), 0, "digest", [{"type": "section"}])),
+        ("db.get_dm_channel", db.get_dm_channel, lambda: (uid,)),
+        ("db.save_dm_channel", db.save_dm_channel, lambda: (uid, "DBENCH")),
+        ("db.forget_dm_channel", db.forget_dm_channel, lambda: (uid,)),
+    ]
+
+
+def bot_cases(bot, db, commands):
+    """Digest building, formatting and DM command parsing/dispatch."""
+    uid = BENCH_USER
+    pending = db.get_pending_tasks(uid)
+    replies = []
+
+    def say(*args, **kwargs):
+        replies.append((args, kwargs))
+
+    def dispatch(text):
+        bot.handle_message({"channel_type": "im", "user": uid, "text": text}, say)
+        replies.clear()
+
+    cases = [
+        ("bot.morning_planning_message", bot.morning_planning_message, lambda: (uid,)),
+        ("bot.morning_digest[cached]", bot.morning_digest, lambda: (uid, date.today())),
+        ("bot.build_morning_digest", bot.build_morning_digest, lambda: (uid, date.today())),
+        (f"bot.format_task_list[{len(pending)}]", bot.format_task_list, lambda: (pending,)),
+        ("bot.format_task_list[10]", bot.format_task_list, lambda: (pending[:10],)),
+    ]
+    for name, text in SAMPLE_MESSAGES.items():
+        cases.append((f"commands.parse[{name}]", commands.parse, lambda text=text: (text,)))
+    cases.append(("bot.handle_message[list]", dispatch, lambda: ("list",)))
+    cases.append(("bot.handle_message[unknown]", dispatch, lambda: (SAMPLE_MESSAGES["unknown"],)))
+    return cases
+
+
+def route_cases(bot, db):
+    """Every API route except the /api/events stream, through Flask's test client."""
+    client = bot.api.test_client()
+    auth = {"Authorization": f"Bearer {BENCH_TOKEN}"}
+    uid = BENCH_USER
+
+    def get(path):
+        return lambda headers=auth: client.get(path, headers=headers)
+
+    def current_etag(path):
+        # Fetched per run: earlier cases keep changing the data version
+        return lambda: ({**auth, "If-None-Match": client.get(path, headers=auth).headers["ETag"]},)
+
+    def check(response, status=200):
+        body = response.get_data()  # drains streamed bodies, so they are timed too
+        assert response.status_code == status, (response.status_code, body[:200])
+
+    def call(fn, status=200):
+        return lambda *args: check(fn(*args), status)
+
+    new_task = lambda: (db.add_task(uid, "benchmark task"),)
+    bulk = {"tasks": [{"text": f"bulk task {i}"} for i in range(50)]}
+
+    return [
+        ("GET /api/health", call(get("/api/health")), None),
+        ("GET /api/tasks", call(get("/api/tasks")), None),
+        ("GET /api/tasks?limit=500", call(get("/api/tasks?limit=500")), None),
+        ("GET /api/tasks?fields=id,text", call(get("/api/tasks?fields=id,text")), None),
+        ("GET /api/tasks[304]", call(get("/api/tasks"), 304), current_etag("/api/tasks")),
+        ("POST /api/tasks", call(
+            lambda: client.post("/api/tasks", headers=auth, json={"text": "from benchmark"}), 201
+        ), None),
+        ("POST /api/tasks/bulk[50]", call(
+            lambda: client.post("/api/tasks/bulk", headers=auth, json=bulk), 201
+        ), None),
+        ("POST /api/tasks/<id>/complete", call(
+            lambda task_id: client.post(f"/api/tasks/{task_id}/complete", headers=auth)
+        ), new_task),
+        ("DELETE /api/tasks/<id>", call(
+            lambda task_id: client.delete(f"/api/tasks/{task_id}", headers=auth)
+        ), new_task),
+        ("GET /api/tasks/search", call(get("/api/tasks/search?q=task+42")), None),
+        ("GET /api/sync", call(get("/api/sync")), None),
+        ("GET /api/sync?since", call(lambda path: client.get(path, headers=auth)),
+         lambda: (f"/api/sync?since={db.get_data_version(uid) - 5}",)),
+        ("GET /api/export", call(get("/api/export")), None),
+        ("GET /api/export+gzip", call(get("/api/export")),
+         lambda: ({**auth, "Accept-Encoding": "gzip"},)),
+        ("GET /api/export[304]", call(get("/api/export"), 304), current_etag("/api/export")),
+        ("GET /api/article", call(get("/api/article")), None),
+        ("GET /api/article[304]", call(get("/api/article"), 304), current_etag("/api/article")),
+        ("GET /api/stats", call(get("/api/stats")), None),
+        ("GET /api/stats[304]", call(get("/api/stats"), 304), current_etag("/api/stats")),
+        ("GET /api/metrics", call(get("/api/metrics")), None),
+    ]
+
+
+def uncovered_db_functions(db, cases) -> list:
+    """Public db functions with no case, so new ones don't go unmeasured."""
+    timed = {name.split("[")[0].split("+")[0].removeprefix("db.") for name, _, _ in cases}
+    public = {
+        name for name, obj in inspect.getmembers(db, inspect.isfunction)
+        if not name.startswith("_") and obj.__module__ == db.__name__
+    }
+    return sorted(public - timed - NOT_BENCHMARKED)
+
+
+# --- Running ---
+
+def run_size(rows: int, workdir: Path, args) -> dict:
+    import db
+    import bot
+    import commands
+
+    # Each size gets its own database file
+    db.close_connections()
+    db.DB_PATH = workdir / f"bench-{rows}.db"
+    db.init_db()
+
+    print(f"Seeding {rows:,} tasks...", file=sys.stderr)
+    start = time.perf_counter()
+    seed(db, rows, args.pending_ratio)
+    seed_seconds = time.perf_counter() - start
+
+    # Drop outgoing Slack messages
+    bot.notifications.send = lambda *a: None
+
+    cases = db_cases(db)
+    missing = uncovered_db_functions(db, cases)
+    if missing:
+        print(f"  not benchmarked: {', '.join(missing)}", file=sys.stderr)
+    cases += bot_cases(bot, db, commands) + route_cases(bot, db)
+
+    results = {}
+    for name, fn, setup in cases:
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = measure(fn, setup, repeat=args.repeat, budget=args.budget)
+        print(f"  {name:<40} {results[name]['median_ms']:>10.3f} ms", file=sys.stderr)
+
+    bot.notifications.flush()
+    return {
+        "rows": rows,
+        "pending": db.get_stats(BENCH_USER)["pending"],
+        "seed_seconds": round(seed_seconds, 3),
+        "db_bytes": db.DB_PATH.stat().st_size,
+        "results": results,
+    }
+
+
+def compare(before_path: str, after_path: str):
+    """Print the median change for every case present in both runs."""
+    before = json.loads(Path(before_path).read_text())["sizes"]
+    after = json.loads(Path(after_path).read_text())["sizes"]
+    for size in sorted(set(before) & set(after), key=int):
+        print(f"\n{int(size):,} rows")
+        old, new = before[size]["results"], after[size]["results"]
+        for name in (n for n in new if n in old):
+            a, b = old[name]["median_ms"], new[name]["median_ms"]
+            change = (b - a) / a * 100 if a else 0.0
+            flag = "  <-- slower" if change > 10 else ""
+            print(f"  {name:<40} {a:>10.3f} -> {b:>10.3f} ms  {change:+7.1f}%{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated task counts")
+    parser.add_argument("--repeat", type=int, default=50, help="max runs per case")
+    parser.add_argument("--budget", type=float, default=2.0, help="max seconds per case")
+    parser.add_argument("--pending-ratio", type=float, default=0.1,
+                        help="fraction of seeded tasks left pending")
+    parser.add_argument("--filter", help="only run cases whose name contains this")
+    parser.add_argument("--output", default="benchmark.json", help="where to write results")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="compare two result files instead of running")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    with tempfile.TemporaryDirectory(prefix="focus-bench-") as tmp:
+        workdir = Path(tmp)
+        _isolate(workdir / "bench-import.db")
+
+        sizes = {}
+        for rows in (int(s) for s in args.sizes.split(",")):
+            sizes[str(rows)] = run_size(rows, workdir, args)
+
+        import db
+        db.close_connections()
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "settings": {
+            "repeat": args.repeat,
+            "budget": args.budget,
+            "pending_ratio": args.pending_ratio,
+        },
+        "sizes": sizes,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2))
+    print(f"Wrote {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,24 +9,38 @@ Usage:
     - "delete [id]" - Remove a task
     - "focus" - Start morning planning
     - "refocus" - Get back on track mid-day
+    - "token" - Get an API token for the Chrome extension
     - "help" - Show commands
 """
+import startup  # first: its import time marks the start of the startup clock
+
 import os
+import hmac
+import html
 import logging
+import signal
 import threading
+import time
+import zlib
 from functools import wraps
-from datetime import datetime
+from datetime import datetime, date
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from dotenv import load_dotenv
 from slack_bolt import App
-from slack_bolt.adapter.socket_mode import SocketModeHandler
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
-from flask import Flask, request, jsonify
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-import pytz
 
 import db
 import articles
+import commands
+import delivery
+import digests
+import events
+import metrics
+import responses
+import server
 
 # Load environment
 load_dotenv()
@@ -35,14 +49,37 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize Slack app (Socket Mode for easy local dev)
-app = App(token=os.environ.get("SLACK_BOT_TOKEN"))
+# Initialize Slack app (Socket Mode for easy local dev). The token is checked
+# during startup, in parallel with everything else, rather than at import.
+metrics.instrument_slack_client(WebClient)
+app = App(token=os.environ.get("SLACK_BOT_TOKEN"), token_verification_enabled=False)
+
+# Startup phases, timed for the log and reported by /api/ready
+boot = startup.Startup(("imports", "db", "api", "slack_auth", "socket_mode", "scheduler"))
 
 # User config
 MY_USER_ID = os.environ.get("MY_USER_ID")
 MORNING_TIME = os.environ.get("MORNING_TIME", "11:30")
 TIMEZONE = os.environ.get("TIMEZONE", "Asia/Karachi")
 
+# Morning digest fan-out (see digests.py)
+DIGEST_WORKERS = int(os.environ.get("DIGEST_WORKERS", 4))
+DIGEST_RATE_PER_SECOND = float(os.environ.get("DIGEST_RATE_PER_SECOND", 5))
+DIGEST_GRACE_MINUTES = int(os.environ.get("DIGEST_GRACE_MINUTES", 120))
+DIGEST_PREPARE_MINUTES = int(os.environ.get("DIGEST_PREPARE_MINUTES", 10))
+# An unsent claim older than this is retried (its sender crashed)
+DIGEST_CLAIM_TIMEOUT_MINUTES = int(os.environ.get("DIGEST_CLAIM_TIMEOUT_MINUTES", 15))
+
+# Completed tasks older than this move to tasks_archive (0 keeps everything live)
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", 30))
+# Deleted-task tombstones for /api/sync are kept this long; a client that
+# has not synced for longer gets the full list
+SYNC_TOMBSTONE_DAYS = int(os.environ.get("SYNC_TOMBSTONE_DAYS", 30))
+
+# Tasks per message for `list`; more pages are a button click away
+LIST_PAGE_SIZE = 20
+SEARCH_PAGE_SIZE = 10
+
 # Debug: log config on import
 print(f"[CONFIG] MORNING_TIME={MORNING_TIME}, TIMEZONE={TIMEZONE}")
 
@@ -50,42 +87,211 @@ print(f"[CONFIG] MORNING_TIME={MORNING_TIME}, TIMEZONE={TIMEZONE}")
 # HTTP API for Chrome Extension
 # ============================================
 
+API_CORS_ORIGINS = ["chrome-extension://*", "http://localhost:*"]
+
 api = Flask(__name__)
+api.json = responses.FastJSONProvider(api)
 CORS(api, resources={
     r"/api/*": {
-        "origins": ["chrome-extension://*", "http://localhost:*"],
+        "origins": API_CORS_ORIGINS,
         "methods": ["GET", "POST", "DELETE", "OPTIONS"],
-        "allow_headers": ["Authorization", "Content-Type"]
+        "allow_headers": ["Authorization", "Content-Type", "If-None-Match", "Last-Event-ID"],
+        "expose_headers": ["ETag"]
     }
 })
 
 API_TOKEN = os.environ.get("API_TOKEN")
 API_PORT = int(os.environ.get("API_PORT", os.environ.get("PORT", 8080)))
+# "waitress" in production; "dev" runs Werkzeug's development server
+API_SERVER = os.environ.get("API_SERVER", "waitress")
+API_THREADS = int(os.environ.get("API_THREADS", 16))
+API_CONNECTION_LIMIT = int(os.environ.get("API_CONNECTION_LIMIT", 200))
+API_TIMEOUT = int(os.environ.get("API_TIMEOUT", 120))
+# Each open event stream holds a worker thread; leave some for everything else
+API_MAX_STREAMS = int(os.environ.get("API_MAX_STREAMS", max(API_THREADS - 4, 1)))
+SHUTDOWN_TIMEOUT = float(os.environ.get("SHUTDOWN_TIMEOUT", 10))
+BULK_MAX_TASKS = 500
+TASKS_PAGE_DEFAULT = 100
+TASKS_PAGE_MAX = 500
+SEARCH_LIMIT_DEFAULT = 20
+SSE_HEARTBEAT_SECONDS = float(os.environ.get("SSE_HEARTBEAT_SECONDS", 15))
+SSE_RETRY_MS = 3000
+
+stream_slots = threading.BoundedSemaphore(API_MAX_STREAMS)
+
+
+def resolve_api_user(token: str):
+    """
+    Map an API token to the Slack user it belongs to.
+    The API_TOKEN env var keeps working as MY_USER_ID's token.
+    """
+    if API_TOKEN and MY_USER_ID and hmac.compare_digest(token.encode(), API_TOKEN.encode()):
+        return MY_USER_ID
+    return db.get_user_by_token(token)
 
 
 def require_auth(f):
-    """Decorator to require API token authentication."""
+    """Decorator to require API token authentication. Sets g.user_id."""
     @wraps(f)
     def decorated(*args, **kwargs):
+        if boot.pending("db"):
+            return starting_up()
         token = request.headers.get("Authorization", "").replace("Bearer ", "")
-        if not token or token != API_TOKEN:
+        user_id = resolve_api_user(token) if token else None
+        if not user_id:
             return jsonify({"error": "Unauthorized"}), 401
+        g.user_id = user_id
         return f(*args, **kwargs)
     return decorated
 
 
+def starting_up():
+    """
+    503 for API calls that arrive while the database phase is still running.
+    The server starts in parallel with it, and until claim_orphaned_data()
+    has finished a task list could be missing the reassigned legacy rows.
+    """
+    response = jsonify({"error": "Starting up"})
+    response.status_code = 503
+    response.headers["Retry-After"] = "1"
+    return response
+
+
+@api.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@api.after_request
+def record_request_metrics(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.http_requests.observe(
+            (route, request.method, str(response.status_code)), time.perf_counter() - started
+        )
+    return response
+
+
+# Registered after the metrics hook so it runs first (Flask runs these in
+# reverse), and the recorded latency includes compression
+@api.after_request
+def compress_response(response):
+    return responses.compress(response, request.accept_encodings)
+
+
+def conditional_json(etag: str, build):
+    """
+    Answer 304 if the client already holds `etag`, otherwise call `build()`
+    and return its result as JSON. Skips the query and encoding on a match.
+    """
+    return conditional_response(etag, lambda: jsonify(build()))
+
+
+def conditional_response(etag: str, respond):
+    """conditional_json() for any response: `respond()` is only called on a miss."""
+    if request.if_none_match.contains_weak(etag):
+        response = api.response_class(status=304)
+    else:
+        response = respond()
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
 @api.route("/api/health", methods=["GET"])
 def api_health():
     """Health check endpoint."""
     return jsonify({"status": "ok", "timestamp": datetime.now().isoformat()})
 
 
+@api.route("/api/ready", methods=["GET"])
+def api_ready():
+    """
+    Readiness check: 200 once every startup phase has finished, 503 until
+    then. Authenticated routes answer 503 too until the database phase
+    (schema and legacy data claim) is done.
+    """
+    status = boot.status()
+    return jsonify(status), 200 if status["ready"] else 503
+
+
+@api.route("/api/metrics", methods=["GET"])
+@require_auth
+def api_metrics():
+    """Latency histograms and scheduler health in the Prometheus text format."""
+    return Response(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @api.route("/api/tasks", methods=["GET"])
 @require_auth
 def api_get_tasks():
-    """Get all pending tasks."""
-    tasks = db.get_pending_tasks()
-    return jsonify({"tasks": tasks})
+    """
+    Get a page of pending tasks, oldest first.
+
+    Query params: limit (default 100, max 500), cursor (next_cursor from the
+    previous page), area, fields (comma-separated, e.g. "id,text").
+    """
+    try:
+        limit = int(request.args.get("limit", TASKS_PAGE_DEFAULT))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    if not 1 <= limit <= TASKS_PAGE_MAX:
+        return jsonify({"error": f"limit must be between 1 and {TASKS_PAGE_MAX}"}), 400
+
+    cursor = request.args.get("cursor") or None
+    area = request.args.get("area") or None
+    fields = request.args.get("fields")
+    fields = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+
+    def build():
+        tasks, next_cursor = db.get_tasks_page(g.user_id, limit, cursor, area, fields)
+        return {"tasks": tasks, "next_cursor": next_cursor}
+
+    query = zlib.crc32(f"{limit}|{cursor}|{area}|{fields}".encode())
+    etag = f"tasks-{g.user_id}-{db.get_data_version(g.user_id)}-{query:08x}"
+    try:
+        return conditional_json(etag, build)
+    except ValueError as e:
+        # Unknown field or bad cursor
+        return jsonify({"error": str(e)}), 400
+
+
+@api.route("/api/tasks/search", methods=["GET"])
+@require_auth
+def api_search_tasks():
+    """
+    Full-text search over all of the user's tasks, including completed and
+    archived ones, best match first.
+
+    Query params: q, limit (default 20, max 500), offset. Matches in each
+    result's `snippet` are wrapped in <mark></mark>; the rest is HTML-escaped.
+    """
+    query = request.args.get("q", "").strip()
+    try:
+        limit = int(request.args.get("limit", SEARCH_LIMIT_DEFAULT))
+        offset = int(request.args.get("offset", 0))
+    except ValueError:
+        return jsonify({"error": "limit and offset must be integers"}), 400
+    if not 1 <= limit <= TASKS_PAGE_MAX:
+        return jsonify({"error": f"limit must be between 1 and {TASKS_PAGE_MAX}"}), 400
+    if offset < 0:
+        return jsonify({"error": "offset must not be negative"}), 400
+
+    def build():
+        results = db.search_tasks(
+            g.user_id, query, limit + 1, offset, ("<mark>", "</mark>"), escape=html.escape
+        )
+        next_offset = offset + limit if len(results) > limit else None
+        return {"results": results[:limit], "next_offset": next_offset}
+
+    key = zlib.crc32(f"{query}|{limit}|{offset}".encode())
+    etag = f"search-{g.user_id}-{db.get_data_version(g.user_id)}-{key:08x}"
+    try:
+        return conditional_json(etag, build)
+    except ValueError as e:
+        # No searchable words in q
+        return jsonify({"error": str(e)}), 400
 
 
 @api.route("/api/tasks", methods=["POST"])
@@ -102,14 +308,10 @@ def api_add_task():
     if area not in ["work", "side_project"]:
         area = "work"
 
-    task_id = db.add_task(text, area)
+    task_id = db.add_task(g.user_id, text, area)
 
-    # Send Slack notification
-    if MY_USER_ID:
-        try:
-            send_dm(MY_USER_ID, f":heavy_plus_sign: *Added from extension:*\n_{text}_")
-        except Exception as e:
-            logger.error(f"Failed to send add notification: {e}")
+    # Send Slack notification (delivered in the background)
+    queue_dm(g.user_id, f":heavy_plus_sign: *Added from extension:*\n_{text}_")
 
     return jsonify({
         "id": task_id,
@@ -120,29 +322,68 @@ def api_add_task():
     }), 201
 
 
+@api.route("/api/tasks/bulk", methods=["POST"])
+@require_auth
+def api_add_tasks_bulk():
+    """Add many tasks in one transaction and send a single Slack notification."""
+    data = request.json or {}
+    raw_tasks = data.get("tasks")
+
+    if not isinstance(raw_tasks, list) or not raw_tasks:
+        return jsonify({"error": "Non-empty 'tasks' list required"}), 400
+    if len(raw_tasks) > BULK_MAX_TASKS:
+        return jsonify({"error": f"At most {BULK_MAX_TASKS} tasks per request"}), 400
+
+    # Each entry is either a string or {"text": ..., "area": ...}
+    items = []
+    for entry in raw_tasks:
+        if isinstance(entry, str):
+            entry = {"text": entry}
+        if not isinstance(entry, dict):
+            return jsonify({"error": "Each task must be a string or an object"}), 400
+        text = str(entry.get("text", "")).strip()
+        if not text:
+            return jsonify({"error": "Task text required"}), 400
+        area = entry.get("area", "work")
+        if area not in ["work", "side_project"]:
+            area = "work"
+        items.append((text, area))
+
+    task_ids = db.add_tasks(g.user_id, items)
+
+    # Send Slack notification (delivered in the background)
+    lines = "\n".join(f"  • _{text}_" for text, _ in items)
+    queue_dm(g.user_id, f":heavy_plus_sign: *Added {len(items)} tasks from extension:*\n{lines}")
+
+    return jsonify({
+        "tasks": [
+            {
+                "id": task_id,
+                "text": text,
+                "area": area,
+                "status": "pending",
+                "carryover_count": 0
+            }
+            for task_id, (text, area) in zip(task_ids, items)
+        ]
+    }), 201
+
+
 @api.route("/api/tasks/<int:task_id>/complete", methods=["POST"])
 @require_auth
 def api_complete_task(task_id):
     """Mark a task as completed and notify via Slack."""
     # Get task details before completing
-    conn = db.get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM tasks WHERE id = ?", (task_id,))
-    task = cursor.fetchone()
-    conn.close()
+    task = db.get_task(g.user_id, task_id)
 
     if not task:
         return jsonify({"error": "Task not found"}), 404
 
     task_text = task["text"]
 
-    if db.complete_task(task_id):
-        # Send Slack notification
-        if MY_USER_ID:
-            try:
-                send_dm(MY_USER_ID, f":white_check_mark: *Completed from extension:*\n_{task_text}_")
-            except Exception as e:
-                logger.error(f"Failed to send completion notification: {e}")
+    if db.complete_task(g.user_id, task_id):
+        # Send Slack notification (delivered in the background)
+        queue_dm(g.user_id, f":white_check_mark: *Completed from extension:*\n_{task_text}_")
 
         return jsonify({"success": True, "text": task_text})
     return jsonify({"error": "Failed to complete task"}), 500
@@ -152,52 +393,157 @@ def api_complete_task(task_id):
 @require_auth
 def api_delete_task(task_id):
     """Delete a task."""
-    if db.delete_task(task_id):
+    if db.delete_task(g.user_id, task_id):
         return jsonify({"success": True})
     return jsonify({"error": "Task not found"}), 404
 
 
+@api.route("/api/export", methods=["GET"])
+@require_auth
+def api_export():
+    """
+    Every task the user has, pending, completed and archived, as
+    {"tasks": [...], "version": n}. Rows are streamed from the database
+    cursor as they are read rather than collected first, so memory use is
+    flat however long the history is.
+    """
+    version = db.get_data_version(g.user_id)
+    return conditional_response(
+        f"export-{g.user_id}-{version}",
+        lambda: Response(
+            responses.stream_json("tasks", db.iter_tasks(g.user_id), version=version),
+            mimetype="application/json"
+        )
+    )
+
+
+@api.route("/api/sync", methods=["GET"])
+@require_auth
+def api_sync():
+    """
+    Changes to the pending list since `since`, the `version` of the
+    client's last sync (omit it, or 0, for the full list):
+
+        {"version": n, "day": d, "full": false, "tasks": [...], "deleted": [ids]}
+
+    Changed tasks come back in any status; the client drops those that are
+    no longer pending and the deleted IDs. See db.get_task_changes().
+    """
+    try:
+        since = int(request.args.get("since", 0))
+    except ValueError:
+        return jsonify({"error": "since must be an integer"}), 400
+    response = jsonify(db.get_task_changes(g.user_id, since))
+    # Every `since` is a new URL; caching them would only fill the client's cache
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
 @api.route("/api/article", methods=["GET"])
 @require_auth
 def api_get_article():
-    """Get today's recommended article."""
-    title, url, description = articles.get_daily_article()
-    return jsonify({
-        "title": title,
-        "url": url,
-        "description": description
-    })
+    """Get today's recommended article (optionally `?tag=`)."""
+    tag = (request.args.get("tag") or "").strip().lower()
+    today = user_today(g.user_id)
+    article = articles.get_daily_article(g.user_id, today, tag)
+    if article is None:
+        return jsonify({"error": f"No articles tagged {tag!r}"}), 404
+
+    def build():
+        return {
+            "title": article.title,
+            "url": article.url,
+            "description": article.description,
+            "tags": list(article.tags)
+        }
+
+    # The pick is fixed for the user's day, whatever happens to their tasks
+    return conditional_json(f"article-{g.user_id}-{today.isoformat()}-{tag}-{article.id}", build)
 
 
 @api.route("/api/stats", methods=["GET"])
 @require_auth
 def api_get_stats():
     """Get task stats including completed today count."""
-    conn = db.get_connection()
-    cursor = conn.cursor()
-
-    # Get pending count
-    cursor.execute("SELECT COUNT(*) FROM tasks WHERE status = 'pending'")
-    pending = cursor.fetchone()[0]
-
-    # Get completed today count
-    today = datetime.now().strftime('%Y-%m-%d')
-    cursor.execute(
-        "SELECT COUNT(*) FROM tasks WHERE status = 'completed' AND DATE(completed_at) = ?",
-        (today,)
+    today = user_today(g.user_id)
+    # completed_today also changes at midnight, so the date is part of the tag
+    etag = f"stats-{g.user_id}-{db.get_data_version(g.user_id)}-{today.isoformat()}"
+    return conditional_json(etag, lambda: db.get_stats(g.user_id, today))
+
+
+def format_sse(event: events.Event) -> str:
+    """Encode an event in the text/event-stream wire format."""
+    return f"id: {event.id}\nevent: {event.type}\ndata: {responses.dumps(event.data).decode()}\n\n"
+
+
+def sse_resume_cursor(resume_from: str = None) -> int:
+    """Event ID to stream from: the client's Last-Event-ID, else only new events."""
+    try:
+        return int(resume_from) if resume_from else events.bus.last_id
+    except ValueError:
+        return events.bus.last_id
+
+
+def sse_chunks(batch: list, cursor: int, user_id: str) -> tuple:
+    """
+    Turn the result of a bus wait into (wire chunks, new cursor). A None
+    batch means the gap can't be replayed, so the client gets `reset`.
+    """
+    if batch is None:
+        cursor = events.bus.last_id
+        return [f"id: {cursor}\nevent: reset\ndata: {{}}\n\n"], cursor
+    if batch:
+        cursor = batch[-1].id
+    # The bus is shared by all users; only stream this caller's events
+    return [format_sse(event) for event in batch if event.user_id == user_id], cursor
+
+
+@api.route("/api/events", methods=["GET"])
+@require_auth
+def api_events():
+    """
+    Stream task changes as Server-Sent Events.
+    Clients resume with Last-Event-ID; if the gap can't be replayed they get a
+    `reset` event and should refetch /api/tasks.
+    """
+    if not stream_slots.acquire(blocking=False):
+        # EventSource reconnects on its own after the Retry-After delay
+        response = jsonify({"error": "Too many open event streams"})
+        response.headers["Retry-After"] = str(SSE_RETRY_MS // 1000)
+        return response, 503
+
+    cursor = sse_resume_cursor(
+        request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
     )
-    completed_today = cursor.fetchone()[0]
 
-    conn.close()
-    return jsonify({
-        "pending": pending,
-        "completed_today": completed_today
+    def stream(user_id, cursor):
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        last_write = time.monotonic()
+        while not events.bus.closed:
+            batch = events.bus.wait(cursor, timeout=SSE_HEARTBEAT_SECONDS)
+            chunks, cursor = sse_chunks(batch, cursor, user_id)
+            if chunks:
+                last_write = time.monotonic()
+                yield from chunks
+            elif time.monotonic() - last_write >= SSE_HEARTBEAT_SECONDS:
+                # Heartbeat keeps proxies from closing an idle connection
+                last_write = time.monotonic()
+                yield ": keepalive\n\n"
+
+    response = Response(stream(g.user_id, cursor), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
     })
+    response.call_on_close(stream_slots.release)
+    return response
 
 
-def run_api():
-    """Run the Flask API server in a separate thread."""
-    api.run(host="0.0.0.0", port=API_PORT, threaded=True, use_reloader=False)
+def start_api():
+    """Bind the HTTP API and serve it from a background thread."""
+    return server.ApiServer(
+        api, port=API_PORT, mode=API_SERVER, threads=API_THREADS,
+        connection_limit=API_CONNECTION_LIMIT, timeout=API_TIMEOUT
+    ).start()
 
 
 # ============================================
@@ -223,32 +569,188 @@ def format_task_list(tasks: list, show_ids: bool = True) -> str:
     return "\n".join(lines)
 
 
-def send_dm(user_id: str, text: str, blocks: list = None):
-    """Send a direct message to a user."""
+def task_list_page(user_id: str, cursor: str = None, shown: int = 0) -> tuple:
+    """
+    (text, blocks) for one page of the `list` command, with a "Next page"
+    button when more tasks follow. `shown` is how many earlier pages listed.
+    """
+    tasks, next_cursor = db.get_tasks_page(user_id, LIST_PAGE_SIZE, cursor)
+    if not tasks and shown:
+        return "_No more pending tasks._", None
+
+    if next_cursor or shown:
+        total = db.get_stats(user_id)["pending"]
+        header = f"*Your Tasks* ({shown + 1}-{shown + len(tasks)} of {total}):"
+    else:
+        header = "*Your Tasks:*"
+    text = f"{header}\n{format_task_list(tasks)}"
+    if not next_cursor:
+        return text, None
+
+    blocks = [
+        {
+            "type": "section",
+            "text": {"type": "mrkdwn", "text": text}
+        },
+        {
+            "type": "actions",
+            "elements": [
+                {
+                    "type": "button",
+                    "text": {"type": "plain_text", "text": "Next page"},
+                    "action_id": "list_next_page",
+                    "value": f"{shown + len(tasks)}:{next_cursor}"
+                }
+            ]
+        }
+    ]
+    return text, blocks
+
+
+def search_results_page(user_id: str, query: str, offset: int = 0) -> tuple:
+    """(text, blocks) for one page of `find` results, with a "More results" button."""
+    results = db.search_tasks(user_id, query, SEARCH_PAGE_SIZE + 1, offset)
+    more = len(results) > SEARCH_PAGE_SIZE
+    results = results[:SEARCH_PAGE_SIZE]
+    if not results:
+        return (f"No more tasks matching _{query}_." if offset
+                else f"No tasks matching _{query}_."), None
+
+    lines = []
+    for r in results:
+        check = ":white_check_mark:" if r["status"] == "completed" else ":white_square:"
+        archived = " _(archived)_" if r["archived"] else ""
+        lines.append(f"{check} *{r['id']}*. {r['snippet']}{archived}")
+    text = f"*Tasks matching _{query}_:*\n" + "\n".join(lines)
+
+    # Button values are capped at 2000 characters
+    value = f"{offset + len(results)}:{query}"
+    if not more or len(value) > 2000:
+        return text, None
+
+    blocks = [
+        {
+            "type": "section",
+            "text": {"type": "mrkdwn", "text": text}
+        },
+        {
+            "type": "actions",
+            "elements": [
+                {
+                    "type": "button",
+                    "text": {"type": "plain_text", "text": "More results"},
+                    "action_id": "search_next_page",
+                    "value": value
+                }
+            ]
+        }
+    ]
+    return text, blocks
+
+
+# user_id -> DM channel ID. Backed by the dm_channels table across restarts.
+_dm_channels = {}
+
+
+def get_dm_channel(user_id: str) -> str:
+    """Get the DM channel for a user, opening it only if it isn't cached."""
+    channel_id = _dm_channels.get(user_id)
+    if channel_id is None:
+        channel_id = db.get_dm_channel(user_id)
+        if channel_id is None:
+            response = app.client.conversations_open(users=[user_id])
+            channel_id = response["channel"]["id"]
+            db.save_dm_channel(user_id, channel_id)
+        _dm_channels[user_id] = channel_id
+    return channel_id
+
+
+def forget_dm_channel(user_id: str):
+    """Invalidate a cached DM channel."""
+    _dm_channels.pop(user_id, None)
+    db.forget_dm_channel(user_id)
+
+
+def post_dm(user_id: str, text: str, blocks: list = None):
+    """Send a direct message to a user. Raises on failure."""
     try:
-        response = app.client.conversations_open(users=[user_id])
-        channel_id = response["channel"]["id"]
         app.client.chat_postMessage(
-            channel=channel_id,
+            channel=get_dm_channel(user_id),
             text=text,
             blocks=blocks
         )
+    except SlackApiError as e:
+        if e.response.get("error") != "channel_not_found":
+            raise
+        # Cached channel is stale: reopen the DM and try once more
+        forget_dm_channel(user_id)
+        app.client.chat_postMessage(
+            channel=get_dm_channel(user_id),
+            text=text,
+            blocks=blocks
+        )
+
+
+def send_dm(user_id: str, text: str, blocks: list = None):
+    """Send a direct message to a user, waiting for Slack."""
+    try:
+        post_dm(user_id, text, blocks)
     except Exception as e:
         logger.error(f"Failed to send DM: {e}")
 
 
+# Outbound notifications that shouldn't hold up an HTTP response
+notifications = delivery.DeliveryQueue(
+    post_dm,
+    workers=int(os.environ.get("DELIVERY_WORKERS", 2)),
+    max_retries=int(os.environ.get("DELIVERY_MAX_RETRIES", 3))
+)
+
+
+def queue_dm(user_id: str, text: str, blocks: list = None):
+    """Queue a direct message for background delivery and return immediately."""
+    notifications.enqueue(user_id, text, blocks)
+
+
 # ============================================
 # Morning Planning Flow
 # ============================================
 
-def morning_planning_message() -> tuple:
-    """Generate the morning planning message."""
-    tasks = db.get_pending_tasks()
-    stuck = db.get_stuck_tasks(min_carryover=3)
+def morning_planning_message(user_id: str, today: date = None) -> tuple:
+    """Start the user's day and return its digest (`today` is the user's local date)."""
+    today = today or date.today()
+    digest = morning_digest(user_id, today)
+    # A no-op if the day already started; the digest already accounts for it
+    db.start_day(user_id, today)
+    return digest
+
+
+def morning_digest(user_id: str, today: date) -> tuple:
+    """
+    The digest for `today`, reused from the cache when none of the user's
+    data has changed since it was built. Safe to call ahead of time to warm
+    the cache: the only write is fixing the day's article pick.
+    """
+    version = db.get_data_version(user_id)
+    cached = db.get_cached_digest(user_id, today, version)
+    if cached:
+        return cached
+    text, blocks = build_morning_digest(user_id, today)
+    db.save_cached_digest(user_id, today, version, text, blocks)
+    return text, blocks
 
-    # Increment carryover for all pending tasks (new day)
-    for t in tasks:
-        db.increment_carryover(t["id"])
+
+def build_morning_digest(user_id: str, today: date) -> tuple:
+    """Build the digest as it reads once `today` has started."""
+    # The digest reports how long each task had waited before this morning's
+    # rollover. If the day has already started, undo its increment.
+    user = db.get_user(user_id)
+    started = bool(user and user["last_date"] and str(user["last_date"]) >= today.isoformat())
+    tasks = db.get_pending_tasks(user_id)
+    if started:
+        for t in tasks:
+            t["carryover_count"] = max(t["carryover_count"] - 1, 0)
+    stuck = [t for t in tasks if t["carryover_count"] >= 3]
 
     text = ":sunrise: *Good morning! Let's plan your day.*\n\n"
 
@@ -283,8 +785,8 @@ def morning_planning_message() -> tuple:
         text += "\n"
 
     # Daily article recommendation
-    title, url, description = articles.get_daily_article()
-    text += articles.format_article_block(title, url, description)
+    article = articles.get_daily_article(user_id, today)
+    text += articles.format_article_block(article.title, article.url, article.description)
     text += "\n\n"
 
     text += "*What would make today a win?*\n"
@@ -316,22 +818,83 @@ def morning_planning_message() -> tuple:
     return text, blocks
 
 
+def send_morning_planning(user_id: str):
+    """Build and send the morning planning DM for one user."""
+    logger.info(f"Sending morning planning to {user_id}")
+    text, blocks = morning_planning_message(user_id, today=user_today(user_id))
+    send_dm(user_id, text, blocks)
+    logger.info("Morning planning sent successfully")
+
+
+def send_morning_digest(user_id: str, local_date: date):
+    """Scheduled digest for one user. Raises on failure so the fan-out can retry."""
+    text, blocks = morning_planning_message(user_id, today=local_date)
+    post_dm(user_id, text, blocks)
+
+
+morning_fanout = digests.MorningFanout(
+    send_morning_digest,
+    prepare_digest=morning_digest,
+    prepare_minutes=DIGEST_PREPARE_MINUTES,
+    workers=DIGEST_WORKERS,
+    rate_per_second=DIGEST_RATE_PER_SECOND,
+    grace_minutes=DIGEST_GRACE_MINUTES,
+    claim_timeout_minutes=DIGEST_CLAIM_TIMEOUT_MINUTES
+)
+
+
 def trigger_morning_planning():
-    """Send morning planning DM (called by scheduler)."""
-    logger.info(f"=== SCHEDULER TRIGGERED at {datetime.now()} ===")
-    if MY_USER_ID:
-        logger.info(f"Sending morning planning to {MY_USER_ID}")
-        text, blocks = morning_planning_message()
-        send_dm(MY_USER_ID, text, blocks)
-        logger.info("Morning planning sent successfully")
-    else:
-        logger.error("MY_USER_ID not set - cannot send morning planning")
+    """Send morning digests that are due (called by the scheduler every minute)."""
+    morning_fanout.tick()
+
+
+def normalize_morning_time(value: str) -> str:
+    """"9:30" -> "09:30", so schedule times compare correctly as text."""
+    hour, minute = value.split(":")
+    return f"{int(hour):02d}:{int(minute):02d}"
+
+
+def describe_schedule(user_id: str) -> str:
+    user = db.get_user(user_id)
+    if not user or not user["morning_time"]:
+        return "off"
+    return f"{user['morning_time']} {user['timezone']}"
+
+
+def user_today(user_id: str) -> date:
+    """The user's local date, in their schedule's timezone (or TIMEZONE)."""
+    user = db.get_user(user_id)
+    try:
+        return datetime.now(ZoneInfo((user and user["timezone"]) or TIMEZONE)).date()
+    except (ZoneInfoNotFoundError, ValueError):
+        return date.today()
 
 
 # ============================================
 # Message Handlers
 # ============================================
 
+COMMAND_HANDLERS = {}
+
+USAGE = {
+    "add": "Usage: `add [task description]`\nOptional: `add [side] task` for side projects\n\nYou can also add multiple tasks with a bulleted list:\n```\nadd\n- Task one\n- Task two\n- Task three\n```",
+    "done": "Usage: `done [task_id]` (e.g., `done 3`)",
+    "delete": "Usage: `delete [task_id]` (e.g., `delete 3`)",
+    "win": "Usage: `win: [what would make today a win]`",
+    "find": "Usage: `find [words]` (e.g., `find login bug`). Searches completed and archived tasks too.",
+    "schedule": "Usage: `schedule HH:MM [timezone]` (e.g., `schedule 09:00 Europe/Berlin`) or `schedule off`",
+    "read": "Usage: `read` for today's article, or `read [tag]` (e.g., `read philosophy`)",
+}
+
+
+def command(command_type):
+    """Register a handler for a parsed command type (see commands.py)."""
+    def register(f):
+        COMMAND_HANDLERS[command_type] = f
+        return f
+    return register
+
+
 @app.event("message")
 def handle_message(event, say):
     """Handle direct messages to the bot."""
@@ -339,174 +902,161 @@ def handle_message(event, say):
     if event.get("channel_type") != "im":
         return
 
-    # Ignore bot's own messages
-    if event.get("bot_id"):
+    # Ignore bot's own messages (and edits/deletes, which have no sender)
+    if event.get("bot_id") or not event.get("user"):
         return
 
-    text = event.get("text", "").strip().lower()
-    original_text = event.get("text", "").strip()
-
-    # --- ADD TASK (single or bulleted list) ---
-    if text.startswith("add ") or text.startswith("add\n"):
-        task_text = original_text[3:].strip()  # Skip "add", then strip whitespace/newlines
-        if task_text:
-            # Check if it's a bulleted list (multiple tasks)
-            import re
-            lines = task_text.split('\n')
-            bullet_pattern = re.compile(r'^[\-\*\•\●\○\◦\▪\▸\►\◆\→\»]\s*(.+)$|^(\d+[\.\)]\s*)(.+)$')
-
-            tasks_to_add = []
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                match = bullet_pattern.match(line)
-                if match:
-                    # Extract task text from bullet or numbered list
-                    task = match.group(1) or match.group(3)
-                    if task:
-                        tasks_to_add.append(task.strip())
-                elif len(lines) == 1:
-                    # Single task, no bullet
-                    tasks_to_add.append(line)
-
-            # If no bullets found but multiple lines, treat each line as a task
-            if not tasks_to_add and len(lines) > 1:
-                tasks_to_add = [l.strip() for l in lines if l.strip()]
-
-            # Fallback: single task
-            if not tasks_to_add:
-                tasks_to_add = [task_text]
-
-            # Add all tasks
-            added = []
-            for task in tasks_to_add:
-                area = "work"
-                if task.lower().startswith("[side]") or task.lower().startswith("[project]"):
-                    area = "side_project"
-                    task = task.split("]", 1)[1].strip()
-                task_id = db.add_task(task, area)
-                added.append(f"#{task_id} {task}")
-
-            if len(added) == 1:
-                say(f":white_check_mark: Added: *{tasks_to_add[0]}* (#{task_id})")
-            else:
-                response = f":white_check_mark: Added {len(added)} tasks:\n"
-                for item in added:
-                    response += f"  • {item}\n"
-                say(response)
-        else:
-            say("Usage: `add [task description]`\nOptional: `add [side] task` for side projects\n\nYou can also add multiple tasks with a bulleted list:\n```\nadd\n- Task one\n- Task two\n- Task three\n```")
+    cmd = commands.parse(event.get("text", ""))
+    with metrics.slack_commands.time(type(cmd).__name__):
+        COMMAND_HANDLERS[type(cmd)](cmd, event["user"], say)
 
-    # --- LIST TASKS ---
-    elif text in ["list", "tasks", "show", "ls"]:
-        tasks = db.get_pending_tasks()
-        say(f"*Your Tasks:*\n{format_task_list(tasks)}")
 
-    # --- COMPLETE TASK ---
-    elif text.startswith("done ") or text.startswith("complete "):
-        try:
-            parts = text.split()
-            task_id = int(parts[1].replace("#", ""))
-            if db.complete_task(task_id):
-                say(f":tada: Marked #{task_id} as done!")
-            else:
-                say(f"Couldn't find task #{task_id}")
-        except (IndexError, ValueError):
-            say("Usage: `done [task_id]` (e.g., `done 3`)")
-
-    # --- DELETE TASK ---
-    elif text.startswith("delete ") or text.startswith("remove "):
-        try:
-            parts = text.split()
-            task_id = int(parts[1].replace("#", ""))
-            if db.delete_task(task_id):
-                say(f":wastebasket: Deleted task #{task_id}")
-            else:
-                say(f"Couldn't find task #{task_id}")
-        except (IndexError, ValueError):
-            say("Usage: `delete [task_id]` (e.g., `delete 3`)")
-
-    # --- MORNING FOCUS ---
-    elif text in ["focus", "morning", "plan", "start"]:
-        text_msg, blocks = morning_planning_message()
-        say(text=text_msg, blocks=blocks)
-
-    # --- REFOCUS ---
-    elif text in ["refocus", "stuck", "help me focus"]:
-        plan = db.get_today_plan()
-        tasks = db.get_pending_tasks()
-
-        if not tasks:
-            say(":thinking_face: You have no pending tasks. Add some with `add [task]`")
-            return
-
-        # Find the smallest/easiest next step
-        msg = ":dart: *Let's refocus.*\n\n"
-
-        if plan and plan.get("win_criteria"):
-            msg += f"This morning you said a win would be: _{plan['win_criteria']}_\n\n"
-
-        msg += "*Your pending tasks:*\n"
-        msg += format_task_list(tasks[:5])  # Show top 5
-
-        if len(tasks) > 5:
-            msg += f"\n_...and {len(tasks) - 5} more_\n"
-
-        msg += "\n:point_right: *Pick ONE. What's the smallest next step you can take right now?*"
-
-        say(msg)
-
-    # --- SET WIN CRITERIA ---
-    elif text.startswith("win:") or text.startswith("today:"):
-        win_text = original_text.split(":", 1)[1].strip()
-        if win_text:
-            tasks = db.get_pending_tasks()
-            focus_items = [t["text"] for t in tasks[:3]]  # Top 3
-            db.save_daily_plan(focus_items, win_text)
-            say(f":star: Got it! Today's win: *{win_text}*\n\nNow go make it happen!")
-        else:
-            say("Usage: `win: [what would make today a win]`")
-
-    # --- DEMO (sample morning message) ---
-    elif text == "demo":
-        # Create sample data for demo
-        demo_text = ":sunrise: *Good morning! Let's plan your day.*\n\n"
-        demo_text += ":repeat: *Spillovers from previous days:*\n"
-        demo_text += "  - Finish API documentation (day 2)\n"
-        demo_text += "  - Review pull request #42 (day 3) :warning:\n\n"
-        demo_text += ":clipboard: *Added yesterday (not yet started):*\n"
-        demo_text += "  - Set up monitoring alerts\n"
-        demo_text += "  - Call with design team\n\n"
-        demo_text += "_You have 4 pending items. 2 carried over - consider prioritizing these today._\n\n"
-        demo_text += ":rotating_light: *Stuck for 3+ days (what's blocking these?):*\n"
-        demo_text += "  - Review pull request #42 (day 3)\n\n"
-        title, url, description = articles.get_daily_article()
-        demo_text += articles.format_article_block(title, url, description)
-        demo_text += "\n\n"
-        demo_text += "*What would make today a win?*\n"
-        demo_text += "_Reply with your focus for today, or type `add [task]` to add items._"
-        say(demo_text)
-
-    # --- ARTICLE / READ ---
-    elif text in ["read", "article", "reading"]:
-        title, url, description = articles.get_daily_article()
-        say(articles.format_article_block(title, url, description))
-
-    # --- TEST SCHEDULER (debug) ---
-    elif text == "testmorning":
-        trigger_morning_planning()
-        say(":gear: Manually triggered morning planning.")
-
-    # --- HELP ---
-    elif text in ["help", "?", "commands"]:
-        help_text = """
+# --- ADD TASK (single or bulleted list) ---
+@command(commands.AddTasks)
+def handle_add(cmd, user_id, say):
+    # Add all tasks in one transaction
+    task_ids = db.add_tasks(user_id, cmd.items)
+    added = [f"#{task_id} {text}" for task_id, (text, _) in zip(task_ids, cmd.items)]
+
+    if len(added) == 1:
+        say(f":white_check_mark: Added: *{cmd.first_text}* (#{task_ids[0]})")
+    else:
+        response = f":white_check_mark: Added {len(added)} tasks:\n"
+        for item in added:
+            response += f"  • {item}\n"
+        say(response)
+
+
+# --- LIST TASKS ---
+@command(commands.ListTasks)
+def handle_list(cmd, user_id, say):
+    text, blocks = task_list_page(user_id)
+    say(text=text, blocks=blocks)
+
+
+# --- FIND TASKS ---
+@command(commands.FindTasks)
+def handle_find(cmd, user_id, say):
+    try:
+        text, blocks = search_results_page(user_id, cmd.query)
+    except ValueError:
+        say(USAGE["find"])
+        return
+    say(text=text, blocks=blocks)
+
+
+# --- COMPLETE TASK ---
+@command(commands.CompleteTask)
+def handle_done(cmd, user_id, say):
+    if db.complete_task(user_id, cmd.task_id):
+        say(f":tada: Marked #{cmd.task_id} as done!")
+    else:
+        say(f"Couldn't find task #{cmd.task_id}")
+
+
+# --- DELETE TASK ---
+@command(commands.DeleteTask)
+def handle_delete(cmd, user_id, say):
+    if db.delete_task(user_id, cmd.task_id):
+        say(f":wastebasket: Deleted task #{cmd.task_id}")
+    else:
+        say(f"Couldn't find task #{cmd.task_id}")
+
+
+# --- MORNING FOCUS ---
+@command(commands.MorningFocus)
+def handle_focus(cmd, user_id, say):
+    text_msg, blocks = morning_planning_message(user_id, today=user_today(user_id))
+    say(text=text_msg, blocks=blocks)
+
+
+# --- REFOCUS ---
+@command(commands.Refocus)
+def handle_refocus(cmd, user_id, say):
+    plan = db.get_today_plan(user_id, day=user_today(user_id))
+    tasks = db.get_pending_tasks(user_id)
+
+    if not tasks:
+        say(":thinking_face: You have no pending tasks. Add some with `add [task]`")
+        return
+
+    # Find the smallest/easiest next step
+    msg = ":dart: *Let's refocus.*\n\n"
+
+    if plan and plan.get("win_criteria"):
+        msg += f"This morning you said a win would be: _{plan['win_criteria']}_\n\n"
+
+    msg += "*Your pending tasks:*\n"
+    msg += format_task_list(tasks[:5])  # Show top 5
+
+    if len(tasks) > 5:
+        msg += f"\n_...and {len(tasks) - 5} more_\n"
+
+    msg += "\n:point_right: *Pick ONE. What's the smallest next step you can take right now?*"
+
+    say(msg)
+
+
+# --- SET WIN CRITERIA ---
+@command(commands.SetWin)
+def handle_win(cmd, user_id, say):
+    tasks = db.get_pending_tasks(user_id)
+    focus_items = [t["text"] for t in tasks[:3]]  # Top 3
+    db.save_daily_plan(user_id, focus_items, cmd.text, day=user_today(user_id))
+    say(f":star: Got it! Today's win: *{cmd.text}*\n\nNow go make it happen!")
+
+
+# --- DEMO (sample morning message) ---
+@command(commands.Demo)
+def handle_demo(cmd, user_id, say):
+    # Create sample data for demo
+    demo_text = ":sunrise: *Good morning! Let's plan your day.*\n\n"
+    demo_text += ":repeat: *Spillovers from previous days:*\n"
+    demo_text += "  - Finish API documentation (day 2)\n"
+    demo_text += "  - Review pull request #42 (day 3) :warning:\n\n"
+    demo_text += ":clipboard: *Added yesterday (not yet started):*\n"
+    demo_text += "  - Set up monitoring alerts\n"
+    demo_text += "  - Call with design team\n\n"
+    demo_text += "_You have 4 pending items. 2 carried over - consider prioritizing these today._\n\n"
+    demo_text += ":rotating_light: *Stuck for 3+ days (what's blocking these?):*\n"
+    demo_text += "  - Review pull request #42 (day 3)\n\n"
+    article = articles.get_daily_article(user_id, user_today(user_id))
+    demo_text += articles.format_article_block(article.title, article.url, article.description)
+    demo_text += "\n\n"
+    demo_text += "*What would make today a win?*\n"
+    demo_text += "_Reply with your focus for today, or type `add [task]` to add items._"
+    say(demo_text)
+
+
+# --- ARTICLE / READ ---
+@command(commands.ReadArticle)
+def handle_read(cmd, user_id, say):
+    article = articles.get_daily_article(user_id, user_today(user_id), cmd.tag)
+    if article is None:
+        tags = ", ".join(f"`{tag}`" for tag, _ in articles.get_tags())
+        say(f"No articles tagged `{cmd.tag}`. Try one of: {tags}")
+        return
+    say(articles.format_article_block(article.title, article.url, article.description))
+
+
+# --- TEST SCHEDULER (debug) ---
+@command(commands.TestMorning)
+def handle_test_morning(cmd, user_id, say):
+    send_morning_planning(user_id)
+    say(":gear: Manually triggered morning planning.")
+
+
+# --- HELP ---
+@command(commands.Help)
+def handle_help(cmd, user_id, say):
+    help_text = """
 :wave: *FocusPrompter Commands*
 
 *Adding & Managing Tasks:*
 - `add [task]` - Add a new task
 - `add [side] task` - Add to side projects
 - `list` - Show all pending tasks
+- `find [words]` - Search all your tasks, even finished ones
 - `done [id]` - Mark task complete
 - `delete [id]` - Remove a task
 
@@ -514,20 +1064,62 @@ def handle_message(event, say):
 - `focus` - Start morning planning
 - `refocus` - Get back on track
 - `win: [text]` - Set today's win criteria
-- `read` - Get today's article recommendation
+- `read` - Get today's article recommendation (`read [tag]` for a topic)
+- `token` - Get an API token for the Chrome extension
+- `schedule HH:MM [timezone]` - Set your morning DM time (`schedule off` to stop)
 
 *Tips:*
-- I'll DM you each morning at {time}
+- Your morning DM: {schedule}
 - Tasks that carry over get tracked
 - If something's stuck for 3+ days, I'll ask why
-        """.format(time=MORNING_TIME)
-        say(help_text)
+    """.format(schedule=describe_schedule(user_id))
+    say(help_text)
 
-    # --- UNKNOWN ---
-    else:
-        # Treat as a task if it looks like one
-        if len(original_text) > 3 and not original_text.startswith("/"):
-            say(f"Not sure what you mean. Did you want to add a task?\n`add {original_text}`\n\nType `help` for commands.")
+
+# --- API TOKEN (for the Chrome extension) ---
+@command(commands.ApiToken)
+def handle_token(cmd, user_id, say):
+    token = db.create_api_token(user_id)
+    say(
+        f":key: Your API token for the Chrome extension:\n`{token}`\n\n"
+        "Paste it into the extension settings. Asking again replaces it."
+    )
+
+
+# --- MORNING SCHEDULE ---
+@command(commands.Schedule)
+def handle_schedule(cmd, user_id, say):
+    if cmd.off:
+        db.set_morning_schedule(user_id, None, None)
+        say(":no_bell: Morning DMs turned off. Use `schedule HH:MM` to turn them back on.")
+        return
+    if cmd.time is None:
+        say(f":alarm_clock: Your morning DM: {describe_schedule(user_id)}\n\n{USAGE['schedule']}")
+        return
+
+    user = db.get_user(user_id)
+    tz_name = cmd.timezone or (user and user["timezone"]) or TIMEZONE
+    try:
+        ZoneInfo(tz_name)
+    except (ZoneInfoNotFoundError, ValueError):
+        say(f"Unknown timezone `{tz_name}`. Use a name like `America/New_York`.")
+        return
+    db.set_morning_schedule(user_id, cmd.time, tz_name)
+    say(f":alarm_clock: I'll DM you each morning at {cmd.time} {tz_name}.")
+
+
+# --- BAD ARGUMENTS ---
+@command(commands.Usage)
+def handle_usage(cmd, user_id, say):
+    say(USAGE[cmd.command])
+
+
+# --- UNKNOWN ---
+@command(commands.Unknown)
+def handle_unknown(cmd, user_id, say):
+    # Treat as a task if it looks like one
+    if len(cmd.text) > 3 and not cmd.text.startswith("/"):
+        say(f"Not sure what you mean. Did you want to add a task?\n`add {cmd.text}`\n\nType `help` for commands.")
 
 
 # ============================================
@@ -538,8 +1130,8 @@ def handle_message(event, say):
 def handle_show_all(ack, body, client):
     """Handle 'Show All Tasks' button."""
     ack()
-    tasks = db.get_pending_tasks()
     user_id = body["user"]["id"]
+    tasks = db.get_pending_tasks(user_id)
 
     work_tasks = [t for t in tasks if t["area"] == "work"]
     side_tasks = [t for t in tasks if t["area"] == "side_project"]
@@ -555,6 +1147,30 @@ def handle_show_all(ack, body, client):
     send_dm(user_id, msg)
 
 
+@app.action("list_next_page")
+def handle_list_next_page(ack, body, client):
+    """Handle 'Next page' on a task list."""
+    ack()
+    user_id = body["user"]["id"]
+    shown, cursor = body["actions"][0]["value"].split(":", 1)
+    try:
+        text, blocks = task_list_page(user_id, cursor, int(shown))
+    except ValueError:
+        send_dm(user_id, "That list is out of date. Type `list` to start again.")
+        return
+    send_dm(user_id, text, blocks)
+
+
+@app.action("search_next_page")
+def handle_search_next_page(ack, body, client):
+    """Handle 'More results' on search results."""
+    ack()
+    user_id = body["user"]["id"]
+    offset, query = body["actions"][0]["value"].split(":", 1)
+    text, blocks = search_results_page(user_id, query, int(offset))
+    send_dm(user_id, text, blocks)
+
+
 @app.action("ready_to_work")
 def handle_ready(ack, body, client):
     """Handle 'Ready to Work' button."""
@@ -570,31 +1186,124 @@ def handle_ready(ack, body, client):
 # Scheduler Setup
 # ============================================
 
-def setup_scheduler():
-    """Set up the morning planning scheduler."""
-    tz = pytz.timezone(TIMEZONE)
-    scheduler = BackgroundScheduler(timezone=tz)
+def run_compaction():
+    """Archive old completed tasks, prune sync tombstones and give the freed space back (nightly job)."""
+    moved = db.archive_completed_tasks(ARCHIVE_AFTER_DAYS)
+    pruned = db.prune_task_changes(SYNC_TOMBSTONE_DAYS)
+    freed = db.compact()
+    logger.info(
+        f"Compaction: archived {moved} completed task(s), pruned {pruned} tombstone(s), "
+        f"freed {freed} page(s)"
+    )
+
+
+def setup_scheduler(scheduler=None):
+    """
+    Check every minute for users whose morning digest is due. Uses a
+    BackgroundScheduler unless given another (unstarted) APScheduler one.
+    """
+    # Imported here to keep them off the cold-start import path
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from apscheduler.triggers.cron import CronTrigger
+    import pytz
+
+    if scheduler is None:
+        scheduler = BackgroundScheduler(timezone=pytz.utc)
 
-    hour, minute = MORNING_TIME.split(":")
     scheduler.add_job(
         trigger_morning_planning,
-        CronTrigger(hour=int(hour), minute=int(minute), timezone=tz),  # explicit timezone
+        CronTrigger(minute="*", timezone=pytz.utc),
         id="morning_planning",
         replace_existing=True,
-        misfire_grace_time=300  # 5 min grace period if job missed
+        max_instances=1,
+        coalesce=True,
+        misfire_grace_time=30  # the fan-out catches up on missed slots itself
     )
 
+    if ARCHIVE_AFTER_DAYS > 0:
+        scheduler.add_job(
+            run_compaction,
+            CronTrigger(hour=4, minute=17, timezone=pytz.utc),
+            id="compaction",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+            misfire_grace_time=3600
+        )
+
+    metrics.watch_scheduler(scheduler)
     scheduler.start()
 
     # Log next scheduled run
     job = scheduler.get_job("morning_planning")
     if job and job.next_run_time:
-        logger.info(f"Scheduler started. Morning planning at {MORNING_TIME} {TIMEZONE}")
+        logger.info("Scheduler started. Checking for due morning digests every minute")
         logger.info(f"Next scheduled run: {job.next_run_time.strftime('%Y-%m-%d %H:%M:%S %Z')}")
 
     return scheduler
 
 
+# ============================================
+# Startup
+# ============================================
+
+def prepare_database():
+    """Bring the schema up to date and apply MY_USER_ID's defaults."""
+    db.init_db()
+    if not MY_USER_ID:
+        return
+    if db.claim_orphaned_data(MY_USER_ID):
+        logger.info(f"Assigned existing single-user tasks to {MY_USER_ID}")
+    # MORNING_TIME/TIMEZONE are MY_USER_ID's schedule until they set one
+    # with `schedule` (a user who turned it off keeps their timezone)
+    user = db.get_user(MY_USER_ID)
+    if not user or not user["timezone"]:
+        db.set_morning_schedule(MY_USER_ID, normalize_morning_time(MORNING_TIME), TIMEZONE)
+
+
+def check_slack_auth():
+    """Fail fast on a bad bot token."""
+    app.client.auth_test()
+
+
+def connect_socket_mode():
+    """Open the Socket Mode connection (events start flowing once this returns)."""
+    from slack_bolt.adapter.socket_mode import SocketModeHandler
+
+    handler = SocketModeHandler(app, os.environ.get("SLACK_APP_TOKEN"))
+    handler.connect()
+    return handler
+
+
+def shutdown(services: dict, timeout: float = SHUTDOWN_TIMEOUT):
+    """
+    Stop in dependency order: take new work off (readiness, Slack events,
+    scheduled jobs), let in-flight API requests and event streams finish,
+    deliver queued messages, then close the database. `services` holds
+    whatever startup got as far as starting.
+    """
+    boot.begin_shutdown()
+    steps = []
+    if "socket_mode" in services:
+        steps.append(("socket_mode", services["socket_mode"].close))
+    if "scheduler" in services:
+        steps.append(("scheduler", services["scheduler"].shutdown))
+    steps.append(("events", events.bus.close))
+    if "api" in services:
+        steps.append(("api", lambda: services["api"].stop(timeout)))
+    steps += [
+        ("digests", morning_fanout.shutdown),
+        ("notifications", lambda: notifications.stop(timeout)),
+        ("db", db.close_connections),
+    ]
+    for name, stop in steps:
+        try:
+            stop()
+        except Exception as e:
+            logger.error(f"Error stopping {name}: {e}")
+    logger.info("Shutdown complete")
+
+
 # ============================================
 # Main
 # ============================================
@@ -612,30 +1321,41 @@ if __name__ == "__main__":
     if not MY_USER_ID:
         print("Warning: MY_USER_ID not set. Scheduled morning messages won't work.")
 
-    # Start HTTP API server in background thread (for Chrome extension)
-    if API_TOKEN:
-        api_thread = threading.Thread(target=run_api, daemon=True)
-        api_thread.start()
-        logger.info(f"API server started on port {API_PORT}")
-    else:
-        logger.warning("API_TOKEN not set - HTTP API disabled")
-
-    # Start scheduler
-    scheduler = setup_scheduler()
+    boot.record("imports", time.perf_counter() - startup.STARTED)
+    try:
+        # Bring it all up at once. The API only depends on the database
+        # phase, and its routes answer 503 until that is done (starting_up);
+        # the scheduler only needs the schema
+        services = boot.run_parallel({
+            "db": prepare_database,
+            "api": start_api,
+            "slack_auth": check_slack_auth,
+            "socket_mode": connect_socket_mode,
+        })
+        services["scheduler"] = boot.run("scheduler", setup_scheduler)
+    except Exception as e:
+        logger.error(f"Startup failed: {e}")
+        exit(1)
+    boot.log_summary()
 
-    # Start bot
     print(f"""
     ================================
     FocusPrompter is running!
     ================================
-    Morning planning: {MORNING_TIME} {TIMEZONE}
+    Morning planning: {describe_schedule(MY_USER_ID) if MY_USER_ID else 'per user'}
     User ID: {MY_USER_ID or 'Not set'}
-    API: {'Enabled on port ' + str(API_PORT) if API_TOKEN else 'Disabled (set API_TOKEN)'}
+    API: {API_SERVER} on port {API_PORT} (readiness: /api/ready)
 
     DM the bot in Slack to get started.
     Type 'help' for commands.
     ================================
     """)
 
-    handler = SocketModeHandler(app, os.environ.get("SLACK_APP_TOKEN"))
-    handler.start()
+    # Everything runs on its own threads; wait here for SIGTERM (sent by
+    # Railway when scaling down) or Ctrl-C, then shut down cleanly
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    stop.wait()
+    logger.info("Shutting down")
+    shutdown(services)
@@ -0,0 +1,319 @@
+"""
+FocusPrompter on a single asyncio event loop.
+
+    python bot_async.py
+
+Same commands, API routes and schedule as `python bot.py`, but Slack
+(Bolt's AsyncApp over async Socket Mode), the HTTP API (aiohttp) and the
+scheduler (AsyncIOScheduler) share one loop. An open /api/events stream is
+a coroutine rather than a server thread, so thousands of idle extension
+tabs cost memory for their sockets and little else.
+
+Blocking work runs on one bounded thread pool (BLOCKING_THREADS): SQLite
+has no asynchronous driver, so every db.py call, the command handlers
+shared with bot.py and the other /api/* routes (the Flask app, called as
+WSGI) go through it and never stall the loop.
+"""
+import startup  # first: its import time marks the start of the startup clock
+
+import asyncio
+import io
+import logging
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
+
+from aiohttp import web
+from multidict import CIMultiDict
+from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+from slack_bolt.async_app import AsyncApp
+from slack_sdk.web.async_client import AsyncWebClient
+
+import bot
+import events
+import metrics
+
+logger = logging.getLogger(__name__)
+
+BLOCKING_THREADS = int(os.environ.get("BLOCKING_THREADS", 8))
+
+# Headers that describe the connection, not the response; aiohttp sets its own
+HOP_BY_HOP = {"connection", "keep-alive", "transfer-encoding", "content-length"}
+# Body chunks from the WSGI app are gathered up to this size per trip to the pool
+STREAM_BUFFER_BYTES = 64 * 1024
+
+metrics.instrument_slack_client(AsyncWebClient)
+slack = AsyncApp(token=os.environ.get("SLACK_BOT_TOKEN"))
+
+
+# ============================================
+# Slack: async listeners around bot.py's handlers
+# ============================================
+
+def blocking_say(say, loop):
+    """A synchronous `say` for handlers running on the thread pool."""
+    def sync_say(*args, **kwargs):
+        return asyncio.run_coroutine_threadsafe(say(*args, **kwargs), loop).result()
+    return sync_say
+
+
+@slack.event("message")
+async def handle_message(event, say):
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, bot.handle_message, event, blocking_say(say, loop))
+
+
+def forward_action(handler):
+    """Ack on the loop, then run bot.py's action handler on the pool."""
+    async def listener(ack, body):
+        await ack()
+        await asyncio.get_running_loop().run_in_executor(None, handler, lambda: None, body, None)
+    return listener
+
+
+# Every @app.action in bot.py needs an entry here
+ACTIONS = {
+    "show_all_tasks": bot.handle_show_all,
+    "list_next_page": bot.handle_list_next_page,
+    "search_next_page": bot.handle_search_next_page,
+    "ready_to_work": bot.handle_ready,
+}
+for action_id, action_handler in ACTIONS.items():
+    slack.action(action_id)(forward_action(action_handler))
+
+
+# ============================================
+# HTTP API
+# ============================================
+
+class BusWatcher:
+    """Lets coroutines wait on events.bus without holding a thread each."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._changed = asyncio.Event()
+        events.bus.add_listener(lambda: loop.call_soon_threadsafe(self._pulse))
+
+    def _pulse(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self, event_id: int, timeout: float):
+        """Async events.bus.wait(): events newer than `event_id`, or [] after `timeout`."""
+        deadline = time.monotonic() + timeout
+        while events.bus.last_id <= event_id and not events.bus.closed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(self._changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+        return events.bus.events_after(event_id)
+
+
+bus_watcher = web.AppKey("bus_watcher", BusWatcher)
+
+
+def cors_headers(request: web.Request) -> dict:
+    """CORS headers for native routes, matching the Flask app's policy."""
+    origin = request.headers.get("Origin")
+    if origin and any(fnmatch(origin, pattern) for pattern in bot.API_CORS_ORIGINS):
+        return {"Access-Control-Allow-Origin": origin, "Vary": "Origin"}
+    return {}
+
+
+async def events_stream(request: web.Request) -> web.StreamResponse:
+    """/api/events as a coroutine; same protocol as bot.api_events."""
+    started = time.perf_counter()
+    if bot.boot.pending("db"):
+        return web.json_response(
+            {"error": "Starting up"}, status=503, headers={"Retry-After": "1", **cors_headers(request)}
+        )
+    token = request.headers.get("Authorization", "").replace("Bearer ", "")
+    loop = asyncio.get_running_loop()
+    user_id = await loop.run_in_executor(None, bot.resolve_api_user, token) if token else None
+    if not user_id:
+        metrics.http_requests.observe(("/api/events", "GET", "401"), time.perf_counter() - started)
+        return web.json_response({"error": "Unauthorized"}, status=401, headers=cors_headers(request))
+
+    cursor = bot.sse_resume_cursor(
+        request.headers.get("Last-Event-ID") or request.query.get("last_event_id")
+    )
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream; charset=utf-8",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+        **cors_headers(request),
+    })
+    await response.prepare(request)
+    metrics.http_requests.observe(("/api/events", "GET", "200"), time.perf_counter() - started)
+
+    watcher = request.app[bus_watcher]
+    try:
+        await response.write(f"retry: {bot.SSE_RETRY_MS}\n\n".encode())
+        last_write = time.monotonic()
+        while not events.bus.closed:
+            batch = await watcher.wait(cursor, bot.SSE_HEARTBEAT_SECONDS)
+            chunks, cursor = bot.sse_chunks(batch, cursor, user_id)
+            if chunks:
+                last_write = time.monotonic()
+                await response.write("".join(chunks).encode())
+            elif time.monotonic() - last_write >= bot.SSE_HEARTBEAT_SECONDS:
+                last_write = time.monotonic()
+                await response.write(b": keepalive\n\n")
+    except ConnectionResetError:
+        pass  # client went away
+    return response
+
+
+async def wsgi(request: web.Request) -> web.StreamResponse:
+    """
+    Serve any other route from bot.api (the Flask app) on the thread pool.
+    The body is passed on chunk by chunk as the app produces it, so a
+    streamed route (e.g. /api/export) is never held in memory whole.
+    """
+    body = await request.read()
+    environ = {
+        "REQUEST_METHOD": request.method,
+        "SCRIPT_NAME": "",
+        "PATH_INFO": request.path.encode().decode("latin-1"),
+        "QUERY_STRING": request.query_string,
+        "SERVER_NAME": request.host.split(":")[0],
+        "SERVER_PORT": str(bot.API_PORT),
+        "SERVER_PROTOCOL": f"HTTP/{request.version.major}.{request.version.minor}",
+        "REMOTE_ADDR": request.remote or "",
+        "CONTENT_TYPE": request.headers.get("Content-Type", ""),
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": request.scheme,
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name in request.headers.keys():
+        key = "HTTP_" + name.upper().replace("-", "_")
+        if key not in ("HTTP_CONTENT_TYPE", "HTTP_CONTENT_LENGTH"):
+            environ[key] = ",".join(request.headers.getall(name))
+
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"], started["headers"] = status, headers
+
+    def read(iterator):
+        """Up to STREAM_BUFFER_BYTES of body, or None at the end."""
+        parts, size = [], 0
+        for chunk in iterator:
+            parts.append(chunk)
+            size += len(chunk)
+            if size >= STREAM_BUFFER_BYTES:
+                break
+        return b"".join(parts) if parts else None
+
+    def start():
+        chunks = bot.api(environ, start_response)
+        iterator = iter(chunks)
+        # Some apps only call start_response once iteration begins
+        return chunks, iterator, read(iterator)
+
+    def close(chunks):
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+    loop = asyncio.get_running_loop()
+    chunks, iterator, chunk = await loop.run_in_executor(None, start)
+    try:
+        status, reason = started["status"].split(" ", 1)
+        response = web.StreamResponse(status=int(status), reason=reason, headers=CIMultiDict(
+            (name, value) for name, value in started["headers"] if name.lower() not in HOP_BY_HOP
+        ))
+        length = dict((name.lower(), value) for name, value in started["headers"]).get("content-length")
+        if length is not None:
+            response.content_length = int(length)
+        await response.prepare(request)
+        while chunk is not None:
+            if chunk:
+                await response.write(chunk)
+            chunk = await loop.run_in_executor(None, read, iterator)
+        await response.write_eof()
+        return response
+    except ConnectionResetError:
+        return response  # client went away mid-body
+    finally:
+        # Releases what the body held, e.g. a pooled connection for an export
+        await loop.run_in_executor(None, close, chunks)
+
+
+def make_http_app(loop: asyncio.AbstractEventLoop) -> web.Application:
+    http = web.Application()
+    http[bus_watcher] = BusWatcher(loop)
+    http.router.add_get("/api/events", events_stream)
+    http.router.add_route("*", "/{path:.*}", wsgi)
+    return http
+
+
+# ============================================
+# Main
+# ============================================
+
+async def main():
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(BLOCKING_THREADS, thread_name_prefix="blocking"))
+    boot = bot.boot
+    boot.record("imports", time.perf_counter() - startup.STARTED)
+
+    runner = web.AppRunner(make_http_app(loop), shutdown_timeout=bot.SHUTDOWN_TIMEOUT)
+    handler = AsyncSocketModeHandler(slack, os.environ.get("SLACK_APP_TOKEN"))
+
+    async def start_api():
+        await runner.setup()
+        await web.TCPSite(runner, "0.0.0.0", bot.API_PORT).start()
+        logger.info(f"API serving on 0.0.0.0:{bot.API_PORT} (asyncio)")
+
+    def start_scheduler():
+        from apscheduler.schedulers.asyncio import AsyncIOScheduler
+        import pytz
+        return bot.setup_scheduler(AsyncIOScheduler(timezone=pytz.utc))
+
+    try:
+        await asyncio.gather(
+            boot.run_async("db", lambda: loop.run_in_executor(None, bot.prepare_database)),
+            boot.run_async("api", start_api),
+            boot.run_async("slack_auth", slack.client.auth_test),
+            boot.run_async("socket_mode", handler.connect_async),
+        )
+        scheduler = boot.run("scheduler", start_scheduler)
+    except Exception as e:
+        logger.error(f"Startup failed: {e}")
+        sys.exit(1)
+    boot.log_summary()
+    print(f"FocusPrompter is running on asyncio (API port {bot.API_PORT}, readiness: /api/ready)")
+
+    stop = asyncio.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+    await stop.wait()
+
+    # Same order as bot.shutdown(): no new work, drain, then flush and close
+    logger.info("Shutting down")
+    boot.begin_shutdown()
+    await handler.close_async()
+    scheduler.shutdown(wait=False)
+    events.bus.close()
+    await runner.cleanup()
+    await loop.run_in_executor(None, bot.shutdown, {}, bot.SHUTDOWN_TIMEOUT)
+
+
+if __name__ == "__main__":
+    if not os.environ.get("SLACK_BOT_TOKEN"):
+        print("Error: SLACK_BOT_TOKEN not set. Copy .env.example to .env and fill in values.")
+        sys.exit(1)
+    if not os.environ.get("SLACK_APP_TOKEN"):
+        print("Error: SLACK_APP_TOKEN not set. Enable Socket Mode in your Slack app.")
+        sys.exit(1)
+    asyncio.run(main())
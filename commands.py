@@ -0,0 +1,267 @@
+"""
+Parsing for DM commands.
+
+parse() turns a message into a typed command object without touching Slack
+or the database, so it can be tested and benchmarked on its own. bot.py maps
+each command type to a handler. Patterns are compiled once at import and a
+message is classified in a single pass: one dict lookup for whole-message
+keywords, otherwise one anchored regex for prefix commands.
+"""
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+
+# --- Command Types ---
+
+@dataclass(frozen=True)
+class AddTasks:
+    items: tuple        # (text, area) pairs, in message order
+    first_text: str     # first task as typed, for the single-task reply
+
+
+@dataclass(frozen=True)
+class ListTasks:
+    pass
+
+
+@dataclass(frozen=True)
+class CompleteTask:
+    task_id: int
+
+
+@dataclass(frozen=True)
+class DeleteTask:
+    task_id: int
+
+
+@dataclass(frozen=True)
+class FindTasks:
+    query: str
+
+
+@dataclass(frozen=True)
+class MorningFocus:
+    pass
+
+
+@dataclass(frozen=True)
+class Refocus:
+    pass
+
+
+@dataclass(frozen=True)
+class SetWin:
+    text: str
+
+
+@dataclass(frozen=True)
+class Demo:
+    pass
+
+
+@dataclass(frozen=True)
+class ReadArticle:
+    tag: Optional[str] = None   # only articles with this tag
+
+
+@dataclass(frozen=True)
+class TestMorning:
+    pass
+
+
+@dataclass(frozen=True)
+class Help:
+    pass
+
+
+@dataclass(frozen=True)
+class ApiToken:
+    pass
+
+
+@dataclass(frozen=True)
+class Schedule:
+    """Show (no arguments), set, or turn off (`off=True`) the morning digest."""
+    time: Optional[str] = None      # "HH:MM"
+    timezone: Optional[str] = None  # IANA name, e.g. "America/New_York"
+    off: bool = False
+
+
+@dataclass(frozen=True)
+class Usage:
+    """A known command with missing or malformed arguments."""
+    command: str
+
+
+@dataclass(frozen=True)
+class Unknown:
+    text: str
+
+
+# --- Patterns ---
+
+# Messages that are a command on their own (matched case-insensitively)
+KEYWORDS = {
+    "list": ListTasks(), "tasks": ListTasks(), "show": ListTasks(), "ls": ListTasks(),
+    "focus": MorningFocus(), "morning": MorningFocus(), "plan": MorningFocus(),
+    "start": MorningFocus(),
+    "refocus": Refocus(), "stuck": Refocus(), "help me focus": Refocus(),
+    "demo": Demo(),
+    "read": ReadArticle(), "article": ReadArticle(), "reading": ReadArticle(),
+    "testmorning": TestMorning(),
+    "help": Help(), "?": Help(), "commands": Help(),
+    "token": ApiToken(),
+    "schedule": Schedule(),
+    "find": Usage("find"), "search": Usage("find"),
+}
+# Longer messages can't be keywords, so they are never lowercased in full
+MAX_KEYWORD_LENGTH = max(len(k) for k in KEYWORDS)
+
+# Commands identified by their first word; group "verb" says which one
+PREFIX_PATTERN = re.compile(
+    r"(?P<verb>add(?=[ \n])|done |complete |delete |remove |find |search |schedule |read |win:|today:)",
+    re.IGNORECASE
+)
+PREFIX_VERBS = {
+    "add": "add",
+    "done": "done", "complete": "done",
+    "delete": "delete", "remove": "delete",
+    "find": "find", "search": "find",
+    "schedule": "schedule",
+    "read": "read",
+    "win": "win", "today": "win",
+}
+
+BULLET_PATTERN = re.compile(
+    r'^[\-\*\•\●\○\◦\▪\▸\►\◆\→\»]\s*(.+)$|^(\d+[\.\)]\s*)(.+)$'
+)
+SIDE_PROJECT_PREFIXES = ("[side]", "[project]")
+SCHEDULE_TIME_PATTERN = re.compile(r"^([01]?\d|2[0-3]):([0-5]\d)$")
+
+
+# --- Parsing ---
+
+def parse(text: str):
+    """Classify a DM and return the matching command object."""
+    original_text = text.strip()
+
+    if len(original_text) <= MAX_KEYWORD_LENGTH:
+        keyword = KEYWORDS.get(original_text.lower())
+        if keyword is not None:
+            return keyword
+
+    match = PREFIX_PATTERN.match(original_text)
+    if match:
+        verb = PREFIX_VERBS[match.group("verb").rstrip(" :").lower()]
+        return _PREFIX_PARSERS[verb](original_text)
+
+    return Unknown(original_text)
+
+
+def parse_task_items(task_text: str) -> list:
+    """
+    Split the body of an `add` into task texts.
+    Accepts a single task, a bulleted/numbered list, or one task per line.
+    """
+    lines = task_text.split('\n')
+
+    tasks_to_add = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        match = BULLET_PATTERN.match(line)
+        if match:
+            # Extract task text from bullet or numbered list
+            task = match.group(1) or match.group(3)
+            if task:
+                tasks_to_add.append(task.strip())
+        elif len(lines) == 1:
+            # Single task, no bullet
+            tasks_to_add.append(line)
+
+    # If no bullets found but multiple lines, treat each line as a task
+    if not tasks_to_add and len(lines) > 1:
+        tasks_to_add = [l.strip() for l in lines if l.strip()]
+
+    # Fallback: single task
+    if not tasks_to_add:
+        tasks_to_add = [task_text]
+
+    return tasks_to_add
+
+
+def split_area(task: str) -> tuple:
+    """Strip a `[side]`/`[project]` prefix. Returns (text, area)."""
+    if task[:len("[project]")].lower().startswith(SIDE_PROJECT_PREFIXES):
+        return task.split("]", 1)[1].strip(), "side_project"
+    return task, "work"
+
+
+def _parse_add(original_text: str):
+    task_text = original_text[3:].strip()  # Skip "add", then strip whitespace/newlines
+    if not task_text:
+        return Usage("add")
+    tasks_to_add = parse_task_items(task_text)
+    return AddTasks(
+        items=tuple(split_area(task) for task in tasks_to_add),
+        first_text=tasks_to_add[0]
+    )
+
+
+def _parse_task_id(original_text: str) -> Optional[int]:
+    parts = original_text.split()
+    try:
+        return int(parts[1].replace("#", ""))
+    except (IndexError, ValueError):
+        return None
+
+
+def _parse_done(original_text: str):
+    task_id = _parse_task_id(original_text)
+    return CompleteTask(task_id) if task_id is not None else Usage("done")
+
+
+def _parse_delete(original_text: str):
+    task_id = _parse_task_id(original_text)
+    return DeleteTask(task_id) if task_id is not None else Usage("delete")
+
+
+def _parse_win(original_text: str):
+    win_text = original_text.split(":", 1)[1].strip()
+    return SetWin(win_text) if win_text else Usage("win")
+
+
+def _parse_find(original_text: str):
+    query = original_text.split(None, 1)[1].strip() if " " in original_text else ""
+    return FindTasks(query) if query else Usage("find")
+
+
+def _parse_read(original_text: str):
+    args = original_text.split()[1:]
+    return ReadArticle(tag=args[0].lower()) if len(args) == 1 else Usage("read")
+
+
+def _parse_schedule(original_text: str):
+    args = original_text.split()[1:]
+    if len(args) == 1 and args[0].lower() == "off":
+        return Schedule(off=True)
+    if not 1 <= len(args) <= 2:
+        return Usage("schedule")
+    match = SCHEDULE_TIME_PATTERN.match(args[0])
+    if not match:
+        return Usage("schedule")
+    time = f"{int(match.group(1)):02d}:{match.group(2)}"
+    return Schedule(time=time, timezone=args[1] if len(args) == 2 else None)
+
+
+_PREFIX_PARSERS = {
+    "add": _parse_add,
+    "done": _parse_done,
+    "delete": _parse_delete,
+    "find": _parse_find,
+    "schedule": _parse_schedule,
+    "read": _parse_read,
+    "win": _parse_win,
+}
@@ -1,26 +1,536 @@
 """
 Simple SQLite storage for tasks and daily plans.
+
+Connections come from a small bounded pool shared by the Flask, Slack and
+scheduler threads. Use ``connection()`` for reads and ``transaction()`` for
+writes:
+
+    with db.transaction() as conn:
+        conn.execute("UPDATE tasks SET area = ? WHERE id = ?", ("work", 1))
+
+The public write functions don't write from the calling thread. They are
+queued for a single writer thread, which runs everything that is waiting
+in one transaction with one commit (group commit) and hands each caller its
+own result or exception. Writers never fight over the lock, and a burst of
+writes costs one fsync rather than one each. ``submit()`` queues one
+without waiting and returns a Future. Migrations and ``compact()`` run on
+the writer too, on their own between groups. A bare ``transaction()``
+outside these functions still works, but competes with the writer for the
+lock; keep it to scripts and maintenance.
+
+Importing this module does no I/O. The schema is brought up to date by the
+first ``connection()`` (or an explicit ``init_db()``), and other threads wait
+for that to finish.
 """
+import base64
+import functools
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import secrets
 import sqlite3
-from datetime import datetime, date
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime, date, timedelta
 from pathlib import Path
 from typing import Optional
 
-DB_PATH = Path(__file__).parent / "focus.db"
+import events
+import metrics
+
+logger = logging.getLogger(__name__)
+# FOCUS_DB_PATH points the bot (or benchmark.py) at another database file
+DB_PATH = Path(os.environ.get("FOCUS_DB_PATH") or Path(__file__).parent / "focus.db")
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+# How long the writer waits for more writes before committing a group; 0
+# groups whatever queued up while the previous commit was in progress
+WRITE_WINDOW_MS = float(os.environ.get("DB_WRITE_WINDOW_MS", 0))
+WRITE_BATCH_MAX = int(os.environ.get("DB_WRITE_BATCH_MAX", 256))
+# How long a caller waits for its write to be committed before giving up
+WRITE_TIMEOUT = float(os.environ.get("DB_WRITE_TIMEOUT", 30))
+# PRAGMA synchronous for the writer: "full" fsyncs every group commit,
+# "normal" (WAL default) can lose the last commits on power loss but never
+# corrupts, "off" leaves flushing to the OS
+DURABILITY = os.environ.get("DB_DURABILITY", "normal").lower()
+
+# Applied to every new connection. WAL lets readers run while a writer holds
+# the lock, and synchronous=NORMAL is still crash-safe in WAL mode.
+PRAGMAS = (
+    # Only takes effect on a new file; compact() converts older databases
+    "PRAGMA auto_vacuum = INCREMENTAL",
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -8000",
+)
 
 
 def get_connection():
-    conn = sqlite3.connect(DB_PATH)
+    """Open a standalone connection with the standard pragmas applied."""
+    # Autocommit mode: transactions are opened explicitly by transaction()
+    conn = sqlite3.connect(DB_PATH, isolation_level=None, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
     return conn
 
 
-def init_db():
-    """Create tables if they don't exist."""
-    conn = get_connection()
-    cursor = conn.cursor()
+class ConnectionPool:
+    """
+    Bounded pool of reusable connections.
+
+    A thread that already holds a connection gets the same one back, so
+    nested ``connection()``/``transaction()`` blocks never deadlock the pool.
+    """
+
+    def __init__(self, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._created < self.size
+            if can_open:
+                self._created += 1
+        if can_open:
+            try:
+                return get_connection()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No database connection free after {self.timeout}s")
+
+    def in_transaction(self) -> bool:
+        """True if this thread holds a connection with a transaction open."""
+        conn = getattr(self._local, "conn", None)
+        return conn is not None and conn.in_transaction
+
+    @contextmanager
+    def pinned(self, conn):
+        """Make ``connection()`` on this thread return `conn` for the block."""
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+
+    @contextmanager
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            yield conn
+            return
+
+        conn = self._acquire()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def close_all(self):
+        """Close idle connections (e.g. before exit or after moving DB_PATH)."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+_pool = ConnectionPool()
+
+# init_db() runs once, on first use. The lock is re-entrant because the
+# migrations themselves go through connection().
+_schema_lock = threading.RLock()
+_schema_ready = False
+_migrating = False
+
+
+def connection():
+    """Context manager yielding a pooled connection (autocommit)."""
+    # The writer runs the migrations, so it never waits for them
+    if not _schema_ready and not _writer.in_writer:
+        _ensure_schema()
+    return _pool.connection()
+
+
+def _ensure_schema():
+    with _schema_lock:
+        if not _schema_ready and not _migrating:
+            init_db()
+
+
+@contextmanager
+def transaction():
+    """
+    Context manager running the block in one write transaction.
+    Commits on success, rolls back on error. Nested blocks join the outer one.
+    """
+    with connection() as conn:
+        if conn.in_transaction:
+            _check_not_snapshot()
+            yield conn
+            return
+        # IMMEDIATE takes the write lock up front instead of failing mid-block
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+@contextmanager
+def snapshot():
+    """
+    Context manager yielding a connection in a read transaction, so several
+    queries see the same committed state even while the writer commits.
+    """
+    with connection() as conn:
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN")
+        _snapshots.active = True
+        try:
+            yield conn
+        finally:
+            _snapshots.active = False
+            conn.rollback()
+
+
+_snapshots = threading.local()
+
+
+def _check_not_snapshot():
+    # A write here would join the read transaction and vanish with its rollback
+    if getattr(_snapshots, "active", False):
+        raise RuntimeError("Database writes are not allowed inside snapshot()")
+
+
+class WriteQueue:
+    """
+    The single writer thread, started on first use.
+
+    Jobs run in submission order on the writer's own connection. Everything
+    queued when the writer comes round (up to WRITE_BATCH_MAX, plus anything
+    arriving within WRITE_WINDOW_MS) shares one transaction. Each job gets a
+    savepoint, so a failing job rolls back only its own changes and the
+    rest still commit. Futures resolve after the commit, and work deferred
+    with ``after_commit()`` (e.g. change events) runs just before they do.
+    """
+
+    LEVELS = {"off": "OFF", "normal": "NORMAL", "full": "FULL"}
+
+    def __init__(
+        self,
+        window_ms: float = WRITE_WINDOW_MS,
+        batch_max: int = WRITE_BATCH_MAX,
+        durability: str = DURABILITY,
+    ):
+        if durability not in self.LEVELS:
+            raise ValueError(f"Unknown DB_DURABILITY {durability!r}; use one of: {', '.join(self.LEVELS)}")
+        self.window = window_ms / 1000
+        self.batch_max = batch_max
+        self.durability = durability
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def in_writer(self) -> bool:
+        return getattr(self._local, "deferred", None) is not None
+
+    def submit(self, fn, args=(), kwargs=None, exclusive: bool = False) -> Future:
+        """
+        Queue fn(*args, **kwargs) to run inside the next group transaction,
+        or on its own outside any transaction if `exclusive` (e.g. VACUUM).
+        """
+        future = Future()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+            self._queue.put((future, fn, args, kwargs or {}, exclusive))
+        return future
+
+    def after_commit(self, fn, *args):
+        """Call fn(*args) once the current job is committed (now, outside the writer)."""
+        if self.in_writer:
+            self._local.deferred.append((fn, args))
+        else:
+            fn(*args)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Finish the queued writes, then stop the thread. The next submit() starts a new one."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return
+            self._queue.put(None)
+        thread.join(timeout)
+
+    def _run(self):
+        batch = []
+        try:
+            conn = get_connection()
+            self._local.deferred = []
+            try:
+                conn.execute(f"PRAGMA synchronous = {self.LEVELS[self.durability]}")
+                with _pool.pinned(conn):
+                    while True:
+                        batch, stopping = self._collect()
+                        self._process(conn, batch)
+                        batch = []
+                        if stopping:
+                            return
+            finally:
+                self._local.deferred = None
+                conn.close()
+        except BaseException as e:
+            logger.error(f"Database writer stopped: {e}")
+            self._abandon(batch, e)
 
-    cursor.execute("""
+    def _abandon(self, batch: list, error: BaseException):
+        """Fail everything this thread still owes an answer, and let submit() start a new writer."""
+        with self._lock:
+            if self._thread is threading.current_thread():
+                self._thread = None
+            while True:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is not None:
+                    batch.append(job)
+        for future, *_ in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def _collect(self) -> tuple:
+        """Block for the first job, then take what else is waiting. Returns (jobs, stop)."""
+        job = self._queue.get()
+        if job is None:
+            return [], True
+        batch = [job]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.batch_max:
+            try:
+                remaining = deadline - time.monotonic()
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                return batch, True
+            batch.append(job)
+        return batch, False
+
+    def _process(self, conn, batch: list):
+        """Commit runs of ordinary jobs as groups; run exclusive jobs alone, in order."""
+        group = []
+        for job in batch:
+            if job[4]:
+                if group:
+                    self._commit(conn, group)
+                    group = []
+                self._run_alone(conn, job)
+            else:
+                group.append(job)
+        if group:
+            self._commit(conn, group)
+
+    def _run_alone(self, conn, job: tuple):
+        future, fn, args, kwargs, _ = job
+        if not future.set_running_or_notify_cancel():
+            return
+        self._local.deferred = []
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            if conn.in_transaction:
+                conn.rollback()
+            future.set_exception(e)
+            return
+        finally:
+            deferred, self._local.deferred = self._local.deferred, []
+        self._resolve([(future, result, deferred)])
+
+    def _commit(self, conn, batch: list):
+        started = time.perf_counter()
+        done, failed = [], []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for future, fn, args, kwargs, _ in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self._local.deferred = []
+                conn.execute("SAVEPOINT job")
+                try:
+                    result = fn(*args, **kwargs)
+                except Exception as e:
+                    # Raises in turn if SQLite abandoned the whole transaction
+                    conn.execute("ROLLBACK TO job")
+                    conn.execute("RELEASE job")
+                    failed.append((future, e))
+                    continue
+                conn.execute("RELEASE job")
+                done.append((future, result, self._local.deferred))
+            conn.commit()
+        except BaseException as e:
+            # The transaction itself failed (disk full, I/O error...): nothing
+            # in it was committed, so every job without its own error gets this one
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except Exception as rollback_error:
+                logger.error(f"Rollback after failed group commit failed: {rollback_error}")
+            done = []
+            answered = {id(future) for future, _ in failed}
+            failed.extend(
+                (future, e) for future, *_ in batch
+                if id(future) not in answered and not future.done()
+            )
+            if not isinstance(e, Exception):
+                for future, error in failed:
+                    future.set_exception(error)
+                raise
+        finally:
+            self._local.deferred = []
+        metrics.db_write_batches.observe(("committed" if done else "failed",), time.perf_counter() - started)
+        metrics.db_write_batch_size.observe((), len(batch))
+
+        self._resolve(done)
+        for future, e in failed:
+            future.set_exception(e)
+
+    def _resolve(self, done: list):
+        for future, result, deferred in done:
+            for fn, args in deferred:
+                try:
+                    fn(*args)
+                except Exception as e:
+                    logger.error(f"After-commit callback failed: {e}")
+            future.set_result(result)
+
+
+_writer = WriteQueue()
+
+
+def _write(func=None, exclusive: bool = False):
+    """
+    Run the decorated write function on the writer thread and wait for it,
+    up to WRITE_TIMEOUT. `exclusive` functions run alone, outside any
+    transaction.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            _check_not_snapshot()
+            # Already on the writer, or inside the caller's own transaction()
+            # (which holds the write lock): queueing would deadlock, so join it
+            if _writer.in_writer or _pool.in_transaction():
+                if exclusive and _pool.in_transaction():
+                    raise RuntimeError(f"{func.__name__}() cannot run inside a transaction")
+                return func(*args, **kwargs)
+            if not _schema_ready:
+                _ensure_schema()
+            future = _writer.submit(func, args, kwargs, exclusive)
+            # Exclusive jobs (a full VACUUM) can legitimately run long; the
+            # writer still fails their futures if it dies
+            return future.result() if exclusive else _wait(future)
+        return wrapper
+    return decorate(func) if func else decorate
+
+
+def _wait(future: Future):
+    try:
+        return future.result(timeout=WRITE_TIMEOUT)
+    except TimeoutError:
+        # Still queued or running; it may yet commit
+        raise TimeoutError(f"Database write not committed after {WRITE_TIMEOUT}s") from None
+
+
+def submit(func, *args, **kwargs) -> Future:
+    """
+    Queue a write without waiting: `func` is one of this module's write
+    functions, or any function using ``transaction()``. Returns a Future
+    that resolves once the write is committed.
+    """
+    _check_not_snapshot()
+    if _writer.in_writer:
+        future = Future()
+        try:
+            future.set_result(func(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    if not _schema_ready:
+        _ensure_schema()
+    return _writer.submit(func, args, kwargs)
+
+
+def close_connections():
+    """Finish queued writes, stop the writer and close all idle pooled connections."""
+    _writer.stop()
+    _pool.close_all()
+
+
+# Task columns as returned to callers. carryover_count is derived: it is the
+# number of day rollovers since the task was added, so starting a new day is
+# a single UPDATE of the owner's users row rather than one UPDATE per task.
+TASK_FIELDS = {
+    "id": "id",
+    "text": "text",
+    "area": "area",
+    "created_at": "created_at",
+    "completed_at": "completed_at",
+    "status": "status",
+    "carryover_count": "(SELECT day FROM users WHERE users.user_id = tasks.user_id)"
+                       " - first_day AS carryover_count",
+}
+TASK_COLUMNS = ", ".join(TASK_FIELDS.values())
+
+
+# --- Schema Migrations ---
+#
+# Each migration upgrades the schema by one version and runs in its own
+# transaction. The current version is stored in PRAGMA user_version, so a
+# database that is already up to date costs one pragma read at startup.
+# Append new migrations to MIGRATIONS; never edit one that has shipped.
+
+def _migration_1_base_schema(conn):
+    """Tasks and daily plans (adopts databases created before migrations)."""
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS tasks (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             text TEXT NOT NULL,
@@ -32,7 +542,7 @@ def init_db():
         )
     """)
 
-    cursor.execute("""
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS daily_plans (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             plan_date DATE NOT NULL UNIQUE,
@@ -42,152 +552,1477 @@ def init_db():
         )
     """)
 
-    conn.commit()
-    conn.close()
+
+def _migration_2_day_rollover(conn):
+    """Replace the per-row carryover_count with first_day + day_rollover."""
+    # Single row: how many days have been started, and when the last one was
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS day_rollover (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            day INTEGER NOT NULL DEFAULT 0,
+            last_date DATE
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO day_rollover (id) VALUES (1)")
+
+    # The legacy carryover_count column is left in place but no longer read
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(tasks)")}
+    if "first_day" not in columns:
+        conn.execute("ALTER TABLE tasks ADD COLUMN first_day INTEGER NOT NULL DEFAULT 0")
+        conn.execute(
+            "UPDATE tasks SET first_day = (SELECT day FROM day_rollover) - carryover_count"
+        )
+
+
+def _migration_3_hot_query_indexes(conn):
+    """Stored completion day plus indexes for pending, stuck and stats queries."""
+    conn.execute("ALTER TABLE tasks ADD COLUMN completed_day DATE")
+    conn.execute(
+        "UPDATE tasks SET completed_day = DATE(completed_at) WHERE completed_at IS NOT NULL"
+    )
+
+    # get_pending_tasks: WHERE status = 'pending' ORDER BY created_at
+    conn.execute("""
+        CREATE INDEX idx_tasks_pending_created
+        ON tasks (created_at, id) WHERE status = 'pending'
+    """)
+    # get_tasks_by_area: WHERE status = 'pending' AND area = ? ORDER BY created_at
+    conn.execute("""
+        CREATE INDEX idx_tasks_pending_area
+        ON tasks (area, created_at, id) WHERE status = 'pending'
+    """)
+    # get_stuck_tasks: WHERE status = 'pending' AND first_day <= ?
+    conn.execute("""
+        CREATE INDEX idx_tasks_pending_first_day
+        ON tasks (first_day) WHERE status = 'pending'
+    """)
+    # Stats: WHERE status = 'completed' AND completed_day = ?
+    conn.execute("""
+        CREATE INDEX idx_tasks_completed_day
+        ON tasks (completed_day) WHERE status = 'completed'
+    """)
+
+
+def _migration_4_data_version(conn):
+    """Counter bumped by triggers on every task, plan or rollover write."""
+    conn.execute("""
+        CREATE TABLE data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("INSERT INTO data_version (id) VALUES (1)")
+
+    watched = {
+        "tasks": ("INSERT", "UPDATE", "DELETE"),
+        "daily_plans": ("INSERT", "UPDATE", "DELETE"),
+        "day_rollover": ("UPDATE",),
+    }
+    for table, events in watched.items():
+        for event in events:
+            conn.execute(f"""
+                CREATE TRIGGER {table}_{event.lower()}_bump_version
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE data_version SET version = version + 1 WHERE id = 1;
+                END
+            """)
+
+
+def _migration_5_stats_counters(conn):
+    """Trigger-maintained pending count and completions per day for /api/stats."""
+    conn.execute("""
+        CREATE TABLE task_counts (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            pending INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE completed_daily (
+            day DATE PRIMARY KEY,
+            completed INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+    conn.execute("""
+        INSERT INTO task_counts (id, pending)
+        SELECT 1, COUNT(*) FROM tasks WHERE status = 'pending'
+    """)
+    conn.execute("""
+        INSERT INTO completed_daily (day, completed)
+        SELECT completed_day, COUNT(*) FROM tasks
+        WHERE status = 'completed' AND completed_day IS NOT NULL
+        GROUP BY completed_day
+    """)
+
+    # A row "enters" the counters on insert and "leaves" them on delete;
+    # an update of status or completed_day is a leave followed by an enter.
+    enter = """
+        UPDATE task_counts SET pending = pending + 1
+        WHERE id = 1 AND NEW.status = 'pending';
+        INSERT INTO completed_daily (day, completed)
+        SELECT NEW.completed_day, 1
+        WHERE NEW.status = 'completed' AND NEW.completed_day IS NOT NULL
+        ON CONFLICT(day) DO UPDATE SET completed = completed + 1;
+    """
+    leave = """
+        UPDATE task_counts SET pending = pending - 1
+        WHERE id = 1 AND OLD.status = 'pending';
+        UPDATE completed_daily SET completed = completed - 1
+        WHERE day = OLD.completed_day AND OLD.status = 'completed';
+    """
+    conn.execute(f"CREATE TRIGGER tasks_insert_counts AFTER INSERT ON tasks BEGIN {enter} END")
+    conn.execute(f"CREATE TRIGGER tasks_delete_counts AFTER DELETE ON tasks BEGIN {leave} END")
+    conn.execute(f"""
+        CREATE TRIGGER tasks_update_counts AFTER UPDATE OF status, completed_day ON tasks
+        BEGIN {leave} {enter} END
+    """)
+
+
+def _migration_6_dm_channels(conn):
+    """Cache of Slack DM channel IDs so send_dm can skip conversations.open."""
+    conn.execute("""
+        CREATE TABLE dm_channels (
+            user_id TEXT PRIMARY KEY,
+            channel_id TEXT NOT NULL
+        )
+    """)
+
+
+def _migration_7_multi_user(conn):
+    """
+    Per-user ownership of tasks and plans. Rollover, data version and
+    counters move onto a users row. Existing rows belong to user '' until
+    claim_orphaned_data() hands them to a real user.
+    """
+    conn.execute("""
+        CREATE TABLE users (
+            user_id TEXT PRIMARY KEY,
+            api_token_hash TEXT UNIQUE,
+            day INTEGER NOT NULL DEFAULT 0,
+            last_date DATE,
+            version INTEGER NOT NULL DEFAULT 0,
+            pending INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    has_legacy_data = conn.execute(
+        "SELECT EXISTS (SELECT 1 FROM tasks) OR EXISTS (SELECT 1 FROM daily_plans)"
+    ).fetchone()[0]
+    if has_legacy_data:
+        conn.execute("""
+            INSERT INTO users (user_id, day, last_date, version, pending)
+            SELECT '', r.day, r.last_date, v.version, c.pending
+            FROM day_rollover r, data_version v, task_counts c
+        """)
+
+    # Old global triggers and single-row tables
+    for trigger in [
+        "tasks_insert_bump_version", "tasks_update_bump_version", "tasks_delete_bump_version",
+        "daily_plans_insert_bump_version", "daily_plans_update_bump_version",
+        "daily_plans_delete_bump_version", "day_rollover_update_bump_version",
+        "tasks_insert_counts", "tasks_delete_counts", "tasks_update_counts",
+    ]:
+        conn.execute(f"DROP TRIGGER {trigger}")
+    for index in [
+        "idx_tasks_pending_created", "idx_tasks_pending_area",
+        "idx_tasks_pending_first_day", "idx_tasks_completed_day",
+    ]:
+        conn.execute(f"DROP INDEX {index}")
+    for table in ["day_rollover", "data_version", "task_counts"]:
+        conn.execute(f"DROP TABLE {table}")
+
+    conn.execute("ALTER TABLE tasks ADD COLUMN user_id TEXT NOT NULL DEFAULT ''")
+
+    # plan_date was UNIQUE across everyone; rebuild with a per-user key
+    conn.execute("""
+        CREATE TABLE daily_plans_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL DEFAULT '',
+            plan_date DATE NOT NULL,
+            focus_items TEXT,
+            win_criteria TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (user_id, plan_date)
+        )
+    """)
+    conn.execute("""
+        INSERT INTO daily_plans_new (id, plan_date, focus_items, win_criteria, created_at)
+        SELECT id, plan_date, focus_items, win_criteria, created_at FROM daily_plans
+    """)
+    conn.execute("DROP TABLE daily_plans")
+    conn.execute("ALTER TABLE daily_plans_new RENAME TO daily_plans")
+
+    conn.execute("""
+        CREATE TABLE completed_daily_new (
+            user_id TEXT NOT NULL,
+            day DATE NOT NULL,
+            completed INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day)
+        )
+    """)
+    conn.execute("""
+        INSERT INTO completed_daily_new (user_id, day, completed)
+        SELECT '', day, completed FROM completed_daily
+    """)
+    conn.execute("DROP TABLE completed_daily")
+    conn.execute("ALTER TABLE completed_daily_new RENAME TO completed_daily")
+
+    # Same access patterns as migration 3, scoped to one user
+    conn.execute("""
+        CREATE INDEX idx_tasks_user_pending_created
+        ON tasks (user_id, created_at, id) WHERE status = 'pending'
+    """)
+    conn.execute("""
+        CREATE INDEX idx_tasks_user_pending_area
+        ON tasks (user_id, area, created_at, id) WHERE status = 'pending'
+    """)
+    conn.execute("""
+        CREATE INDEX idx_tasks_user_pending_first_day
+        ON tasks (user_id, first_day) WHERE status = 'pending'
+    """)
+    conn.execute("""
+        CREATE INDEX idx_tasks_user_completed_day
+        ON tasks (user_id, completed_day) WHERE status = 'completed'
+    """)
+
+    # Per-user data version (start_day bumps it directly)
+    for table in ["tasks", "daily_plans"]:
+        conn.execute(f"""
+            CREATE TRIGGER {table}_insert_bump_version AFTER INSERT ON {table}
+            BEGIN
+                UPDATE users SET version = version + 1 WHERE user_id = NEW.user_id;
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER {table}_update_bump_version AFTER UPDATE ON {table}
+            BEGIN
+                UPDATE users SET version = version + 1
+                WHERE user_id IN (OLD.user_id, NEW.user_id);
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER {table}_delete_bump_version AFTER DELETE ON {table}
+            BEGIN
+                UPDATE users SET version = version + 1 WHERE user_id = OLD.user_id;
+            END
+        """)
+
+    # Per-user counters, same enter/leave scheme as migration 5
+    enter = """
+        UPDATE users SET pending = pending + 1
+        WHERE user_id = NEW.user_id AND NEW.status = 'pending';
+        INSERT INTO completed_daily (user_id, day, completed)
+        SELECT NEW.user_id, NEW.completed_day, 1
+        WHERE NEW.status = 'completed' AND NEW.completed_day IS NOT NULL
+        ON CONFLICT(user_id, day) DO UPDATE SET completed = completed + 1;
+    """
+    leave = """
+        UPDATE users SET pending = pending - 1
+        WHERE user_id = OLD.user_id AND OLD.status = 'pending';
+        UPDATE completed_daily SET completed = completed - 1
+        WHERE user_id = OLD.user_id AND day = OLD.completed_day AND OLD.status = 'completed';
+    """
+    conn.execute(f"CREATE TRIGGER tasks_insert_counts AFTER INSERT ON tasks BEGIN {enter} END")
+    conn.execute(f"CREATE TRIGGER tasks_delete_counts AFTER DELETE ON tasks BEGIN {leave} END")
+    conn.execute(f"""
+        CREATE TRIGGER tasks_update_counts
+        AFTER UPDATE OF status, completed_day, user_id ON tasks
+        BEGIN {leave} {enter} END
+    """)
+
+
+def _migration_8_morning_schedule(conn):
+    """Per-user morning digest time/timezone and a log of digests sent."""
+    conn.execute("ALTER TABLE users ADD COLUMN morning_time TEXT")
+    conn.execute("ALTER TABLE users ADD COLUMN timezone TEXT")
+    # The scheduler looks up users by timezone and local time every minute
+    conn.execute("""
+        CREATE INDEX idx_users_schedule
+        ON users (timezone, morning_time) WHERE morning_time IS NOT NULL
+    """)
+
+    # One row per user per local date, claimed before sending so a digest is
+    # never sent twice (sent_at stays NULL until Slack accepts it)
+    conn.execute("""
+        CREATE TABLE digest_sends (
+            user_id TEXT NOT NULL,
+            local_date DATE NOT NULL,
+            claimed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            sent_at TIMESTAMP,
+            PRIMARY KEY (user_id, local_date)
+        )
+    """)
+
+
+def _migration_9_task_archive(conn):
+    """Cold storage for old completed tasks, plus a view over both tables."""
+    conn.execute("""
+        CREATE TABLE tasks_archive (
+            id INTEGER PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            text TEXT NOT NULL,
+            area TEXT,
+            created_at TIMESTAMP,
+            completed_at TIMESTAMP,
+            status TEXT,
+            first_day INTEGER NOT NULL DEFAULT 0,
+            completed_day DATE,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("CREATE INDEX idx_tasks_archive_user_completed ON tasks_archive (user_id, completed_day)")
+
+    # Full history for reporting; hot queries keep reading `tasks` directly
+    conn.execute("""
+        CREATE VIEW all_tasks AS
+        SELECT id, user_id, text, area, created_at, completed_at, status,
+               first_day, completed_day, NULL AS archived_at
+        FROM tasks
+        UNION ALL
+        SELECT id, user_id, text, area, created_at, completed_at, status,
+               first_day, completed_day, archived_at
+        FROM tasks_archive
+    """)
+
+
+def _migration_10_task_search(conn):
+    """FTS5 index over task text, live and archived, kept current by triggers."""
+    # rowid is the task ID (unique across tasks and tasks_archive). user_id is
+    # indexed too so a search only ever walks the caller's postings.
+    conn.execute("""
+        CREATE VIRTUAL TABLE tasks_fts USING fts5(
+            text, user_id, tokenize = 'porter unicode61'
+        )
+    """)
+    conn.execute("""
+        INSERT INTO tasks_fts (rowid, text, user_id)
+        SELECT id, text, user_id FROM tasks
+        UNION ALL
+        SELECT id, text, user_id FROM tasks_archive
+    """)
+
+    conn.execute("""
+        CREATE TRIGGER tasks_fts_insert AFTER INSERT ON tasks
+        BEGIN
+            INSERT INTO tasks_fts (rowid, text, user_id) VALUES (NEW.id, NEW.text, NEW.user_id);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER tasks_fts_update AFTER UPDATE OF text, user_id ON tasks
+        BEGIN
+            DELETE FROM tasks_fts WHERE rowid = OLD.id;
+            INSERT INTO tasks_fts (rowid, text, user_id) VALUES (NEW.id, NEW.text, NEW.user_id);
+        END
+    """)
+    # Archiving copies the row before deleting it; its entry stays put
+    conn.execute("""
+        CREATE TRIGGER tasks_fts_delete AFTER DELETE ON tasks
+        BEGIN
+            DELETE FROM tasks_fts WHERE rowid = OLD.id
+            AND NOT EXISTS (SELECT 1 FROM tasks_archive WHERE id = OLD.id);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER tasks_archive_fts_delete AFTER DELETE ON tasks_archive
+        BEGIN
+            DELETE FROM tasks_fts WHERE rowid = OLD.id;
+        END
+    """)
+
+
+def _migration_11_digest_cache(conn):
+    """Last morning digest built per user, tagged with the data version it reflects."""
+    conn.execute("""
+        CREATE TABLE digest_cache (
+            user_id TEXT PRIMARY KEY,
+            local_date DATE NOT NULL,
+            data_version INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            blocks TEXT NOT NULL,
+            built_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def _migration_12_article_catalog(conn):
+    """
+    Reading catalog with a tag index, plus per-user read history (a bitmap
+    of article IDs) and the memoized pick of the day per user and tag.
+    """
+    conn.executescript("""
+        CREATE TABLE articles (
+            id INTEGER PRIMARY KEY,
+            url TEXT NOT NULL UNIQUE,
+            title TEXT NOT NULL,
+            description TEXT NOT NULL DEFAULT '',
+            tags TEXT NOT NULL DEFAULT '',
+            source TEXT NOT NULL,
+            source_signature TEXT NOT NULL
+        );
+        CREATE TABLE article_tags (
+            tag TEXT NOT NULL,
+            article_id INTEGER NOT NULL REFERENCES articles(id) ON DELETE CASCADE,
+            PRIMARY KEY (tag, article_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX idx_article_tags_article ON article_tags (article_id);
+        CREATE TABLE article_sources (
+            source TEXT PRIMARY KEY,
+            signature TEXT NOT NULL
+        );
+        CREATE TABLE article_reads (
+            user_id TEXT PRIMARY KEY,
+            bitmap BLOB NOT NULL
+        );
+        CREATE TABLE article_picks (
+            user_id TEXT NOT NULL,
+            tag TEXT NOT NULL,
+            local_date DATE NOT NULL,
+            article_id INTEGER NOT NULL,
+            PRIMARY KEY (user_id, tag)
+        );
+    """)
+
+
+def _migration_13_task_changes(conn):
+    """
+    Change log for /api/sync: the user's data version at each task's latest
+    change, with tombstones for deletes. The per-user version triggers are
+    replaced so the bump and the log entry happen together.
+    """
+    conn.execute("""
+        CREATE TABLE task_changes (
+            user_id TEXT NOT NULL,
+            task_id INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            deleted INTEGER NOT NULL DEFAULT 0,
+            changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, task_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX idx_task_changes_user_version ON task_changes (user_id, version)")
+    # Highest version whose tombstones have been pruned; older clients resync in full
+    conn.execute("ALTER TABLE users ADD COLUMN sync_floor INTEGER NOT NULL DEFAULT 0")
+    conn.execute("""
+        INSERT INTO task_changes (user_id, task_id, version)
+        SELECT tasks.user_id, tasks.id, users.version
+        FROM tasks JOIN users ON users.user_id = tasks.user_id
+    """)
+
+    def log_change(row: str, deleted: int) -> str:
+        return f"""
+            INSERT INTO task_changes (user_id, task_id, version, deleted)
+            SELECT user_id, {row}.id, version, {deleted} FROM users WHERE user_id = {row}.user_id
+            ON CONFLICT(user_id, task_id) DO UPDATE SET
+                version = excluded.version, deleted = excluded.deleted, changed_at = CURRENT_TIMESTAMP;
+        """
+
+    for event in ("insert", "update", "delete"):
+        conn.execute(f"DROP TRIGGER tasks_{event}_bump_version")
+    conn.execute(f"""
+        CREATE TRIGGER tasks_insert_bump_version AFTER INSERT ON tasks
+        BEGIN
+            UPDATE users SET version = version + 1 WHERE user_id = NEW.user_id;
+            {log_change("NEW", 0)}
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER tasks_update_bump_version AFTER UPDATE ON tasks
+        BEGIN
+            UPDATE users SET version = version + 1
+            WHERE user_id IN (OLD.user_id, NEW.user_id);
+            {log_change("NEW", 0)}
+        END
+    """)
+    # A task moved to another user (claim_orphaned_data) is gone for the old one
+    conn.execute(f"""
+        CREATE TRIGGER tasks_update_owner_tombstone AFTER UPDATE OF user_id ON tasks
+        WHEN OLD.user_id != NEW.user_id
+        BEGIN
+            {log_change("OLD", 1)}
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER tasks_delete_bump_version AFTER DELETE ON tasks
+        BEGIN
+            UPDATE users SET version = version + 1 WHERE user_id = OLD.user_id;
+            {log_change("OLD", 1)}
+        END
+    """)
+
+
+MIGRATIONS = [
+    _migration_1_base_schema,
+    _migration_2_day_rollover,
+    _migration_3_hot_query_indexes,
+    _migration_4_data_version,
+    _migration_5_stats_counters,
+    _migration_6_dm_channels,
+    _migration_7_multi_user,
+    _migration_8_morning_schedule,
+    _migration_9_task_archive,
+    _migration_10_task_search,
+    _migration_11_digest_cache,
+    _migration_12_article_catalog,
+    _migration_13_task_changes,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version() -> int:
+    """Return the schema version recorded in the database file."""
+    with connection() as conn:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def init_db():
+    """Bring the schema up to date, applying any pending migrations."""
+    global _schema_ready, _migrating
+    with _schema_lock:
+        _migrating = True
+        try:
+            if _writer.in_writer:
+                _migrate()
+            else:
+                # No timeout: the first run on a big database can take a while
+                _writer.submit(_migrate, exclusive=True).result()
+        finally:
+            _migrating = False
+        _schema_ready = True
+
+
+def _migrate():
+    """Apply pending migrations, each in its own transaction (on the writer)."""
+    version = get_schema_version()
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Database schema v{version} is newer than this code (v{SCHEMA_VERSION})"
+        )
+
+    for number in range(version + 1, SCHEMA_VERSION + 1):
+        with transaction() as conn:
+            MIGRATIONS[number - 1](conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+
+    if version < SCHEMA_VERSION:
+        # Refresh planner statistics for the new indexes
+        with connection() as conn:
+            conn.execute("PRAGMA optimize")
+
+
+# --- Users ---
+
+def _ensure_user(conn, user_id: str):
+    conn.execute("INSERT OR IGNORE INTO users (user_id) VALUES (?)", (user_id,))
+
+
+@_write
+def ensure_user(user_id: str):
+    """Create the user's row if this is the first time we've seen them."""
+    with transaction() as conn:
+        _ensure_user(conn, user_id)
+
+
+def get_user(user_id: str) -> Optional[dict]:
+    """Get a user's row (rollover state, data version, counters)."""
+    with connection() as conn:
+        row = conn.execute("SELECT * FROM users WHERE user_id = ?", (user_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def _hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+@_write
+def create_api_token(user_id: str) -> str:
+    """Issue a new API token for the user, replacing any previous one."""
+    token = secrets.token_urlsafe(32)
+    with transaction() as conn:
+        _ensure_user(conn, user_id)
+        conn.execute(
+            "UPDATE users SET api_token_hash = ? WHERE user_id = ?",
+            (_hash_token(token), user_id)
+        )
+    return token
+
+
+def get_user_by_token(token: str) -> Optional[str]:
+    """Resolve an API token to its user ID. Only token hashes are stored."""
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT user_id FROM users WHERE api_token_hash = ?", (_hash_token(token),)
+        ).fetchone()
+    return row["user_id"] if row else None
+
+
+@_write
+def claim_orphaned_data(user_id: str) -> bool:
+    """
+    Give tasks and plans from before multi-user support to `user_id`.
+    Only done if that user has no tasks yet. Returns True if anything moved.
+    """
+    with transaction() as conn:
+        legacy = conn.execute("SELECT * FROM users WHERE user_id = ''").fetchone()
+        if legacy is None:
+            return False
+        has_tasks = conn.execute(
+            "SELECT 1 FROM tasks WHERE user_id = ? LIMIT 1", (user_id,)
+        ).fetchone()
+        if has_tasks:
+            return False
+
+        _ensure_user(conn, user_id)
+        # first_day values are relative to the legacy rollover counter
+        conn.execute(
+            "UPDATE users SET day = ?, last_date = ? WHERE user_id = ?",
+            (legacy["day"], legacy["last_date"], user_id)
+        )
+        # Counter triggers move pending/completed counts along with the rows
+        conn.execute("UPDATE tasks SET user_id = ? WHERE user_id = ''", (user_id,))
+        conn.execute(
+            "UPDATE OR IGNORE daily_plans SET user_id = ? WHERE user_id = ''", (user_id,)
+        )
+        conn.execute("DELETE FROM daily_plans WHERE user_id = ''")
+        conn.execute("DELETE FROM completed_daily WHERE user_id = ''")
+        conn.execute("DELETE FROM users WHERE user_id = ''")
+        return True
+
+
+def get_data_version(user_id: str) -> int:
+    """
+    Return a counter that increases on every write to this user's tasks,
+    plans or rollover. Cheap enough to check on every request (e.g. for ETags).
+    """
+    with connection() as conn:
+        row = conn.execute("SELECT version FROM users WHERE user_id = ?", (user_id,)).fetchone()
+    return row["version"] if row else 0
+
+
+@_write
+def start_day(user_id: str, today: Optional[date] = None) -> bool:
+    """
+    Roll all of a user's pending tasks over to a new day in one write.
+    Safe to call repeatedly: only the first call for a date counts.
+    Returns True if this call started the day.
+    """
+    today = (today or date.today()).isoformat()
+    with transaction() as conn:
+        _ensure_user(conn, user_id)
+        cursor = conn.execute(
+            """UPDATE users SET day = day + 1, last_date = ?, version = version + 1
+               WHERE user_id = ? AND (last_date IS NULL OR last_date < ?)""",
+            (today, user_id, today)
+        )
+        started = cursor.rowcount > 0
+
+    if started:
+        # Every pending task's carryover changed; clients should refetch
+        _writer.after_commit(events.publish, user_id, "day_started", {"date": today})
+    return started
+
+
+# --- Morning Digest Scheduling ---
+
+@_write
+def set_morning_schedule(user_id: str, morning_time: Optional[str], timezone: Optional[str]):
+    """
+    Set a user's daily digest time ("HH:MM") and timezone. A None time turns
+    the digest off; a None timezone keeps the current one.
+    """
+    with transaction() as conn:
+        _ensure_user(conn, user_id)
+        conn.execute(
+            "UPDATE users SET morning_time = ?, timezone = COALESCE(?, timezone) WHERE user_id = ?",
+            (morning_time, timezone, user_id)
+        )
+
+
+def get_schedule_timezones() -> list:
+    """Distinct timezones that have at least one scheduled user."""
+    with connection() as conn:
+        rows = conn.execute(
+            "SELECT DISTINCT timezone FROM users WHERE morning_time IS NOT NULL"
+        ).fetchall()
+    return [row["timezone"] for row in rows]
+
+
+def get_due_digest_users(
+    timezone: str, local_date: str, earliest: str, latest: str, claim_timeout_minutes: int = 15
+) -> list:
+    """
+    Users in `timezone` whose morning time is in [earliest, latest] ("HH:MM")
+    and who haven't had a digest for `local_date` yet: never claimed, or
+    claimed more than `claim_timeout_minutes` ago and still unsent.
+    """
+    with connection() as conn:
+        rows = conn.execute(
+            """SELECT u.user_id FROM users u
+               WHERE u.timezone = ? AND u.morning_time BETWEEN ? AND ?
+               AND NOT EXISTS (
+                   SELECT 1 FROM digest_sends d
+                   WHERE d.user_id = u.user_id AND d.local_date = ?
+                   AND (d.sent_at IS NOT NULL OR d.claimed_at > datetime('now', ?))
+               )""",
+            (timezone, earliest, latest, local_date, f"-{int(claim_timeout_minutes)} minutes")
+        ).fetchall()
+    return [row["user_id"] for row in rows]
+
+
+@_write
+def claim_digest(user_id: str, local_date: str, claim_timeout_minutes: int = 15) -> bool:
+    """
+    Reserve the digest for this user and date. False if it was sent, or is
+    claimed by a send that started less than `claim_timeout_minutes` ago.
+    Older unsent claims are taken over: their sender crashed or gave up.
+    """
+    with transaction() as conn:
+        cursor = conn.execute(
+            """INSERT INTO digest_sends (user_id, local_date) VALUES (?, ?)
+               ON CONFLICT(user_id, local_date) DO UPDATE SET claimed_at = CURRENT_TIMESTAMP
+               WHERE sent_at IS NULL AND claimed_at <= datetime('now', ?)""",
+            (user_id, local_date, f"-{int(claim_timeout_minutes)} minutes")
+        )
+        return cursor.rowcount > 0
+
+
+@_write
+def mark_digest_sent(user_id: str, local_date: str):
+    """Record that Slack accepted the digest."""
+    with transaction() as conn:
+        conn.execute(
+            "UPDATE digest_sends SET sent_at = ? WHERE user_id = ? AND local_date = ?",
+            (datetime.now(), user_id, local_date)
+        )
+
+
+@_write
+def release_digest(user_id: str, local_date: str):
+    """Drop an unsent claim so a later tick can try again."""
+    with transaction() as conn:
+        conn.execute(
+            "DELETE FROM digest_sends WHERE user_id = ? AND local_date = ? AND sent_at IS NULL",
+            (user_id, local_date)
+        )
+
+
+# --- Archive & Compaction ---
+
+ARCHIVED_COLUMNS = "id, user_id, text, area, created_at, completed_at, status, first_day, completed_day"
+
+
+def archive_completed_tasks(older_than_days: int, batch_size: int = 5000) -> int:
+    """
+    Move tasks completed more than `older_than_days` ago into tasks_archive.
+    Works in batches, each its own write, so the write lock is never held for
+    long. Returns the number of tasks moved.
+    """
+    cutoff = (date.today() - timedelta(days=older_than_days)).isoformat()
+    moved = 0
+    while True:
+        count = _archive_batch(cutoff, batch_size)
+        if not count:
+            return moved
+        moved += count
+
+
+@_write
+def _archive_batch(cutoff: str, batch_size: int) -> int:
+    with transaction() as conn:
+        ids = [row["id"] for row in conn.execute(
+            """SELECT id FROM tasks
+               WHERE status = 'completed' AND completed_day < ? LIMIT ?""",
+            (cutoff, batch_size)
+        )]
+        if not ids:
+            return 0
+        batch = json.dumps(ids)
+
+        conn.execute(
+            f"""INSERT INTO tasks_archive ({ARCHIVED_COLUMNS})
+                SELECT {ARCHIVED_COLUMNS} FROM tasks
+                WHERE id IN (SELECT value FROM json_each(?))""",
+            (batch,)
+        )
+        conn.execute("DELETE FROM tasks WHERE id IN (SELECT value FROM json_each(?))", (batch,))
+        # The delete trigger took these off completed_daily, but they
+        # were still completed on those days; put the counts back
+        conn.execute(
+            """INSERT INTO completed_daily (user_id, day, completed)
+               SELECT user_id, completed_day, COUNT(*) FROM tasks_archive
+               WHERE id IN (SELECT value FROM json_each(?))
+               GROUP BY user_id, completed_day
+               ON CONFLICT(user_id, day) DO UPDATE SET completed = completed + excluded.completed""",
+            (batch,)
+        )
+    return len(ids)
+
+
+@_write
+def prune_task_changes(older_than_days: int) -> int:
+    """
+    Drop tombstones older than `older_than_days`. Clients that last synced
+    before them get a full list on their next sync. Returns the number dropped.
+    """
+    cutoff = (datetime.now() - timedelta(days=older_than_days)).strftime("%Y-%m-%d %H:%M:%S")
+    with transaction() as conn:
+        conn.execute(
+            """UPDATE users SET sync_floor = (
+                   SELECT MAX(version) FROM task_changes
+                   WHERE task_changes.user_id = users.user_id AND deleted AND changed_at < ?
+               )
+               WHERE user_id IN (
+                   SELECT user_id FROM task_changes WHERE deleted AND changed_at < ?
+               )""",
+            (cutoff, cutoff)
+        )
+        return conn.execute(
+            "DELETE FROM task_changes WHERE deleted AND changed_at < ?", (cutoff,)
+        ).rowcount
+
+
+@_write(exclusive=True)
+def compact(max_pages: Optional[int] = None) -> int:
+    """
+    Return free pages to the filesystem with an incremental vacuum (all of
+    them, or at most `max_pages`). Databases created before incremental
+    auto_vacuum are converted first with a one-off full VACUUM. Runs on the
+    writer between groups, so queued writes wait rather than fail. Returns
+    the number of pages freed.
+    """
+    with connection() as conn:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        conn.execute(f"PRAGMA incremental_vacuum({int(max_pages or 0)})").fetchall()
+        return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def get_cached_digest(user_id: str, local_date: date, version: int) -> Optional[tuple]:
+    """(text, blocks) of the cached digest, if it was built for this date and data version."""
+    with connection() as conn:
+        row = conn.execute(
+            """SELECT text, blocks FROM digest_cache
+               WHERE user_id = ? AND local_date = ? AND data_version = ?""",
+            (user_id, local_date.isoformat(), version)
+        ).fetchone()
+    return (row["text"], json.loads(row["blocks"])) if row else None
+
+
+@_write
+def save_cached_digest(user_id: str, local_date: date, version: int, text: str, blocks: list):
+    """Replace the user's cached digest."""
+    with transaction() as conn:
+        conn.execute(
+            """INSERT INTO digest_cache (user_id, local_date, data_version, text, blocks, built_at)
+               VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+               ON CONFLICT(user_id) DO UPDATE SET
+               local_date = excluded.local_date, data_version = excluded.data_version,
+               text = excluded.text, blocks = excluded.blocks, built_at = excluded.built_at""",
+            (user_id, local_date.isoformat(), version, text, json.dumps(blocks))
+        )
+
+
+# --- Article Catalog ---
+
+ARTICLE_COLUMNS = "a.id, a.title, a.url, a.description, a.tags"
+# Candidate IDs fetched per index probe while looking for an unread article
+ARTICLE_PROBE = 64
+_NOT_ALL_READ = re.compile(rb"[^\xff]")
+
+
+def get_article_source(source: str) -> Optional[str]:
+    """Signature recorded by the last import of `source`, if any."""
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT signature FROM article_sources WHERE source = ?", (source,)
+        ).fetchone()
+    return row["signature"] if row else None
+
+
+@_write
+def import_articles(source: str, signature: str, rows) -> int:
+    """
+    Make the catalog's entries from `source` match `rows` (dicts with title,
+    url and optional description and tags) and record `signature`. Articles
+    are matched by URL and keep their IDs, so read history stays valid;
+    entries the source no longer has are removed. Returns the row count.
+    """
+    count = 0
+    with transaction() as conn:
+        for row in rows:
+            tags = row.get("tags") or ()
+            if isinstance(tags, str):
+                tags = tags.split(",")
+            tags = sorted({tag.strip().lower() for tag in tags if tag.strip()})
+            article_id = conn.execute(
+                """INSERT INTO articles (url, title, description, tags, source, source_signature)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(url) DO UPDATE SET
+                   title = excluded.title, description = excluded.description, tags = excluded.tags,
+                   source = excluded.source, source_signature = excluded.source_signature
+                   RETURNING id""",
+                (row["url"], row["title"], row.get("description") or "", ",".join(tags),
+                 source, signature)
+            ).fetchone()[0]
+            conn.execute("DELETE FROM article_tags WHERE article_id = ?", (article_id,))
+            conn.executemany(
+                "INSERT INTO article_tags (tag, article_id) VALUES (?, ?)",
+                [(tag, article_id) for tag in tags]
+            )
+            count += 1
+        conn.execute(
+            "DELETE FROM articles WHERE source = ? AND source_signature != ?", (source, signature)
+        )
+        conn.execute(
+            """INSERT INTO article_sources (source, signature) VALUES (?, ?)
+               ON CONFLICT(source) DO UPDATE SET signature = excluded.signature""",
+            (source, signature)
+        )
+    return count
+
+
+def get_article_tags() -> list:
+    """(tag, article count) pairs, alphabetically. Reads only the tag index."""
+    with connection() as conn:
+        rows = conn.execute(
+            "SELECT tag, count(*) AS articles FROM article_tags GROUP BY tag ORDER BY tag"
+        ).fetchall()
+    return [(row["tag"], row["articles"]) for row in rows]
+
+
+def get_random_article(tag: str = "") -> Optional[dict]:
+    """A random article (with `tag`, if given): one probe at a random ID, not a scan."""
+    with connection() as conn:
+        if tag:
+            row = conn.execute(
+                f"""SELECT {ARTICLE_COLUMNS} FROM article_tags t JOIN articles a ON a.id = t.article_id
+                    WHERE t.tag = ?1 AND t.article_id >= (
+                        SELECT abs(random()) % (max(article_id) + 1) FROM article_tags WHERE tag = ?1
+                    )
+                    ORDER BY t.article_id LIMIT 1""",
+                (tag,)
+            ).fetchone()
+        else:
+            row = conn.execute(
+                f"""SELECT {ARTICLE_COLUMNS} FROM articles a
+                    WHERE a.id >= (SELECT abs(random()) % (max(id) + 1) FROM articles)
+                    ORDER BY a.id LIMIT 1"""
+            ).fetchone()
+    return dict(row) if row else None
+
+
+def get_article_pick(user_id: str, local_date: date, tag: str = "") -> Optional[dict]:
+    """The user's memoized article for `local_date` and `tag`, if it was already picked."""
+    with connection() as conn:
+        row = _article_pick(conn, user_id, local_date, tag)
+    return dict(row) if row else None
+
+
+@_write
+def pick_article(user_id: str, local_date: date, seed: int, tag: str = "") -> Optional[dict]:
+    """
+    The user's article for `local_date` (restricted to `tag` unless it is
+    ""): the memoized pick if there is one, otherwise the first unread
+    article from a `seed`-derived starting ID onwards, found through the ID
+    or tag index and the user's read bitmap. The pick is recorded as read,
+    and once everything eligible has been read a new cycle starts. Returns
+    None only if nothing matches `tag`.
+    """
+    with transaction() as conn:
+        row = _article_pick(conn, user_id, local_date, tag)
+        if row:
+            return dict(row)
+        top = conn.execute("SELECT max(id) FROM articles").fetchone()[0]
+        if top is None:
+            return None
+        start = seed % (top + 1)
+
+        row = conn.execute("SELECT bitmap FROM article_reads WHERE user_id = ?", (user_id,)).fetchone()
+        bitmap = bytearray(row["bitmap"]) if row else bytearray()
+        article_id = _first_unread(conn, bitmap, start, tag) or _first_unread(conn, bitmap, 0, tag)
+        if article_id is None:
+            _clear_reads(conn, bitmap, tag)
+            article_id = _first_unread(conn, bitmap, start, tag) or _first_unread(conn, bitmap, 0, tag)
+            if article_id is None:
+                return None
+
+        index = article_id >> 3
+        if index >= len(bitmap):
+            bitmap.extend(bytes(index + 1 - len(bitmap)))
+        bitmap[index] |= 1 << (article_id & 7)
+        conn.execute(
+            """INSERT INTO article_reads (user_id, bitmap) VALUES (?, ?)
+               ON CONFLICT(user_id) DO UPDATE SET bitmap = excluded.bitmap""",
+            (user_id, bytes(bitmap))
+        )
+        conn.execute(
+            """INSERT INTO article_picks (user_id, tag, local_date, article_id) VALUES (?, ?, ?, ?)
+               ON CONFLICT(user_id, tag) DO UPDATE SET
+               local_date = excluded.local_date, article_id = excluded.article_id""",
+            (user_id, tag, local_date.isoformat(), article_id)
+        )
+        return dict(_article_pick(conn, user_id, local_date, tag))
+
+
+def _article_pick(conn, user_id: str, local_date: date, tag: str):
+    return conn.execute(
+        f"""SELECT {ARTICLE_COLUMNS} FROM article_picks p JOIN articles a ON a.id = p.article_id
+            WHERE p.user_id = ? AND p.tag = ? AND p.local_date = ?""",
+        (user_id, tag, local_date.isoformat())
+    ).fetchone()
+
+
+def _is_read(bitmap: bytearray, article_id: int) -> bool:
+    index = article_id >> 3
+    return index < len(bitmap) and bool(bitmap[index] >> (article_id & 7) & 1)
+
+
+def _lowest_clear_bit(byte: int) -> int:
+    return (~byte & (byte + 1)).bit_length() - 1
+
+
+def _next_unread(bitmap: bytearray, position: int) -> int:
+    """Smallest ID >= `position` not marked read (IDs past the bitmap are unread)."""
+    index = position >> 3
+    if index >= len(bitmap):
+        return position
+    byte = bitmap[index] | ((1 << (position & 7)) - 1)
+    if byte != 0xFF:
+        return (index << 3) + _lowest_clear_bit(byte)
+    match = _NOT_ALL_READ.search(bitmap, index + 1)
+    if not match:
+        return len(bitmap) << 3
+    index = match.start()
+    return (index << 3) + _lowest_clear_bit(bitmap[index])
+
+
+def _first_unread(conn, bitmap: bytearray, start: int, tag: str) -> Optional[int]:
+    """
+    Lowest unread article ID >= `start`. Probes the ID (or tag) index from
+    the next unread bit, so runs of read articles are skipped without
+    touching their rows.
+    """
+    if tag:
+        sql = """SELECT article_id FROM article_tags WHERE tag = ? AND article_id >= ?
+                 ORDER BY article_id LIMIT ?"""
+        prefix = (tag,)
+    else:
+        sql = "SELECT id FROM articles WHERE id >= ? ORDER BY id LIMIT ?"
+        prefix = ()
+    position = start
+    while True:
+        position = _next_unread(bitmap, position)
+        ids = [row[0] for row in conn.execute(sql, (*prefix, position, ARTICLE_PROBE))]
+        if not ids:
+            return None
+        for article_id in ids:
+            if not _is_read(bitmap, article_id):
+                return article_id
+        position = ids[-1] + 1
+
+
+def _clear_reads(conn, bitmap: bytearray, tag: str):
+    """Start a new cycle: forget reads of everything (or everything with `tag`)."""
+    if not tag:
+        bitmap.clear()
+        return
+    for (article_id,) in conn.execute("SELECT article_id FROM article_tags WHERE tag = ?", (tag,)):
+        index = article_id >> 3
+        if index < len(bitmap):
+            bitmap[index] &= ~(1 << (article_id & 7)) & 0xFF
 
 
 # --- Task Operations ---
 
-def add_task(text: str, area: str = "work") -> int:
+def add_task(user_id: str, text: str, area: str = "work") -> int:
     """Add a new task. Returns the task ID."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO tasks (text, area) VALUES (?, ?)",
-        (text, area)
-    )
-    task_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return task_id
+    return add_tasks(user_id, [(text, area)])[0]
+
+
+@_write
+def add_tasks(user_id: str, items: list) -> list:
+    """
+    Add several tasks in one transaction.
+    Items are (text, area) pairs. Returns the new task IDs in the same order.
+    """
+    with transaction() as conn:
+        _ensure_user(conn, user_id)
+        task_ids = [
+            conn.execute(
+                """INSERT INTO tasks (user_id, text, area, first_day)
+                   VALUES (?, ?, ?, (SELECT day FROM users WHERE user_id = ?))""",
+                (user_id, text, area, user_id)
+            ).lastrowid
+            for text, area in items
+        ]
 
+    for task_id, (text, area) in zip(task_ids, items):
+        _writer.after_commit(events.publish, user_id, "task_added", {
+            "id": task_id,
+            "text": text,
+            "area": area,
+            "status": "pending",
+            "carryover_count": 0
+        })
+    return task_ids
 
-def get_pending_tasks() -> list:
+
+def get_task(user_id: str, task_id: int) -> Optional[dict]:
+    """Get a single task by ID."""
+    with connection() as conn:
+        row = conn.execute(
+            f"SELECT {TASK_COLUMNS} FROM tasks WHERE id = ? AND user_id = ?",
+            (task_id, user_id)
+        ).fetchone()
+    return dict(row) if row else None
+
+
+def get_pending_tasks(user_id: str) -> list:
     """Get all pending (incomplete) tasks."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT * FROM tasks WHERE status = 'pending' ORDER BY created_at"
-    )
-    tasks = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return tasks
+    with connection() as conn:
+        rows = conn.execute(
+            f"""SELECT {TASK_COLUMNS} FROM tasks
+                WHERE user_id = ? AND status = 'pending' ORDER BY created_at""",
+            (user_id,)
+        ).fetchall()
+    return [dict(row) for row in rows]
 
 
-def get_tasks_by_area(area: str) -> list:
+def get_tasks_by_area(user_id: str, area: str) -> list:
     """Get pending tasks for a specific area."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT * FROM tasks WHERE status = 'pending' AND area = ? ORDER BY created_at",
-        (area,)
-    )
-    tasks = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return tasks
+    with connection() as conn:
+        rows = conn.execute(
+            f"""SELECT {TASK_COLUMNS} FROM tasks
+                WHERE user_id = ? AND status = 'pending' AND area = ? ORDER BY created_at""",
+            (user_id, area)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def _encode_cursor(created_at: str, task_id: int) -> str:
+    raw = json.dumps([created_at, task_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, task_id = json.loads(raw)
+        if isinstance(created_at, str) and isinstance(task_id, int):
+            return created_at, task_id
+    except (ValueError, TypeError):
+        pass
+    raise ValueError("Invalid cursor")
+
+
+def get_tasks_page(
+    user_id: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    area: Optional[str] = None,
+    fields: Optional[list] = None,
+) -> tuple:
+    """
+    One page of pending tasks in (created_at, id) order.
+
+    Returns (tasks, next_cursor); pass next_cursor back to get the following
+    page, or stop when it is None. `fields` limits the keys returned (see
+    TASK_FIELDS). Raises ValueError for an unknown field or a bad cursor.
+    Each page is a seek on the pending index, so later pages cost the same
+    as the first.
+    """
+    fields = list(fields or TASK_FIELDS)
+    unknown = [f for f in fields if f not in TASK_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+
+    # id and created_at are always read: the next cursor is built from them
+    selected = dict.fromkeys(["id", "created_at"] + fields)
+    columns = ", ".join(TASK_FIELDS[f] for f in selected)
+
+    where = "user_id = ? AND status = 'pending'"
+    params = [user_id]
+    if area is not None:
+        where += " AND area = ?"
+        params.append(area)
+    if cursor:
+        where += " AND (created_at, id) > (?, ?)"
+        params.extend(_decode_cursor(cursor))
 
+    with connection() as conn:
+        rows = conn.execute(
+            f"SELECT {columns} FROM tasks WHERE {where} ORDER BY created_at, id LIMIT ?",
+            (*params, limit + 1)
+        ).fetchall()
 
-def complete_task(task_id: int) -> bool:
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(str(rows[-1]["created_at"]), rows[-1]["id"])
+    return [{f: row[f] for f in fields} for row in rows], next_cursor
+
+
+EXPORT_COLUMNS = "id, text, area, status, created_at, completed_at"
+
+
+def iter_tasks(user_id: str, include_archived: bool = True, batch_size: int = 500):
+    """
+    Yield every one of the user's tasks as a dict with an `archived` flag:
+    live tasks, then archived ones, each in ID order. Rows come off the
+    cursor `batch_size` at a time, for streaming exports; the generator
+    holds a pooled connection until it is exhausted or closed.
+    """
+    tables = [("tasks", False)] + ([("tasks_archive", True)] if include_archived else [])
+    with connection() as conn:
+        for table, archived in tables:
+            cursor = conn.execute(
+                f"SELECT {EXPORT_COLUMNS} FROM {table} WHERE user_id = ? ORDER BY id", (user_id,)
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    task = dict(row)
+                    task["archived"] = archived
+                    yield task
+
+
+def get_task_changes(user_id: str, since: int = 0) -> dict:
+    """
+    What changed in the user's pending list since data version `since`:
+    {"version", "day", "full", "tasks", "deleted"}. `tasks` are the changed
+    tasks in any status (drop the ones no longer pending), `deleted` the IDs
+    removed. `full` means `tasks` is the whole pending list instead, for a
+    first sync or a client older than the pruned tombstones. `day` is the
+    rollover counter: every task's carryover_count moves up with it.
+    """
+    with snapshot() as conn:
+        user = conn.execute(
+            "SELECT version, day, sync_floor FROM users WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        version, day, floor = (user["version"], user["day"], user["sync_floor"]) if user else (0, 0, 0)
+        changes = {"version": version, "day": day, "full": not 0 < since <= version or since < floor}
+
+        if changes["full"]:
+            rows = conn.execute(
+                f"""SELECT {TASK_COLUMNS} FROM tasks
+                    WHERE user_id = ? AND status = 'pending' ORDER BY created_at, id""",
+                (user_id,)
+            ).fetchall()
+            deleted = []
+        else:
+            rows = conn.execute(
+                f"""SELECT {TASK_COLUMNS} FROM task_changes
+                    JOIN tasks ON tasks.id = task_changes.task_id
+                    WHERE task_changes.user_id = ? AND task_changes.version > ?
+                      AND NOT task_changes.deleted
+                    ORDER BY created_at, id""",
+                (user_id, since)
+            ).fetchall()
+            deleted = [row["task_id"] for row in conn.execute(
+                """SELECT task_id FROM task_changes
+                   WHERE user_id = ? AND version > ? AND deleted""",
+                (user_id, since)
+            )]
+    changes["tasks"] = [dict(row) for row in rows]
+    changes["deleted"] = deleted
+    return changes
+
+
+def _fts_query(user_id: str, query: str) -> str:
+    """
+    Turn free text into an FTS5 query: every word must match (the last one
+    as a prefix), within this user's tasks. Raises ValueError if no words.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        raise ValueError("Search needs at least one word")
+    terms = " ".join(f'"{word}"' for word in words) + "*"
+    return f'text : ({terms}) AND user_id : "{user_id.replace(chr(34), chr(34) * 2)}"'
+
+
+# snippet() marks matches with control characters, which escaping leaves
+# alone, and they are swapped for the real markers afterwards
+_SNIPPET_START, _SNIPPET_END = "\x02", "\x03"
+
+
+def search_tasks(
+    user_id: str,
+    query: str,
+    limit: int = 20,
+    offset: int = 0,
+    highlight: tuple = ("*", "*"),
+    escape=None,
+) -> list:
+    """
+    Tasks (pending, completed or archived) matching `query`, best match
+    first. Each result has a `snippet` of the text with matches wrapped in
+    `highlight`, and `archived` is true for tasks in tasks_archive. If
+    given, `escape` is applied to the snippet text before the markers are
+    added (e.g. html.escape when the markers are HTML tags).
+    """
+    # Rank and page the index hits first, then fetch just those rows by ID
+    # (joining the all_tasks view instead would materialize it)
+    with connection() as conn:
+        rows = conn.execute(
+            """WITH hits AS (
+                   SELECT rowid AS id, snippet(tasks_fts, 0, ?, ?, '…', 12) AS snippet,
+                          bm25(tasks_fts, 1.0, 0.0) AS score
+                   FROM tasks_fts WHERE tasks_fts MATCH ?
+                   ORDER BY score, rowid DESC LIMIT ? OFFSET ?
+               )
+               SELECT h.id, COALESCE(t.text, a.text) AS text, COALESCE(t.area, a.area) AS area,
+                      COALESCE(t.status, a.status) AS status,
+                      COALESCE(t.created_at, a.created_at) AS created_at,
+                      COALESCE(t.completed_at, a.completed_at) AS completed_at,
+                      a.id IS NOT NULL AS archived, h.snippet
+               FROM hits h
+               LEFT JOIN tasks t ON t.id = h.id
+               LEFT JOIN tasks_archive a ON a.id = h.id
+               ORDER BY h.score, h.id DESC""",
+            (_SNIPPET_START, _SNIPPET_END, _fts_query(user_id, query), limit, offset)
+        ).fetchall()
+    start, end = highlight
+    results = []
+    for row in rows:
+        snippet = row["snippet"]
+        if escape:
+            snippet = escape(snippet)
+        snippet = snippet.replace(_SNIPPET_START, start).replace(_SNIPPET_END, end)
+        results.append(dict(row, snippet=snippet, archived=bool(row["archived"])))
+    return results
+
+
+@_write
+def complete_task(user_id: str, task_id: int) -> bool:
     """Mark a task as completed."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE tasks SET status = 'completed', completed_at = ? WHERE id = ?",
-        (datetime.now(), task_id)
-    )
-    success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
+    now = datetime.now()
+    with transaction() as conn:
+        cursor = conn.execute(
+            """UPDATE tasks SET status = 'completed', completed_at = ?, completed_day = ?
+               WHERE id = ? AND user_id = ?""",
+            (now, now.date().isoformat(), task_id, user_id)
+        )
+        success = cursor.rowcount > 0
+
+    if success:
+        _writer.after_commit(events.publish, user_id, "task_completed", {"id": task_id})
     return success
 
 
-def delete_task(task_id: int) -> bool:
+@_write
+def delete_task(user_id: str, task_id: int) -> bool:
     """Delete a task entirely."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
-    success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cursor = conn.execute(
+            "DELETE FROM tasks WHERE id = ? AND user_id = ?", (task_id, user_id)
+        )
+        success = cursor.rowcount > 0
+
+    if success:
+        _writer.after_commit(events.publish, user_id, "task_deleted", {"id": task_id})
     return success
 
 
-def increment_carryover(task_id: int):
-    """Increment the carryover count for a task (called when it rolls to next day)."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE tasks SET carryover_count = carryover_count + 1 WHERE id = ?",
-        (task_id,)
-    )
-    conn.commit()
-    conn.close()
+def get_stuck_tasks(user_id: str, min_carryover: int = 3) -> list:
+    """Get tasks that have been carried over multiple times."""
+    with connection() as conn:
+        rows = conn.execute(
+            f"""SELECT {TASK_COLUMNS} FROM tasks
+                WHERE user_id = ? AND status = 'pending'
+                AND first_day <= (SELECT day FROM users WHERE user_id = ?) - ?""",
+            (user_id, user_id, min_carryover)
+        ).fetchall()
+    return [dict(row) for row in rows]
 
 
-def get_stuck_tasks(min_carryover: int = 3) -> list:
-    """Get tasks that have been carried over multiple times."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT * FROM tasks WHERE status = 'pending' AND carryover_count >= ?",
-        (min_carryover,)
-    )
-    tasks = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return tasks
+def get_stats(user_id: str, day: Optional[date] = None) -> dict:
+    """Pending count and number of tasks completed on `day` (default today)."""
+    day = (day or date.today()).isoformat()
+    with connection() as conn:
+        row = conn.execute(
+            """SELECT
+                   IFNULL((SELECT pending FROM users WHERE user_id = ?), 0) AS pending,
+                   IFNULL((SELECT completed FROM completed_daily
+                           WHERE user_id = ? AND day = ?), 0) AS completed_today""",
+            (user_id, user_id, day)
+        ).fetchone()
+    return dict(row)
 
 
 # --- Daily Plan Operations ---
 
-def save_daily_plan(focus_items: list, win_criteria: str = "") -> int:
-    """Save today's plan. Replaces existing plan for today."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    today = date.today().isoformat()
+@_write
+def save_daily_plan(user_id: str, focus_items: list, win_criteria: str = "",
+                    day: Optional[date] = None) -> int:
+    """Save the plan for `day` (default today). Replaces any existing plan for it."""
+    today = (day or date.today()).isoformat()
     focus_text = "\n".join(focus_items) if focus_items else ""
 
-    cursor.execute(
-        """INSERT INTO daily_plans (plan_date, focus_items, win_criteria)
-           VALUES (?, ?, ?)
-           ON CONFLICT(plan_date) DO UPDATE SET
-           focus_items = excluded.focus_items,
-           win_criteria = excluded.win_criteria""",
-        (today, focus_text, win_criteria)
-    )
-    plan_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return plan_id
-
-
-def get_today_plan() -> Optional[dict]:
-    """Get today's plan if it exists."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    today = date.today().isoformat()
-    cursor.execute(
-        "SELECT * FROM daily_plans WHERE plan_date = ?",
-        (today,)
-    )
-    row = cursor.fetchone()
-    conn.close()
-    return dict(row) if row else None
+    with transaction() as conn:
+        _ensure_user(conn, user_id)
+        cursor = conn.execute(
+            """INSERT INTO daily_plans (user_id, plan_date, focus_items, win_criteria)
+               VALUES (?, ?, ?, ?)
+               ON CONFLICT(user_id, plan_date) DO UPDATE SET
+               focus_items = excluded.focus_items,
+               win_criteria = excluded.win_criteria""",
+            (user_id, today, focus_text, win_criteria)
+        )
+        return cursor.lastrowid
 
 
-def get_yesterday_plan() -> Optional[dict]:
-    """Get yesterday's plan to check carryover."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    from datetime import timedelta
-    yesterday = (date.today() - timedelta(days=1)).isoformat()
-    cursor.execute(
-        "SELECT * FROM daily_plans WHERE plan_date = ?",
-        (yesterday,)
-    )
-    row = cursor.fetchone()
-    conn.close()
+def get_today_plan(user_id: str, day: Optional[date] = None) -> Optional[dict]:
+    """Get the plan for `day` (default today) if it exists."""
+    return _get_plan(user_id, day or date.today())
+
+
+def get_yesterday_plan(user_id: str, day: Optional[date] = None) -> Optional[dict]:
+    """Get the plan for the day before `day` (default today) to check carryover."""
+    return _get_plan(user_id, (day or date.today()) - timedelta(days=1))
+
+
+def _get_plan(user_id: str, plan_date: date) -> Optional[dict]:
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT * FROM daily_plans WHERE user_id = ? AND plan_date = ?",
+            (user_id, plan_date.isoformat())
+        ).fetchone()
     return dict(row) if row else None
 
 
-# Initialize on import
-init_db()
+# --- Slack DM Channels ---
+
+def get_dm_channel(user_id: str) -> Optional[str]:
+    """Get the cached DM channel ID for a Slack user."""
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT channel_id FROM dm_channels WHERE user_id = ?", (user_id,)
+        ).fetchone()
+    return row["channel_id"] if row else None
+
+
+@_write
+def save_dm_channel(user_id: str, channel_id: str):
+    """Remember the DM channel ID for a Slack user."""
+    with transaction() as conn:
+        conn.execute(
+            """INSERT INTO dm_channels (user_id, channel_id) VALUES (?, ?)
+               ON CONFLICT(user_id) DO UPDATE SET channel_id = excluded.channel_id""",
+            (user_id, channel_id)
+        )
+
+
+@_write
+def forget_dm_channel(user_id: str):
+    """Drop a cached DM channel ID (e.g. after Slack says it's gone)."""
+    with transaction() as conn:
+        conn.execute("DELETE FROM dm_channels WHERE user_id = ?", (user_id,))
+
+
+# Time every public function above for /api/metrics (the context managers
+# hand out connections rather than doing work, so they're left alone)
+metrics.instrument_functions(globals(), metrics.db_calls, exclude=("connection", "transaction", "snapshot"))
@@ -0,0 +1,201 @@
+"""
+Background delivery of outbound Slack messages.
+
+API routes enqueue notifications and return immediately; worker threads send
+them with retries. Messages for one user always go to the same worker, so
+they are delivered in order, and a burst of plain-text messages for the same
+user is merged into a single Slack message.
+"""
+import logging
+import queue
+import threading
+import time
+from typing import Callable, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# Merged messages stay well under Slack's text limit
+MAX_MERGED_LENGTH = 3000
+
+_STOP = object()
+
+
+class Message(NamedTuple):
+    user_id: str
+    text: str
+    blocks: Optional[list] = None
+
+
+def coalesce(messages: list) -> list:
+    """Merge runs of consecutive text-only messages to the same user."""
+    merged = []
+    for message in messages:
+        last = merged[-1] if merged else None
+        if (
+            last is not None
+            and last.user_id == message.user_id
+            and last.blocks is None
+            and message.blocks is None
+            and len(last.text) + len(message.text) < MAX_MERGED_LENGTH
+        ):
+            merged[-1] = last._replace(text=f"{last.text}\n\n{message.text}")
+        else:
+            merged.append(message)
+    return merged
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds to wait from a rate-limited Slack response, if the error has one."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def send_with_retries(
+    send: Callable,
+    *args,
+    max_retries: int = 3,
+    backoff: float = 1.0,
+    limiter: "RateLimiter" = None,
+) -> bool:
+    """
+    Call `send(*args)`, retrying failures with exponential backoff (or the
+    server's Retry-After). Returns False once retries are exhausted.
+    """
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            send(*args)
+            return True
+        except Exception as e:
+            if attempt == max_retries:
+                logger.error(f"Giving up on send to {args[0] if args else '?'}: {e}")
+                return False
+            delay = retry_after(e) or backoff * 2 ** attempt
+            logger.warning(f"Send to {args[0] if args else '?'} failed ({e}); retrying in {delay}s")
+            time.sleep(delay)
+    return False
+
+
+class RateLimiter:
+    """
+    Token bucket shared by threads: `rate` acquisitions per second on
+    average, with bursts of up to `burst`.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a send is allowed."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class DeliveryQueue:
+    """
+    Ordered, retrying, coalescing message queue.
+
+    `send(user_id, text, blocks)` does the actual delivery and must raise on
+    failure so the queue can retry it.
+    """
+
+    def __init__(
+        self,
+        send: Callable,
+        workers: int = 2,
+        max_retries: int = 3,
+        backoff: float = 1.0,
+        coalesce_window: float = 0.25,
+    ):
+        self.send = send
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.coalesce_window = coalesce_window
+        self._queues = [queue.Queue() for _ in range(workers)]
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the worker threads (called automatically on first enqueue)."""
+        with self._lock:
+            if self._threads:
+                return
+            for index, q in enumerate(self._queues):
+                thread = threading.Thread(
+                    target=self._run, args=(q,), name=f"delivery-{index}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def enqueue(self, user_id: str, text: str, blocks: list = None):
+        """Queue a message for delivery and return immediately."""
+        if not self._threads:
+            self.start()
+        shard = hash(user_id) % self.workers
+        self._queues[shard].put(Message(user_id, text, blocks))
+
+    def flush(self):
+        """Block until everything queued so far has been delivered or given up."""
+        for q in self._queues:
+            q.join()
+
+    def stop(self, timeout: float = 10):
+        """Deliver what is queued, then stop the workers."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for q in self._queues:
+            q.put(_STOP)
+        for thread in threads:
+            thread.join(timeout)
+
+    def _run(self, q: queue.Queue):
+        while True:
+            first = q.get()
+            if first is _STOP:
+                q.task_done()
+                return
+
+            # Collect whatever else arrives within the window
+            batch = [first]
+            stopping = False
+            deadline = time.monotonic() + self.coalesce_window
+            while True:
+                try:
+                    item = q.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            for message in coalesce(batch):
+                self._deliver(message)
+            for _ in range(len(batch) + stopping):
+                q.task_done()
+            if stopping:
+                return
+
+    def _deliver(self, message: Message):
+        send_with_retries(
+            self.send, message.user_id, message.text, message.blocks,
+            max_retries=self.max_retries, backoff=self.backoff
+        )
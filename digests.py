@@ -0,0 +1,170 @@
+"""
+Morning digest fan-out for many users in many timezones.
+
+The scheduler calls tick() once a minute. It groups scheduled users by
+timezone, works out each group's local time, and hands users whose morning
+slot has arrived to a bounded worker pool. Every digest is claimed in
+digest_sends before it is sent, so overlapping ticks or a restart never send
+the same user two digests on one day. A claim that is still unsent after
+`claim_timeout_minutes` (the process died mid-send) is taken over by a
+later tick within the grace window, so the digest isn't lost for the day;
+sends still queued or running in this process are never claimed again.
+Sends are paced by a shared rate limiter to stay under Slack's per-method
+limits.
+
+Digests for users whose slot is coming up within a few minutes are built
+ahead of time (`prepare_digest`), so the send itself only delivers blocks.
+Each is built once, on its own thread, so warm-ups never queue ahead of
+digests that are due now.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import db
+import delivery
+
+logger = logging.getLogger(__name__)
+
+
+class MorningFanout:
+    """
+    `send_digest(user_id, local_date)` builds and sends one user's digest and
+    must raise on failure. `prepare_digest(user_id, local_date)`, if given,
+    builds (and caches) a digest without sending it.
+    """
+
+    def __init__(
+        self,
+        send_digest: Callable,
+        prepare_digest: Callable = None,
+        prepare_minutes: int = 10,
+        workers: int = 4,
+        rate_per_second: float = 5.0,
+        grace_minutes: int = 120,
+        max_retries: int = 3,
+        claim_timeout_minutes: int = 15,
+    ):
+        self.send_digest = send_digest
+        self.prepare_digest = prepare_digest
+        self.prepare_ahead = timedelta(minutes=prepare_minutes)
+        self.grace = timedelta(minutes=grace_minutes)
+        self.max_retries = max_retries
+        # Must be longer than a send with all its retries can take
+        self.claim_timeout = claim_timeout_minutes
+        self.limiter = delivery.RateLimiter(rate_per_second)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="digest")
+        self.prepare_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="digest-prepare")
+        # (user_id, local_date) already prepared or queued for it
+        self._prepared = set()
+        self._prepared_lock = threading.Lock()
+        # (user_id, local_date) claimed here and queued or sending; a slow
+        # backlog can outlast the claim timeout, so these are never re-claimed
+        self._in_flight = set()
+        self._in_flight_lock = threading.Lock()
+        self.last_tick = None
+
+    def due_users(self, now: datetime) -> list:
+        """(user_id, local_date) for every user whose morning slot has arrived."""
+        # Catch up on slots missed within the grace window (e.g. after a cold
+        # start), but never reach back into the previous day
+        return self._scheduled_between(now, -self.grace, timedelta(0))
+
+    def upcoming_users(self, now: datetime) -> list:
+        """(user_id, local_date) for users whose slot is in the next few minutes."""
+        return self._scheduled_between(now, timedelta(minutes=1), self.prepare_ahead)
+
+    def _scheduled_between(self, now: datetime, start: timedelta, end: timedelta) -> list:
+        """Unsent users with a slot between local time + start and + end, today."""
+        users = []
+        for tz_name in db.get_schedule_timezones():
+            try:
+                local = now.astimezone(ZoneInfo(tz_name))
+            except (ZoneInfoNotFoundError, ValueError):
+                logger.error(f"Skipping users with unknown timezone {tz_name!r}")
+                continue
+
+            midnight = local.replace(hour=0, minute=0, second=0, microsecond=0)
+            earliest = max(local + start, midnight)
+            latest = min(local + end, midnight + timedelta(hours=23, minutes=59))
+            if earliest > latest:
+                continue
+            local_date = local.date().isoformat()
+            for user_id in db.get_due_digest_users(
+                tz_name, local_date, earliest.strftime("%H:%M"), latest.strftime("%H:%M"),
+                self.claim_timeout
+            ):
+                users.append((user_id, local_date))
+        return users
+
+    def tick(self, now: datetime = None) -> int:
+        """Claim and queue every due digest. Returns how many were queued."""
+        now = now or datetime.now(timezone.utc)
+        self.last_tick = now
+        queued = 0
+        for user_id, local_date in self.due_users(now):
+            with self._in_flight_lock:
+                if (user_id, local_date) in self._in_flight:
+                    continue
+                self._in_flight.add((user_id, local_date))
+            claimed = False
+            try:
+                claimed = db.claim_digest(user_id, local_date, self.claim_timeout)
+            finally:
+                if not claimed:
+                    self._done(user_id, local_date)
+            if claimed:
+                self.pool.submit(self._send, user_id, local_date)
+                queued += 1
+        if queued:
+            logger.info(f"Queued {queued} morning digest(s)")
+
+        if self.prepare_digest is not None:
+            self._queue_preparation(now)
+        return queued
+
+    def _queue_preparation(self, now: datetime):
+        """Queue each upcoming digest once, not once per tick of the lead window."""
+        # No timezone's local date is more than a day behind UTC
+        oldest = (now.date() - timedelta(days=1)).isoformat()
+        with self._prepared_lock:
+            self._prepared = {key for key in self._prepared if key[1] >= oldest}
+            upcoming = [key for key in self.upcoming_users(now) if key not in self._prepared]
+            self._prepared.update(upcoming)
+        for user_id, local_date in upcoming:
+            self.prepare_pool.submit(self._prepare, user_id, local_date)
+
+    def _prepare(self, user_id: str, local_date: str):
+        try:
+            self.prepare_digest(user_id, date.fromisoformat(local_date))
+        except Exception as e:
+            # The send will build it instead; a later tick may try again
+            logger.warning(f"Couldn't prepare digest for {user_id}: {e}")
+            with self._prepared_lock:
+                self._prepared.discard((user_id, local_date))
+
+    def _send(self, user_id: str, local_date: str):
+        try:
+            sent = delivery.send_with_retries(
+                self.send_digest, user_id, date.fromisoformat(local_date),
+                max_retries=self.max_retries, limiter=self.limiter
+            )
+            if sent:
+                db.mark_digest_sent(user_id, local_date)
+            else:
+                # Let a later tick (within the grace window) try again
+                db.release_digest(user_id, local_date)
+        finally:
+            self._done(user_id, local_date)
+
+    def _done(self, user_id: str, local_date: str):
+        with self._in_flight_lock:
+            self._in_flight.discard((user_id, local_date))
+
+    def shutdown(self, wait: bool = True):
+        # Warm-ups still queued are pointless once we're stopping
+        self.prepare_pool.shutdown(wait=wait, cancel_futures=True)
+        self.pool.shutdown(wait=wait)
@@ -0,0 +1,99 @@
+"""
+In-process change feed for task events.
+
+db.py publishes an event after each committed task write, whichever thread
+made it (Slack handler, API route or scheduler). The /api/events route in
+bot.py streams them to browsers as Server-Sent Events.
+"""
+import threading
+import time
+from collections import deque
+from typing import NamedTuple, Optional
+
+HISTORY_SIZE = 1000
+
+
+class Event(NamedTuple):
+    id: int
+    user_id: str
+    type: str
+    data: dict
+
+
+class EventBus:
+    """
+    Keeps the most recent events in a ring buffer so clients can resume
+    with Last-Event-ID, and wakes waiting streams when new events arrive.
+    """
+
+    def __init__(self, history: int = HISTORY_SIZE):
+        self._events = deque(maxlen=history)
+        self._cond = threading.Condition()
+        # Seed IDs from the clock so IDs from a previous process are always
+        # older than anything this process can still replay.
+        self._last_id = int(time.time() * 1000)
+        self._first_id = self._last_id + 1
+        self._closed = False
+        self._listeners = []
+
+    @property
+    def last_id(self) -> int:
+        return self._last_id
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def close(self):
+        """Wake every waiting stream so it can see the bus is closed and end (used at shutdown)."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._notify()
+
+    def add_listener(self, callback):
+        """
+        Call `callback()` after every publish and on close, from the
+        publishing thread. For waiters that can't block on the condition,
+        such as coroutines; it must be quick and must not raise.
+        """
+        self._listeners.append(callback)
+
+    def _notify(self):
+        for callback in self._listeners:
+            callback()
+
+    def publish(self, user_id: str, event_type: str, data: dict) -> int:
+        """Record an event for a user and wake all waiting streams. Returns its ID."""
+        with self._cond:
+            self._last_id += 1
+            self._events.append(Event(self._last_id, user_id, event_type, data))
+            self._cond.notify_all()
+            event_id = self._last_id
+        self._notify()
+        return event_id
+
+    def events_after(self, event_id: int) -> Optional[list]:
+        """
+        Events newer than `event_id`, oldest first.
+        Returns None if some of them are no longer in the buffer.
+        """
+        with self._cond:
+            oldest = self._events[0].id if self._events else self._first_id
+            if event_id < oldest - 1 or event_id > self._last_id:
+                return None
+            return [e for e in self._events if e.id > event_id]
+
+    def wait(self, event_id: int, timeout: float) -> Optional[list]:
+        """Block until there are events newer than `event_id` or `timeout` passes."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._last_id > event_id or self._closed, timeout)
+        return self.events_after(event_id)
+
+
+bus = EventBus()
+
+
+def publish(user_id: str, event_type: str, data: dict) -> int:
+    """Publish an event for a user on the shared bus."""
+    return bus.publish(user_id, event_type, data)
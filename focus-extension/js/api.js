@@ -21,8 +21,19 @@ const API = {
       options.body = JSON.stringify(body);
     }
 
+    // Revalidate GETs against the last response; 304 means reuse it
+    const cached = method === 'GET' ? await Storage.getCachedResponse(endpoint) : null;
+    if (cached) {
+      options.headers['If-None-Match'] = cached.etag;
+      options.cache = 'no-store';
+    }
+
     const response = await fetch(`${config.apiUrl}${endpoint}`, options);
 
+    if (response.status === 304 && cached) {
+      return cached.body;
+    }
+
     if (!response.ok) {
       if (response.status === 401) {
         throw new Error('Invalid API token');
@@ -30,18 +41,77 @@ const API = {
       throw new Error(`Request failed: ${response.status}`);
     }
 
-    return response.json();
+    const data = await response.json();
+
+    const etag = response.headers.get('ETag');
+    if (method === 'GET' && etag) {
+      await Storage.saveCachedResponse(endpoint, etag, data);
+    }
+
+    return data;
   },
 
+  /**
+   * All pending tasks, following the server's pages.
+   */
   async getTasks() {
-    const data = await this.request('GET', '/api/tasks');
-    return data.tasks;
+    const tasks = [];
+    let cursor = null;
+    do {
+      const query = new URLSearchParams({ limit: '500' });
+      if (cursor) {
+        query.set('cursor', cursor);
+      }
+      const data = await this.request('GET', `/api/tasks?${query}`);
+      tasks.push(...data.tasks);
+      cursor = data.next_cursor;
+    } while (cursor);
+    return tasks;
+  },
+
+  /**
+   * All pending tasks, from the local copy plus the changes since it was
+   * saved. Only the first sync (or one after a long absence) downloads the
+   * whole list.
+   */
+  async syncTasks() {
+    const config = await Storage.getConfig();
+    let state = await Storage.getSyncState();
+    // The copy belongs to one account; a new server or token starts over
+    if (!state || state.apiUrl !== config.apiUrl || state.token !== config.token) {
+      state = { apiUrl: config.apiUrl, token: config.token, version: 0, day: 0, tasks: [] };
+    }
+
+    const data = await this.request('GET', `/api/sync?since=${state.version}`);
+    let tasks;
+    if (data.full) {
+      tasks = data.tasks;
+    } else {
+      // carryover_count is days since the task was added; days have passed
+      const daysStarted = data.day - state.day;
+      const replaced = new Set([...data.deleted, ...data.tasks.map(t => t.id)]);
+      tasks = state.tasks
+        .filter(t => !replaced.has(t.id))
+        .map(t => daysStarted ? { ...t, carryover_count: t.carryover_count + daysStarted } : t)
+        .concat(data.tasks.filter(t => t.status === 'pending'));
+      tasks.sort((a, b) => a.created_at < b.created_at ? -1 : a.created_at > b.created_at ? 1 : a.id - b.id);
+    }
+
+    await Storage.saveSyncState({
+      apiUrl: config.apiUrl, token: config.token, version: data.version, day: data.day, tasks
+    });
+    return tasks;
   },
 
   async addTask(text, area = 'work') {
     return this.request('POST', '/api/tasks', { text, area });
   },
 
+  async addTasks(tasks) {
+    const data = await this.request('POST', '/api/tasks/bulk', { tasks });
+    return data.tasks;
+  },
+
   async completeTask(taskId) {
     return this.request('POST', `/api/tasks/${taskId}/complete`);
   },
@@ -63,5 +133,76 @@ const API = {
 
   async getStats() {
     return this.request('GET', '/api/stats');
+  },
+
+  /**
+   * Follow the server's change feed, calling onEvent(type, data) per event.
+   * Reconnects with Last-Event-ID so changes made while offline are replayed.
+   */
+  async subscribe(onEvent) {
+    let lastEventId = null;
+    let retryDelay = 1000;
+
+    while (true) {
+      try {
+        const config = await Storage.getConfig();
+        const headers = { 'Authorization': `Bearer ${config.token}` };
+        if (lastEventId) {
+          headers['Last-Event-ID'] = lastEventId;
+        }
+
+        const response = await fetch(`${config.apiUrl}/api/events`, { headers, cache: 'no-store' });
+        if (!response.ok) {
+          throw new Error(`Event stream failed: ${response.status}`);
+        }
+        retryDelay = 1000;
+
+        const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = '';
+
+        while (true) {
+          const { value, done } = await reader.read();
+          if (done) break;
+
+          buffer += value;
+          let boundary;
+          while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const event = this.parseEvent(buffer.slice(0, boundary));
+            buffer = buffer.slice(boundary + 2);
+
+            if (event.id) lastEventId = event.id;
+            if (event.type) onEvent(event.type, event.data);
+          }
+        }
+      } catch (error) {
+        console.warn('Event stream disconnected:', error);
+      }
+
+      await new Promise(resolve => setTimeout(resolve, retryDelay));
+      retryDelay = Math.min(retryDelay * 2, 30000);
+    }
+  },
+
+  parseEvent(message) {
+    const event = { id: null, type: null, data: null };
+    const dataLines = [];
+
+    for (const line of message.split('\n')) {
+      // Lines starting with ':' are heartbeats
+      if (!line || line.startsWith(':')) continue;
+
+      const separator = line.indexOf(':');
+      const field = separator === -1 ? line : line.slice(0, separator);
+      const value = separator === -1 ? '' : line.slice(separator + 1).trimStart();
+
+      if (field === 'id') event.id = value;
+      else if (field === 'event') event.type = value;
+      else if (field === 'data') dataLines.push(value);
+    }
+
+    if (dataLines.length) {
+      event.data = JSON.parse(dataLines.join('\n'));
+    }
+    return event;
   }
 };
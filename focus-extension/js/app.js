@@ -5,6 +5,7 @@
 // State
 let tasks = [];
 let selectedTaskIndex = -1;
+let liveUpdatesStarted = false;
 
 // DOM Elements
 const setupBanner = document.getElementById('setup-banner');
@@ -285,7 +286,7 @@ async function loadData() {
   try {
     // Load tasks and article in parallel
     const [tasksData, articleData] = await Promise.all([
-      API.getTasks(),
+      API.syncTasks(),
       API.getArticle().catch(() => null)
     ]);
 
@@ -302,6 +303,7 @@ async function loadData() {
     }
 
     showMainContent();
+    startLiveUpdates();
   } catch (error) {
     console.error('Failed to load data:', error);
     if (error.message === 'API not configured') {
@@ -316,6 +318,43 @@ async function loadTasks() {
   loadData();
 }
 
+// Live Updates (changes made in Slack or other tabs)
+function startLiveUpdates() {
+  if (liveUpdatesStarted) return;
+  liveUpdatesStarted = true;
+  API.subscribe(handleServerEvent);
+}
+
+function handleServerEvent(type, data) {
+  switch (type) {
+    case 'task_added':
+      if (!tasks.some(t => t.id === data.id)) {
+        tasks.push(data);
+        renderTasks();
+      }
+      break;
+
+    case 'task_completed':
+    case 'task_deleted':
+      if (tasks.some(t => t.id === data.id)) {
+        tasks = tasks.filter(t => t.id !== data.id);
+        renderTasks();
+      }
+      break;
+
+    case 'day_started':
+    case 'reset':
+      // Carryover changed or events were missed - catch up from the server
+      API.syncTasks()
+        .then(freshTasks => {
+          tasks = freshTasks;
+          renderTasks();
+        })
+        .catch(error => console.error('Failed to refresh tasks:', error));
+      break;
+  }
+}
+
 // Task Rendering
 function renderTasks() {
   taskList.innerHTML = '';
@@ -483,10 +522,14 @@ async function handleAddTask(e) {
   try {
     const realTask = await API.addTask(text, 'work');
 
-    // Replace temp with real task
+    // Replace temp with real task (unless the live feed already added it)
     const index = tasks.findIndex(t => t.id === tempId);
     if (index !== -1) {
-      tasks[index] = realTask;
+      if (tasks.some(t => t.id === realTask.id)) {
+        tasks.splice(index, 1);
+      } else {
+        tasks[index] = realTask;
+      }
       renderTasks();
     }
   } catch (error) {
@@ -41,5 +41,37 @@ const Storage = {
     return new Promise((resolve) => {
       chrome.storage.sync.set({ gradient }, resolve);
     });
+  },
+
+  // Last GET response per endpoint, kept with its ETag for revalidation
+  async getCachedResponse(endpoint) {
+    const key = `response:${endpoint}`;
+    return new Promise((resolve) => {
+      chrome.storage.local.get([key], (result) => {
+        resolve(result[key] || null);
+      });
+    });
+  },
+
+  async saveCachedResponse(endpoint, etag, body) {
+    const key = `response:${endpoint}`;
+    return new Promise((resolve) => {
+      chrome.storage.local.set({ [key]: { etag, body } }, resolve);
+    });
+  },
+
+  // Local copy of the pending list from /api/sync: { apiUrl, token, version, day, tasks }
+  async getSyncState() {
+    return new Promise((resolve) => {
+      chrome.storage.local.get(['sync'], (result) => {
+        resolve(result.sync || null);
+      });
+    });
+  },
+
+  async saveSyncState(state) {
+    return new Promise((resolve) => {
+      chrome.storage.local.set({ sync: state }, resolve);
+    });
   }
 };
@@ -0,0 +1,256 @@
+"""
+In-process metrics, served in the Prometheus text format at /api/metrics.
+
+Latency histograms have fixed buckets, so recording a sample is a bisect
+and two additions under a lock, and Prometheus can still derive any
+percentile with histogram_quantile(). No client library is needed.
+"""
+import functools
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Seconds; suits anything from a SQLite read to a slow Slack call
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Latency histogram with one series per combination of label values."""
+
+    def __init__(self, name: str, help: str, labels: tuple, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts (last is +Inf), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, labels: tuple, seconds: float):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        """Observe how long the block takes, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(labels, time.perf_counter() - start)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: (list(counts), total, count)
+                      for labels, (counts, total, count) in self._series.items()}
+        for labels, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labels, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            plain = _format_labels(self.labels, labels)
+            lines.append(f"{self.name}_sum{plain} {total}")
+            lines.append(f"{self.name}_count{plain} {count}")
+        return lines
+
+
+class Gauge:
+    """A value that is set rather than accumulated, per label values."""
+
+    def __init__(self, name: str, help: str, labels: tuple):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def set(self, labels: tuple, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, labels)} {value}")
+        return lines
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Metrics ---
+
+http_requests = Histogram(
+    "focus_http_request_duration_seconds",
+    "API request latency (to first byte for streams) by route, method and status.",
+    ("route", "method", "status")
+)
+slack_commands = Histogram(
+    "focus_slack_command_duration_seconds",
+    "Time to handle a Slack DM command, by command type.",
+    ("command",)
+)
+db_calls = Histogram(
+    "focus_db_call_duration_seconds",
+    "Latency of db.py functions.",
+    ("function",)
+)
+db_write_batches = Histogram(
+    "focus_db_write_batch_duration_seconds",
+    "Time for the writer to run and commit one group of queued writes, by outcome.",
+    ("outcome",)
+)
+db_write_batch_size = Histogram(
+    "focus_db_write_batch_size",
+    "Writes grouped into each commit.",
+    (),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+slack_api_calls = Histogram(
+    "focus_slack_api_call_duration_seconds",
+    "Latency of outbound Slack Web API calls by method and outcome.",
+    ("method", "outcome")
+)
+scheduler_jobs = Histogram(
+    "focus_scheduler_job_duration_seconds",
+    "Scheduled job run time by job and outcome.",
+    ("job", "outcome")
+)
+scheduler_last_run = Gauge(
+    "focus_scheduler_job_last_run_timestamp_seconds",
+    "Unix time the job last finished.",
+    ("job",)
+)
+scheduler_lag = Gauge(
+    "focus_scheduler_job_lag_seconds",
+    "How late the job's last run started relative to its scheduled time.",
+    ("job",)
+)
+process_start = Gauge(
+    "focus_process_start_time_seconds",
+    "Unix time the process started.",
+    ()
+)
+process_start.set((), time.time())
+
+
+# --- Instrumentation ---
+
+def instrument_functions(namespace: dict, histogram: Histogram, exclude=()):
+    """
+    Replace the public functions defined in a module (pass its globals())
+    with wrappers that record each call in `histogram`, labelled by name.
+    """
+    module = namespace["__name__"]
+    for name, func in list(namespace.items()):
+        if (
+            name.startswith("_") or name in exclude or not callable(func)
+            or getattr(func, "__module__", None) != module or isinstance(func, type)
+        ):
+            continue
+        namespace[name] = _timed(func, histogram, name)
+
+
+def _timed(func, histogram: Histogram, label: str):
+    labels = (label,)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            histogram.observe(labels, time.perf_counter() - start)
+    return wrapper
+
+
+def instrument_slack_client(client_class):
+    """
+    Time every Web API call made through `client_class` (slack_sdk's
+    WebClient or AsyncWebClient). Bolt creates a client per request, so this
+    patches the class.
+    """
+    original = client_class.api_call
+    if getattr(original, "_focus_metrics", False):
+        return
+
+    if inspect.iscoroutinefunction(original):
+        @functools.wraps(original)
+        async def api_call(self, api_method, *args, **kwargs):
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                response = await original(self, api_method, *args, **kwargs)
+                outcome = "ok"
+                return response
+            finally:
+                slack_api_calls.observe((api_method, outcome), time.perf_counter() - start)
+    else:
+        @functools.wraps(original)
+        def api_call(self, api_method, *args, **kwargs):
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                response = original(self, api_method, *args, **kwargs)
+                outcome = "ok"
+                return response
+            finally:
+                slack_api_calls.observe((api_method, outcome), time.perf_counter() - start)
+
+    api_call._focus_metrics = True
+    client_class.api_call = api_call
+
+
+def watch_scheduler(scheduler):
+    """Record run time, last run and start lag for an APScheduler scheduler's jobs."""
+    from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_SUBMITTED
+
+    started = {}
+
+    def on_event(event):
+        now = time.time()
+        if event.code == EVENT_JOB_SUBMITTED:
+            started[event.job_id] = now
+            scheduled = max(event.scheduled_run_times).timestamp()
+            scheduler_lag.set((event.job_id,), max(now - scheduled, 0.0))
+            return
+        outcome = "error" if event.code == EVENT_JOB_ERROR else "ok"
+        start = started.pop(event.job_id, None)
+        if start is not None:
+            scheduler_jobs.observe((event.job_id, outcome), now - start)
+        scheduler_last_run.set((event.job_id,), now)
+
+    scheduler.add_listener(on_event, EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
@@ -0,0 +1,187 @@
+"""
+Response encoding for the HTTP API.
+
+JSON goes through one pluggable encoder: orjson when it is installed
+(several times faster than the json module on lists of rows), otherwise the
+standard library. FastJSONProvider plugs it into Flask, so jsonify() and
+every route use it. API_JSON_ENCODER forces a choice.
+
+Bodies are compressed with brotli (when installed) or gzip, whichever the
+client's Accept-Encoding prefers, once they are over COMPRESS_MIN_BYTES.
+Streamed bodies are compressed chunk by chunk as they are generated, and
+stream_json() lets a route write rows straight off a database cursor.
+"""
+import gzip
+import json
+import logging
+import os
+import zlib
+from datetime import date, datetime
+
+from flask.json.provider import JSONProvider
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# "auto" (orjson if installed), "orjson" or "json"
+API_JSON_ENCODER = os.environ.get("API_JSON_ENCODER", "auto")
+# Codings the server may use, in order of preference when the client ranks them equally
+API_COMPRESSION = [c.strip() for c in os.environ.get("API_COMPRESSION", "br,gzip").split(",") if c.strip()]
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+# Fast settings: responses are compressed on every request, not once
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+COMPRESSIBLE_TYPES = {"application/json", "application/x-ndjson", "text/plain", "text/html"}
+
+
+# --- JSON ---
+
+def _default(obj):
+    """Types neither encoder handles by itself in the same way."""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if hasattr(obj, "keys"):  # sqlite3.Row
+        return dict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _orjson_encoder():
+    import orjson
+
+    options = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj, default=_default, option=options)
+    return dumps, orjson.loads
+
+
+def _stdlib_encoder():
+    def dumps(obj) -> bytes:
+        return json.dumps(
+            obj, default=_default, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+        ).encode()
+    return dumps, json.loads
+
+
+ENCODERS = {"orjson": _orjson_encoder, "json": _stdlib_encoder}
+
+dumps = loads = None
+encoder_name = None
+
+
+def use_encoder(name: str = "auto") -> str:
+    """Switch the JSON encoder ("auto", "orjson" or "json"). Returns the one in use."""
+    global dumps, loads, encoder_name
+    if name == "auto":
+        try:
+            dumps, loads = _orjson_encoder()
+            encoder_name = "orjson"
+        except ImportError:
+            dumps, loads = _stdlib_encoder()
+            encoder_name = "json"
+        return encoder_name
+    if name not in ENCODERS:
+        raise ValueError(f"Unknown JSON encoder {name!r}; use one of: auto, {', '.join(ENCODERS)}")
+    dumps, loads = ENCODERS[name]()
+    encoder_name = name
+    return name
+
+
+use_encoder(API_JSON_ENCODER)
+
+
+class FastJSONProvider(JSONProvider):
+    """Flask JSON provider backed by the selected encoder (always compact, keys sorted)."""
+
+    mimetype = "application/json"
+
+    def dumps(self, obj, **kwargs) -> str:
+        return dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj) + b"\n", mimetype=self.mimetype)
+
+
+def stream_json(key: str, rows, **fields):
+    """
+    Yield `{key: [row, ...], **fields}` as encoded chunks, one row at a
+    time, so a large result never exists as one list or one string.
+    """
+    head = dumps(fields)[:-1] + b"," if fields else b"{"
+    yield head + dumps(key) + b":["
+    first = True
+    for row in rows:
+        yield (b"" if first else b",") + dumps(row)
+        first = False
+    yield b"]}\n"
+
+
+# --- Compression ---
+
+def negotiate(accept_encodings) -> str:
+    """The coding to use for a werkzeug Accept-Encoding value, or None for identity."""
+    best, best_quality = None, 0
+    for coding in API_COMPRESSION:
+        if coding == "br" and brotli is None:
+            continue
+        quality = accept_encodings[coding]
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress(response, accept_encodings):
+    """Compress a Flask response in place if the client accepts it and it is worth it."""
+    if (
+        response.status_code < 200 or response.status_code in (204, 206, 304)
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_TYPES
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    coding = negotiate(accept_encodings)
+    if coding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, coding)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_BYTES:
+            return response
+        if coding == "br":
+            response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+        else:
+            response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0))
+    response.headers["Content-Encoding"] = coding
+    return response
+
+
+def _compress_stream(chunks, coding: str):
+    if coding == "br":
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        compress_chunk, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        compress_chunk, finish = compressor.compress, compressor.flush
+    try:
+        for chunk in chunks:
+            data = compress_chunk(chunk.encode() if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield finish()
+    finally:
+        # Let the source release what it holds (e.g. a database cursor)
+        if hasattr(chunks, "close"):
+            chunks.close()
@@ -0,0 +1,106 @@
+"""
+HTTP serving for the extension API.
+
+Production uses waitress: a fixed pool of worker threads, a cap on open
+connections, HTTP/1.1 keep-alive and idle timeouts, and a shutdown that
+stops accepting, lets in-flight requests finish, then closes. It runs its
+event loop on a background thread, next to the Socket Mode threads.
+Werkzeug's development server is still available for local debugging.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ApiServer:
+    """
+    Serve a WSGI app from a background thread with `start()`, and stop it
+    gracefully with `stop(timeout)`.
+
+    `mode` is "waitress" (production) or "dev" (Werkzeug). `threads`,
+    `connection_limit` and `timeout` only apply to waitress; `timeout` is how
+    long a connection may sit idle, mid-request or between keep-alive
+    requests, before it is closed.
+    """
+
+    def __init__(
+        self,
+        app,
+        host: str = "0.0.0.0",
+        port: int = 8080,
+        mode: str = "waitress",
+        threads: int = 16,
+        connection_limit: int = 200,
+        timeout: int = 120,
+    ):
+        if mode not in ("waitress", "dev"):
+            raise ValueError(f"Unknown server mode {mode!r}; use 'waitress' or 'dev'")
+        self.app = app
+        self.host = host
+        self.port = port
+        self.mode = mode
+        self.threads = threads
+        self.connection_limit = connection_limit
+        self.timeout = timeout
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """Bind the port and start serving in the background."""
+        if self.mode == "waitress":
+            from waitress.server import create_server
+
+            self._server = create_server(
+                self.app,
+                host=self.host,
+                port=self.port,
+                threads=self.threads,
+                connection_limit=self.connection_limit,
+                channel_timeout=self.timeout,
+                ident="focus-agent",
+            )
+            target = self._server.run
+        else:
+            from werkzeug.serving import make_server
+
+            self._server = make_server(self.host, self.port, self.app, threaded=True)
+            target = self._server.serve_forever
+        self._thread = threading.Thread(target=target, name="api", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"API serving on {self.host}:{self.port} ({self.mode}"
+            + (f", {self.threads} threads)" if self.mode == "waitress" else ")")
+        )
+        return self
+
+    def stop(self, timeout: float = 10):
+        """Stop accepting connections, wait up to `timeout` for in-flight requests, then close."""
+        if self._server is None:
+            return
+        server, self._server = self._server, None
+        if self.mode == "dev":
+            server.shutdown()
+            server.server_close()
+            return
+
+        # Waitress: stop accepting, then drain. The loop thread owns the
+        # sockets, so it is woken to notice rather than touched directly.
+        server.accepting = False
+        server.pull_trigger()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and _busy(server):
+            time.sleep(0.05)
+        if _busy(server):
+            logger.warning("API shutdown timed out with requests still running")
+        server.task_dispatcher.shutdown(timeout=max(deadline - time.monotonic(), 0))
+        from waitress import wasyncore
+        wasyncore.close_all(server._map, ignore_all=True)
+        self._thread.join(max(deadline - time.monotonic(), 1))
+
+
+def _busy(server) -> bool:
+    """True while any connection has a request in progress (or queued)."""
+    channels = list(server.active_channels.values())
+    return any(channel.requests for channel in channels) or bool(server.task_dispatcher.queue)
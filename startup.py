@@ -0,0 +1,115 @@
+"""
+Startup phases and readiness.
+
+bot.py imports this module first, then runs its independent startup phases
+(schema, HTTP API, Slack auth, Socket Mode) in parallel. Each phase's time
+is recorded for the startup log line and for /api/ready, which the
+scale-to-zero workflow polls to learn when the bot is actually serving.
+It goes back to not ready as soon as shutdown begins. `pending(name)`
+lets code that depends on one phase (the API on the database) wait for it
+while the others are still starting.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+# Imported before anything heavy, so this is close to when the process began
+STARTED = time.perf_counter()
+
+logger = logging.getLogger(__name__)
+
+
+class Startup:
+    """Timings for a fixed set of named phases, filled in as they finish."""
+
+    def __init__(self, phases: tuple):
+        self.phases = phases
+        self._timings = {}
+        self._errors = {}
+        self._running = set()
+        self._stopping = False
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self._timings[name] = seconds
+
+    def begin_shutdown(self):
+        """Report not ready from now on, so traffic drains before shutdown."""
+        with self._lock:
+            self._stopping = True
+
+    def pending(self, name: str) -> bool:
+        """True while phase `name` has started but not yet finished."""
+        with self._lock:
+            return name in self._running
+
+    def _begin(self, name: str):
+        with self._lock:
+            self._running.add(name)
+
+    def _end(self, name: str, error: Exception = None):
+        with self._lock:
+            self._running.discard(name)
+            if error is not None:
+                self._errors[name] = str(error)
+
+    def run(self, name: str, phase: Callable):
+        """Run and time one phase. Failures are recorded, then re-raised."""
+        start = time.perf_counter()
+        self._begin(name)
+        try:
+            result = phase()
+        except Exception as e:
+            self._end(name, e)
+            raise
+        self.record(name, time.perf_counter() - start)
+        self._end(name)
+        return result
+
+    async def run_async(self, name: str, phase: Callable):
+        """`run` for a coroutine function."""
+        start = time.perf_counter()
+        self._begin(name)
+        try:
+            result = await phase()
+        except Exception as e:
+            self._end(name, e)
+            raise
+        self.record(name, time.perf_counter() - start)
+        self._end(name)
+        return result
+
+    def run_parallel(self, phases: dict) -> dict:
+        """Run {name: callable} concurrently and return {name: result}. Raises the first failure."""
+        with ThreadPoolExecutor(max_workers=len(phases), thread_name_prefix="startup") as pool:
+            futures = {name: pool.submit(self.run, name, phase) for name, phase in phases.items()}
+            return {name: future.result() for name, future in futures.items()}
+
+    @property
+    def ready(self) -> bool:
+        return self.status()["ready"]
+
+    def status(self) -> dict:
+        with self._lock:
+            timings, errors, stopping = dict(self._timings), dict(self._errors), self._stopping
+        return {
+            "ready": not stopping and not errors and all(name in timings for name in self.phases),
+            "stopping": stopping,
+            "uptime_seconds": round(time.perf_counter() - STARTED, 3),
+            "phases": {
+                name: round(timings[name], 3) if name in timings else None
+                for name in self.phases
+            },
+            "errors": errors,
+        }
+
+    def log_summary(self):
+        status = self.status()
+        parts = ", ".join(
+            f"{name} {seconds:.3f}s" for name, seconds in status["phases"].items()
+            if seconds is not None
+        )
+        logger.info(f"Ready in {status['uptime_seconds']:.3f}s ({parts})")
@@ -0,0 +1,147 @@
+"""
+Regression tests for db.py's single writer: group commit, per-job
+savepoints, after-commit events and recovery from failures.
+
+    python -m pytest -q test_db.py
+"""
+import threading
+
+import pytest
+
+import db
+import events
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path, monkeypatch):
+    """Each test gets its own database file and a writer started on demand."""
+    db.close_connections()
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "focus.db")
+    monkeypatch.setattr(db, "_schema_ready", False)
+    db.ensure_user("U1")
+    yield
+    db.close_connections()
+
+
+def hold_writer():
+    """Queue a job that blocks the writer until released, so later submits share one batch."""
+    started, release = threading.Event(), threading.Event()
+
+    def blocker():
+        started.set()
+        release.wait(5)
+
+    future = db.submit(blocker)
+    started.wait(5)
+    return release, future
+
+
+def task_texts(user_id="U1"):
+    return [task["text"] for task in db.get_pending_tasks(user_id)]
+
+
+def test_failing_job_rolls_back_only_itself():
+    def bad():
+        with db.transaction() as conn:
+            conn.execute("INSERT INTO users (user_id) VALUES ('BAD')")
+            raise ValueError("boom")
+
+    release, blocker = hold_writer()
+    before = db.submit(db.add_task, "U1", "before")
+    failing = db.submit(bad)
+    after = db.submit(db.add_task, "U1", "after")
+    release.set()
+
+    assert before.result(5) > 0
+    assert after.result(5) > 0
+    with pytest.raises(ValueError, match="boom"):
+        failing.result(5)
+    assert db.get_user("BAD") is None
+    assert task_texts() == ["before", "after"]
+
+
+def test_events_published_after_commit(monkeypatch):
+    monkeypatch.setattr(events.bus, "_listeners", list(events.bus._listeners))
+    seen = []
+
+    def listener():
+        event = events.bus.events_after(events.bus.last_id - 1)[-1]
+        if event.type == "task_added":
+            # Another connection must already see the row
+            seen.append(db.get_task(event.user_id, event.data["id"]) is not None)
+
+    events.bus.add_listener(listener)
+    db.add_task("U1", "visible")
+    assert seen == [True]
+
+
+def test_write_inside_transaction_joins_it():
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.add_task("U1", "rolled back with the caller")
+            raise RuntimeError("caller failed")
+    assert task_texts() == []
+
+    with db.transaction():
+        task_id = db.add_task("U1", "kept")
+    assert db.get_task("U1", task_id)["text"] == "kept"
+
+
+def test_write_inside_snapshot_is_refused():
+    with db.snapshot():
+        with pytest.raises(RuntimeError, match="snapshot"):
+            db.add_task("U1", "lost")
+        with pytest.raises(RuntimeError, match="snapshot"):
+            db.submit(db.add_task, "U1", "lost")
+    assert task_texts() == []
+    db.add_task("U1", "after the snapshot")
+    assert task_texts() == ["after the snapshot"]
+
+
+def test_lost_transaction_fails_the_batch_and_writer_continues():
+    def abandon():
+        # Ends the group transaction under the writer, as a disk-full error would
+        with db.connection() as conn:
+            conn.execute("ROLLBACK")
+
+    release, blocker = hold_writer()
+    earlier = db.submit(db.add_task, "U1", "in the lost batch")
+    breaker = db.submit(abandon)
+    release.set()
+
+    with pytest.raises(Exception):
+        earlier.result(5)
+    with pytest.raises(Exception):
+        breaker.result(5)
+    assert task_texts() == []
+    db.add_task("U1", "next batch")
+    assert task_texts() == ["next batch"]
+
+
+def test_writer_restarts_after_dying(monkeypatch):
+    original = db._writer._process
+    calls = []
+
+    def crash_once(conn, batch):
+        if not calls:
+            calls.append(batch)
+            raise OSError("writer crashed")
+        return original(conn, batch)
+
+    monkeypatch.setattr(db._writer, "_process", crash_once)
+    with pytest.raises(OSError, match="writer crashed"):
+        db.add_task("U1", "lost with the writer")
+
+    # A dead writer is replaced by the next write instead of blocking it
+    assert db.add_task("U1", "after restart") > 0
+    assert task_texts() == ["after restart"]
+
+
+def test_compact_runs_between_groups():
+    db.add_tasks("U1", [(f"task {i}", "work") for i in range(200)])
+    for task in db.get_pending_tasks("U1"):
+        db.delete_task("U1", task["id"])
+    assert db.compact() >= 0
+    with db.transaction():
+        with pytest.raises(RuntimeError, match="transaction"):
+            db.compact()
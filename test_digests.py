@@ -0,0 +1,65 @@
+"""
+Tests for digests.py's morning fan-out: each digest is sent once per user
+and day, even when the send pool is backed up.
+
+    python -m pytest -q test_digests.py
+"""
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+import db
+import digests
+
+TICK = datetime(2026, 10, 17, 9, 0, tzinfo=timezone.utc)
+LOCAL_DATE = "2026-10-17"
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path, monkeypatch):
+    db.close_connections()
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "focus.db")
+    monkeypatch.setattr(db, "_schema_ready", False)
+    db.set_morning_schedule("U1", "09:00", "UTC")
+    yield
+    db.close_connections()
+
+
+def backdate_claims(minutes: int):
+    with db.transaction() as conn:
+        conn.execute(
+            "UPDATE digest_sends SET claimed_at = datetime('now', ?)", (f"-{minutes} minutes",)
+        )
+
+
+def test_queued_send_is_not_claimed_again_after_the_timeout():
+    sends, release = [], threading.Event()
+    fanout = digests.MorningFanout(
+        lambda *args: sends.append(args), workers=1, claim_timeout_minutes=15
+    )
+    # Occupy the only worker, so U1's send waits in the queue
+    fanout.pool.submit(release.wait, 5)
+
+    assert fanout.tick(TICK) == 1
+    backdate_claims(20)
+    assert fanout.tick(TICK) == 0
+
+    release.set()
+    fanout.shutdown()
+    assert [user_id for user_id, _ in sends] == ["U1"]
+
+
+def test_stale_claim_from_a_dead_process_is_retried():
+    assert db.claim_digest("U1", LOCAL_DATE)  # claimed, then the process died
+    sends = []
+    fanout = digests.MorningFanout(
+        lambda *args: sends.append(args), workers=1, claim_timeout_minutes=15
+    )
+
+    assert fanout.tick(TICK) == 0
+    backdate_claims(20)
+    assert fanout.tick(TICK) == 1
+    fanout.shutdown()
+    assert [user_id for user_id, _ in sends] == ["U1"]
+    assert db.get_due_digest_users("UTC", LOCAL_DATE, "08:00", "10:00") == []
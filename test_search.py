@@ -0,0 +1,37 @@
+"""
+Regression tests for db.search_tasks snippets.
+
+    python -m pytest -q test_search.py
+"""
+import html
+
+import pytest
+
+import db
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path, monkeypatch):
+    """Each test gets its own database file and a writer started on demand."""
+    db.close_connections()
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "focus.db")
+    monkeypatch.setattr(db, "_schema_ready", False)
+    db.ensure_user("U1")
+    yield
+    db.close_connections()
+
+
+def test_html_snippet_escapes_task_text():
+    db.add_task("U1", "fix <img src=x onerror=alert(1)> login")
+    results = db.search_tasks("U1", "login", highlight=("<mark>", "</mark>"), escape=html.escape)
+    assert [r["snippet"] for r in results] == [
+        "fix &lt;img src=x onerror=alert(1)&gt; <mark>login</mark>"
+    ]
+    # The raw text is still returned as stored
+    assert results[0]["text"] == "fix <img src=x onerror=alert(1)> login"
+
+
+def test_default_snippet_is_unescaped():
+    db.add_task("U1", "ship the A&B release")
+    results = db.search_tasks("U1", "ship")
+    assert [r["snippet"] for r in results] == ["*ship* the A&B release"]